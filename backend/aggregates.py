@@ -0,0 +1,176 @@
+"""Índice da última leitura por sensor e agregados incrementais por zona.
+
+Os agregados de zona ficam em colunas NumPy indexadas por slot, o que
+permite ler todas as zonas de uma vez (ex.: controle automático de
+irrigação) e responder consultas de uma zona em O(1). Os totais da frota e
+de cada fazenda são mantidos junto com as zonas, também em O(1).
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch, from_epoch_ms, group_indices, scoped_key, split_key
+
+DEFAULT_ZONE = "sem_zona"
+
+_PH = METRICS.index("ph_level")
+_MOISTURE = METRICS.index("soil_moisture")
+
+
+class SoilAggregates:
+    def __init__(self, ewma_alpha: float = 0.2, initial_zones: int = 64):
+        self.ewma_alpha = ewma_alpha
+        self.latest: Dict[str, dict] = {}
+        self.sensor_zone: Dict[str, str] = {}
+        self.zone_slots: Dict[str, int] = {}
+        self.zone_names: List[str] = []
+        # Colunas por zona. Somas consideram a última leitura de cada sensor da zona
+        self.readings = np.zeros(initial_zones, dtype=np.int64)
+        self.sensors = np.zeros(initial_zones, dtype=np.int64)
+        self.ph_sum = np.zeros(initial_zones)
+        self.moisture_sum = np.zeros(initial_zones)
+        self.ph_ewma = np.full(initial_zones, np.nan)
+        self.moisture_ewma = np.full(initial_zones, np.nan)
+        self.last_update_ms = np.zeros(initial_zones, dtype=np.int64)
+        # Totais da frota inteira e por fazenda (zonas sem contar a padrão)
+        self.fleet_totals = self._empty_totals()
+        self.farm_totals: Dict[str, dict] = {}
+
+    @staticmethod
+    def _empty_totals() -> dict:
+        return {"sensors": 0, "zones": 0, "ph_sum": 0.0, "moisture_sum": 0.0}
+
+    def _account(self, zone_id: str, key: str, amount):
+        farm_id = split_key(zone_id)[0]
+        totals = self.farm_totals.get(farm_id)
+        if totals is None:
+            totals = self.farm_totals[farm_id] = self._empty_totals()
+        totals[key] += amount
+        self.fleet_totals[key] += amount
+
+    def _add_sensor(self, slot: int, zone_id: str, ph: float, moisture: float, sign: int = 1):
+        """Soma (ou, com sign=-1, retira) a última leitura de um sensor da zona e dos totais."""
+        self.sensors[slot] += sign
+        self.ph_sum[slot] += sign * ph
+        self.moisture_sum[slot] += sign * moisture
+        self._account(zone_id, "sensors", sign)
+        self._account(zone_id, "ph_sum", sign * ph)
+        self._account(zone_id, "moisture_sum", sign * moisture)
+
+    def _slot(self, zone_id: str) -> int:
+        slot = self.zone_slots.get(zone_id)
+        if slot is not None:
+            return slot
+        slot = self.zone_slots[zone_id] = len(self.zone_names)
+        self.zone_names.append(zone_id)
+        if split_key(zone_id)[1] != DEFAULT_ZONE:
+            self._account(zone_id, "zones", 1)
+        if slot >= len(self.readings):
+            grow = len(self.readings)
+            self.readings = np.concatenate((self.readings, np.zeros(grow, dtype=np.int64)))
+            self.sensors = np.concatenate((self.sensors, np.zeros(grow, dtype=np.int64)))
+            self.ph_sum = np.concatenate((self.ph_sum, np.zeros(grow)))
+            self.moisture_sum = np.concatenate((self.moisture_sum, np.zeros(grow)))
+            self.ph_ewma = np.concatenate((self.ph_ewma, np.full(grow, np.nan)))
+            self.moisture_ewma = np.concatenate((self.moisture_ewma, np.full(grow, np.nan)))
+            self.last_update_ms = np.concatenate((self.last_update_ms, np.zeros(grow, dtype=np.int64)))
+        return slot
+
+    def zone_of(self, sensor_id: str, reported: Optional[str] = None) -> str:
+        zone_id = reported or self.sensor_zone.get(sensor_id)
+        # Sensores sem zona caem na zona padrão da própria fazenda
+        return zone_id or scoped_key(split_key(sensor_id)[0], DEFAULT_ZONE)
+
+    def _ewma(self, slot: int, column: np.ndarray, values: np.ndarray):
+        """EWMA sobre `k` leituras de uma vez: pesos a(1-a)^(k-1-j) mais o valor anterior."""
+        a = self.ewma_alpha
+        if np.isnan(column[slot]):
+            # Primeira leitura da zona inicia a média
+            column[slot], values = values[0], values[1:]
+        k = len(values)
+        if k:
+            weights = a * (1 - a) ** np.arange(k - 1, -1, -1)
+            column[slot] = column[slot] * (1 - a) ** k + weights @ values
+
+    def resolve_zones(self, batch: ReadingBatch) -> np.ndarray:
+        """Zona de cada leitura: a informada, a última conhecida do sensor ou a padrão."""
+        return np.array([self.zone_of(s, z) for s, z in zip(batch.sensor_ids, batch.zone_ids)], dtype=object)
+
+    def add_batch(self, batch: ReadingBatch):
+        zones = self.resolve_zones(batch)
+
+        # Última leitura de cada sensor do lote substitui a anterior nas somas
+        for sensor_id, idx in batch.groups():
+            last = idx[np.argmax(batch.timestamps[idx])]
+            ts_ms = int(batch.timestamps[last])
+            previous = self.latest.get(sensor_id)
+            if previous is not None and previous["ts_ms"] > ts_ms:
+                continue
+            values = batch.values[:, last].tolist()
+            zone_id = zones[last]
+            slot = self._slot(zone_id)
+            if previous is not None:
+                self._add_sensor(self.zone_slots[previous["zone_id"]], previous["zone_id"],
+                                 previous["ph_level"], previous["soil_moisture"], sign=-1)
+            self._add_sensor(slot, zone_id, values[_PH], values[_MOISTURE])
+            self.sensor_zone[sensor_id] = zone_id
+            self.latest[sensor_id] = {
+                "ts_ms": ts_ms,
+                "zone_id": zone_id,
+                **dict(zip(METRICS, values)),
+            }
+
+        # Contagem e EWMA por zona, na ordem de chegada
+        for zone_id, idx in group_indices(zones):
+            slot = self._slot(zone_id)
+            self.readings[slot] += len(idx)
+            self.last_update_ms[slot] = max(self.last_update_ms[slot], batch.timestamps[idx].max())
+            self._ewma(slot, self.ph_ewma, batch.values[_PH, idx])
+            self._ewma(slot, self.moisture_ewma, batch.values[_MOISTURE, idx])
+
+    def forget(self, sensor_id: str):
+        """Retira o sensor das somas e esquece sua última leitura e zona (ex.: expulso do armazenamento)."""
+        self.sensor_zone.pop(sensor_id, None)
+        previous = self.latest.pop(sensor_id, None)
+        if previous is not None:
+            self._add_sensor(self.zone_slots[previous["zone_id"]], previous["zone_id"],
+                             previous["ph_level"], previous["soil_moisture"], sign=-1)
+
+    def zone_moisture(self) -> tuple:
+        """Umidade média atual de todas as zonas, indexada por slot, e o horário da última leitura."""
+        n = len(self.zone_names)
+        sensors = self.sensors[:n]
+        moisture = np.divide(self.moisture_sum[:n], sensors, out=np.full(n, np.nan), where=sensors > 0)
+        return moisture, self.last_update_ms[:n]
+
+    def latest_reading(self, sensor_id: str) -> Optional[dict]:
+        row = self.latest.get(sensor_id)
+        if row is None:
+            return None
+        return {
+            "sensor_id": sensor_id,
+            "zone_id": row["zone_id"],
+            "timestamp": from_epoch_ms(row["ts_ms"]),
+            **{name: row[name] for name in METRICS},
+        }
+
+    def totals(self, farm_id: Optional[str] = None) -> dict:
+        """Somas (não médias) de todas as zonas, ou só das zonas da fazenda, para combinar entre shards."""
+        totals = self.fleet_totals if farm_id is None else self.farm_totals.get(farm_id)
+        return dict(totals) if totals is not None else self._empty_totals()
+
+    def zone(self, zone_id: str) -> Optional[dict]:
+        slot = self.zone_slots.get(zone_id)
+        if slot is None or not self.sensors[slot]:
+            return None
+        sensors = int(self.sensors[slot])
+        return {
+            "zone_id": zone_id,
+            "sensors": sensors,
+            "readings": int(self.readings[slot]),
+            "average_ph": float(self.ph_sum[slot] / sensors),
+            "average_moisture": float(self.moisture_sum[slot] / sensors),
+            "ewma_ph": float(self.ph_ewma[slot]),
+            "ewma_moisture": float(self.moisture_ewma[slot]),
+            "last_update": from_epoch_ms(self.last_update_ms[slot]),
+        }
@@ -0,0 +1,226 @@
+"""Motor de regras de alerta dos sensores.
+
+As regras (limites, histerese e ajustes por cultura ou zona) vêm de um
+arquivo JSON opcional; sem ele valem os limites padrão abaixo. Na
+inicialização as regras são compiladas em tabelas de limites por zona, e
+cada lote é avaliado com operações vetorizadas sobre todas as leituras.
+
+O estado de cada alerta (disparado/normalizado) é mantido por sensor: um
+alerta só é emitido na transição, e só volta ao normal depois que o valor
+sai da faixa de histerese.
+"""
+import json
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch, group_indices
+
+DEFAULT_CONFIG = {
+    "rules": [
+        {
+            "id": "low_soil_moisture",
+            "metric": "soil_moisture",
+            "below": 30,
+            "hysteresis": 2,
+            "severity": "warning",
+            "message": "Baixa umidade do solo - Irrigação recomendada",
+        },
+        {
+            "id": "ph_out_of_range",
+            "metric": "ph_level",
+            "below": 6.0,
+            "above": 7.0,
+            "hysteresis": 0.1,
+            "severity": "warning",
+            "message": "pH do solo fora da faixa ideal",
+        },
+        {
+            "id": "high_temperature",
+            "metric": "temperature",
+            "above": 32,
+            "hysteresis": 1,
+            "severity": "warning",
+            "message": "Temperatura alta - Monitorar stress térmico",
+        },
+    ],
+    # Ajustes de limites: {"crops": {"arroz": {"low_soil_moisture": {"below": 60}}}, "zones": {...}}
+    "overrides": {"crops": {}, "zones": {}},
+    # Cultura de cada zona, usada para aplicar os ajustes por cultura
+    "zone_crops": {},
+}
+
+
+class Rule:
+    def __init__(self, spec: dict):
+        self.id = spec["id"]
+        if spec["metric"] not in METRICS:
+            raise ValueError(f"Regra {self.id}: métrica desconhecida {spec['metric']}")
+        self.metric = METRICS.index(spec["metric"])
+        self.below = spec.get("below")
+        self.above = spec.get("above")
+        self.hysteresis = spec.get("hysteresis", 0.0)
+        self.severity = spec.get("severity", "warning")
+        self.message = spec["message"]
+
+    def limits(self, override: Optional[dict]) -> tuple:
+        spec = override or {}
+        below = spec.get("below", self.below)
+        above = spec.get("above", self.above)
+        return (-np.inf if below is None else below, np.inf if above is None else above)
+
+
+class RuleEngine:
+    def __init__(self, config: Optional[dict] = None):
+        config = config or DEFAULT_CONFIG
+        self.rules = [Rule(spec) for spec in config["rules"]]
+        self.zone_crops: Dict[str, str] = dict(config.get("zone_crops", {}))
+        overrides = config.get("overrides", {})
+        self._crop_overrides = overrides.get("crops", {})
+        self._zone_overrides = overrides.get("zones", {})
+        self._limits_cache: Dict[Optional[str], np.ndarray] = {}
+        # Sensores com cada alerta disparado
+        self.active: Dict[str, set] = {rule.id: set() for rule in self.rules}
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "RuleEngine":
+        if not path:
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def rule_ids(self) -> List[str]:
+        return [rule.id for rule in self.rules]
+
+    def _zone_limits(self, zone_id: Optional[str]) -> np.ndarray:
+        """Limites (abaixo, acima) de cada regra para a zona; zona > cultura > padrão."""
+        limits = self._limits_cache.get(zone_id)
+        if limits is None:
+            crop = self.zone_crops.get(zone_id)
+            rows = []
+            for rule in self.rules:
+                override = dict(self._crop_overrides.get(crop, {}).get(rule.id, {}))
+                override.update(self._zone_overrides.get(zone_id, {}).get(rule.id, {}))
+                rows.append(rule.limits(override))
+            limits = self._limits_cache[zone_id] = np.array(rows, dtype=np.float64)
+        return limits
+
+    def set_zone_crop(self, zone_id: str, crop: Optional[str]):
+        if self.zone_crops.get(zone_id) != crop:
+            if crop is None:
+                self.zone_crops.pop(zone_id, None)
+            else:
+                self.zone_crops[zone_id] = crop
+            self._limits_cache.pop(zone_id, None)
+
+    def _thresholds(self, zones: np.ndarray) -> np.ndarray:
+        """Limites por leitura, com formato (regras, 2, n)."""
+        out = np.empty((len(self.rules), 2, len(zones)))
+        for zone_id, idx in group_indices(zones):
+            out[:, :, idx] = self._zone_limits(zone_id)[:, :, None]
+        return out
+
+    def evaluate(self, batch: ReadingBatch, zones: np.ndarray) -> Dict[str, Dict[str, np.ndarray]]:
+        """Avalia todas as regras sobre o lote e atualiza o estado por sensor.
+
+        Retorna máscaras por regra: `raised` e `cleared` marcam as transições,
+        `firing` indica se o alerta está ativo após cada leitura.
+        """
+        n = len(batch)
+        result = {"raised": {}, "cleared": {}, "firing": {}}
+        if n == 0:
+            for key in result:
+                result[key] = {rule.id: np.zeros(0, dtype=bool) for rule in self.rules}
+            return result
+
+        thresholds = self._thresholds(zones)
+        # Ordena por sensor (estável) para propagar o estado dentro de cada sensor
+        sensors, inverse = np.unique(batch.sensor_ids, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        group = inverse[order]
+        first = np.r_[True, group[1:] != group[:-1]]
+        last = np.r_[group[1:] != group[:-1], True]
+        positions = np.arange(n)
+        unsort = np.empty(n, dtype=np.intp)
+        unsort[order] = positions
+
+        for r, rule in enumerate(self.rules):
+            values = batch.values[rule.metric]
+            below, above = thresholds[r, 0], thresholds[r, 1]
+            h = rule.hysteresis
+            # 1 = dispara, 0 = normaliza, -1 = dentro da histerese (mantém o estado)
+            events = np.full(n, -1, dtype=np.int8)
+            events[(values >= below + h) & (values <= above - h)] = 0
+            events[(values < below) | (values > above)] = 1
+            events = events[order]
+
+            active = self.active[rule.id]
+            prior = np.fromiter((s in active for s in sensors), dtype=np.int8, count=len(sensors))[group]
+            seeded = np.where(first & (events == -1), prior, events)
+            filled = np.maximum.accumulate(np.where(seeded != -1, positions, 0))
+            state = seeded[filled]
+            previous = np.where(first, prior, np.r_[0, state[:-1]])
+
+            result["firing"][rule.id] = (state == 1)[unsort]
+            result["raised"][rule.id] = ((state == 1) & (previous == 0))[unsort]
+            result["cleared"][rule.id] = ((state == 0) & (previous == 1))[unsort]
+
+            for i in np.flatnonzero(last):
+                sensor_id = sensors[group[i]]
+                if state[i] == 1:
+                    active.add(sensor_id)
+                else:
+                    active.discard(sensor_id)
+        return result
+
+    def forget(self, sensor_id: str):
+        """Tira o sensor dos alertas ativos (ex.: expulso do armazenamento)."""
+        for active in self.active.values():
+            active.discard(sensor_id)
+
+    def messages_at(self, masks: Dict[str, np.ndarray], index: int) -> List[str]:
+        return [rule.message for rule in self.rules if masks[rule.id][index]]
+
+    def counts(self, masks: Dict[str, np.ndarray]) -> Dict[str, int]:
+        return {rule.id: int(masks[rule.id].sum()) for rule in self.rules}
+
+    def summarize(self, batch: ReadingBatch, result: Dict[str, Dict[str, np.ndarray]]) -> dict:
+        """Contagens agregadas e transições por leitura (apenas as que mudaram)."""
+        raised, cleared = result["raised"], result["cleared"]
+        changed = np.flatnonzero(np.logical_or.reduce(
+            [raised[rule.id] for rule in self.rules] + [cleared[rule.id] for rule in self.rules]
+        ))
+        return {
+            "received": len(batch),
+            "alert_counts": self.counts(raised),
+            "cleared_counts": self.counts(cleared),
+            "readings_with_alerts": len(changed),
+            "alerts": [
+                {
+                    "index": int(i),
+                    "sensor_id": batch.sensor_ids[i],
+                    "alerts": self.messages_at(raised, i),
+                    "cleared": self.messages_at(cleared, i),
+                }
+                for i in changed
+            ],
+        }
+
+    def active_alerts(self, sample: int = 5, active: Optional[Dict[str, set]] = None) -> Iterable[dict]:
+        """Alertas ativos agrupados por regra, para o resumo do dashboard.
+
+        `active` substitui o estado deste motor (ex.: sensores combinados de vários shards).
+        """
+        active = self.active if active is None else active
+        for rule in self.rules:
+            sensors = active.get(rule.id, ())
+            if sensors:
+                shown = sorted(sensors)[:sample]
+                more = f" e mais {len(sensors) - sample}" if len(sensors) > sample else ""
+                yield {
+                    "type": rule.severity,
+                    "rule_id": rule.id,
+                    "sensors": len(sensors),
+                    "message": f"{rule.message} ({', '.join(shown)}{more})",
+                }
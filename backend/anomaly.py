@@ -0,0 +1,178 @@
+"""Detecção de anomalias por sensor com estatísticas móveis de custo constante.
+
+Cada sensor ocupa um slot com estado de tamanho fixo: média e variância
+exponenciais (EWMA) por métrica, uma janela circular curta para a mediana
+móvel e o último valor/timestamp para a taxa de variação. Cada leitura é
+pontuada contra a linha de base do próprio sensor antes de atualizá-la.
+
+O lote é processado em rodadas: na rodada `r` entra a r-ésima leitura de
+cada sensor, e todas as leituras da rodada são tratadas com operações
+vetorizadas sobre os slots. O número de rodadas é o maior número de
+leituras de um mesmo sensor no lote, não o tamanho do lote.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch, from_epoch_ms
+
+KINDS = ("zscore", "median", "rate")
+KIND_LABELS = {
+    "zscore": "desvio da média móvel",
+    "median": "desvio da mediana móvel",
+    "rate": "variação rápida",
+}
+_N = len(METRICS)
+
+# Desvio padrão mínimo por métrica, para sensores muito estáveis não gerarem alarmes por ruído
+DEFAULT_MIN_STD = {"temperature": 0.3, "humidity": 1.0, "soil_moisture": 1.0, "ph_level": 0.05}
+# Variação máxima por minuto considerada plausível
+DEFAULT_MAX_RATE = {"temperature": 2.0, "humidity": 10.0, "soil_moisture": 5.0, "ph_level": 0.2}
+
+
+def _flag_bit(kind: int, metric: int) -> int:
+    return 1 << (kind * _N + metric)
+
+
+def describe_flags(flags: int) -> List[str]:
+    reasons = []
+    for k, kind in enumerate(KINDS):
+        for m, metric in enumerate(METRICS):
+            if flags & _flag_bit(k, m):
+                reasons.append(f"{metric}: {KIND_LABELS[kind]}")
+    return reasons
+
+
+class AnomalyDetector:
+    def __init__(self, alpha: float = 0.05, window: int = 15, warmup: int = 10,
+                 z_threshold: float = 5.0, min_std: Optional[Dict[str, float]] = None,
+                 max_rate: Optional[Dict[str, float]] = None, initial_sensors: int = 1024):
+        self.alpha = alpha
+        self.window = window
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.min_std = np.array([dict(DEFAULT_MIN_STD, **(min_std or {}))[m] for m in METRICS])
+        self.max_rate = np.array([dict(DEFAULT_MAX_RATE, **(max_rate or {}))[m] for m in METRICS])
+        self.slots: Dict[str, int] = {}
+        self._free: List[int] = []  # slots de sensores esquecidos, reaproveitados antes de crescer
+        self._alloc(initial_sensors)
+        # Sensores cuja última leitura foi anômala
+        self.flagged: Dict[str, dict] = {}
+
+    def _alloc(self, capacity: int):
+        def grow(array: Optional[np.ndarray], shape, fill, dtype=np.float64):
+            fresh = np.full(shape, fill, dtype=dtype)
+            if array is not None:
+                fresh[:len(array)] = array
+            return fresh
+
+        self.capacity = capacity
+        self.count = grow(getattr(self, "count", None), capacity, 0, np.int64)
+        self.mean = grow(getattr(self, "mean", None), (capacity, _N), 0.0)
+        self.var = grow(getattr(self, "var", None), (capacity, _N), 0.0)
+        self.last = grow(getattr(self, "last", None), (capacity, _N), np.nan)
+        self.last_ts = grow(getattr(self, "last_ts", None), capacity, 0, np.int64)
+        self.ring = grow(getattr(self, "ring", None), (capacity, self.window, _N), np.nan, np.float32)
+        self.ring_pos = grow(getattr(self, "ring_pos", None), capacity, 0, np.int64)
+
+    def _slots_for(self, sensor_ids: np.ndarray) -> np.ndarray:
+        slots = np.empty(len(sensor_ids), dtype=np.intp)
+        for i, sensor_id in enumerate(sensor_ids):
+            slot = self.slots.get(sensor_id)
+            if slot is None:
+                slot = self.slots[sensor_id] = self._free.pop() if self._free else len(self.slots)
+                if slot >= self.capacity:
+                    self._alloc(self.capacity * 2)
+            slots[i] = slot
+        return slots
+
+    def forget(self, sensor_id: str):
+        """Libera o slot do sensor (ex.: expulso do armazenamento); volta a aquecer se reaparecer."""
+        self.flagged.pop(sensor_id, None)
+        slot = self.slots.pop(sensor_id, None)
+        if slot is None:
+            return
+        self.count[slot] = 0
+        self.mean[slot] = 0.0
+        self.var[slot] = 0.0
+        self.last[slot] = np.nan
+        self.last_ts[slot] = 0
+        self.ring[slot] = np.nan
+        self.ring_pos[slot] = 0
+        self._free.append(slot)
+
+    def observe(self, batch: ReadingBatch) -> Dict[str, np.ndarray]:
+        """Pontua e incorpora o lote; retorna `score` e `flags` por leitura."""
+        n = len(batch)
+        score = np.zeros(n)
+        flags = np.zeros(n, dtype=np.int64)
+        if n == 0:
+            return {"score": score, "flags": flags}
+
+        slots = self._slots_for(batch.sensor_ids)
+        # Posição de cada leitura dentro do seu sensor (0, 1, 2, ...), preservando a ordem
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        starts = np.r_[0, np.flatnonzero(sorted_slots[1:] != sorted_slots[:-1]) + 1]
+        rank = np.empty(n, dtype=np.intp)
+        rank[order] = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+
+        a = self.alpha
+        for r in range(int(rank.max()) + 1):
+            sel = np.flatnonzero(rank == r)
+            s = slots[sel]
+            x = batch.values[:, sel].T
+            ts = batch.timestamps[sel]
+
+            warm = self.count[s] >= self.warmup
+            std = np.maximum(np.sqrt(self.var[s]), self.min_std)
+            z = np.abs(x - self.mean[s]) / std
+            median = np.zeros_like(x)
+            if warm.any():
+                median[warm] = np.nanmedian(self.ring[s[warm]], axis=1)
+            z_median = np.abs(x - median) / std
+            minutes = np.maximum((ts - self.last_ts[s]) / 60000.0, 1 / 60)
+            rate = np.abs(x - self.last[s]) / minutes[:, None]
+
+            hits = (
+                ((z > self.z_threshold) & warm[:, None]),
+                ((z_median > self.z_threshold) & warm[:, None]),
+                (rate > self.max_rate) & (self.count[s] > 0)[:, None],
+            )
+            bits = np.zeros(len(sel), dtype=np.int64)
+            for k, hit in enumerate(hits):
+                for m in range(_N):
+                    bits[hit[:, m]] |= _flag_bit(k, m)
+            flags[sel] = bits
+            score[sel] = np.where(warm, np.maximum(z, z_median).max(axis=1), 0.0)
+
+            # Atualiza a linha de base (EWMA de média e variância). Nas primeiras
+            # leituras o peso é 1/(n+1), equivalente à média simples, para a
+            # variância não começar subestimada
+            w = np.maximum(a, 1.0 / (self.count[s] + 1))[:, None]
+            delta = x - self.mean[s]
+            self.mean[s] += w * delta
+            self.var[s] = (1 - w) * (self.var[s] + w * delta ** 2)
+            self.ring[s, self.ring_pos[s]] = x
+            self.ring_pos[s] = (self.ring_pos[s] + 1) % self.window
+            self.last[s] = x
+            self.last_ts[s] = ts
+            self.count[s] += 1
+
+        self._update_flagged(batch, score, flags, order, starts)
+        return {"score": score, "flags": flags}
+
+    def _update_flagged(self, batch: ReadingBatch, score, flags, order, starts):
+        # Última leitura de cada sensor no lote decide se ele continua sinalizado
+        ends = np.r_[starts[1:], len(order)] - 1
+        for i in order[ends]:
+            sensor_id = batch.sensor_ids[i]
+            if flags[i]:
+                self.flagged[sensor_id] = {
+                    "sensor_id": sensor_id,
+                    "score": round(float(score[i]), 2),
+                    "reasons": describe_flags(int(flags[i])),
+                    "timestamp": from_epoch_ms(batch.timestamps[i]),
+                }
+            else:
+                self.flagged.pop(sensor_id, None)
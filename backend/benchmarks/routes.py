@@ -0,0 +1,264 @@
+"""Latência e vazão de cada rota da API, em processo e por um uvicorn local.
+
+Para cada transporte:
+
+- `asgi`: `main.app` chamado pela interface ASGI, sem sockets (mede só a
+  aplicação);
+- `uvicorn`: `uvicorn main:app` num subprocesso, via HTTP local (inclui
+  servidor e rede de loopback).
+
+Antes das medições a API recebe uma frota simulada (`--sensors` sensores x
+`--steps` leituras, ver `simulator.FleetSimulator`) por
+`/sensors/data/batch`. Depois, para cada nível de `--concurrency`, cada rota
+recebe `--requests` requisições de N clientes simultâneos; o resultado traz
+p50/p95/p99 (ms) e requisições/s. Com `--json`, grava os resultados (com o
+commit atual) para comparar entre commits; `--baseline` compara com um
+arquivo gravado antes.
+
+Uso (a partir de `backend/`):
+
+    python -m benchmarks.routes --sensors 1000 --steps 10 --concurrency 1 8 32 --json atual.json
+    python -m benchmarks.routes --transport asgi --baseline atual.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.workers import BACKEND_DIR, wait_ready
+from simulator import FleetSimulator, columnar_body
+
+# Ambiente comum aos dois transportes: só memória e sem o controlador
+# automático disparando irrigações no meio das medições
+BENCH_ENV = {
+    "IRRIGATION_CONTROLLER_INTERVAL": "3600",
+    "INGEST_QUEUE_SIZE": "100000",
+}
+UNSET_ENV = ("AGROSMART_DB_PATH", "SHARED_STATE_DIR", "OPENWEATHER_API_KEY")
+
+LOAD_BATCH = 5000
+PERCENTILES = (50, 95, 99)
+
+
+def build_routes(simulator: FleetSimulator) -> Dict[str, Callable[[int], dict]]:
+    """Rota -> função que monta a i-ésima requisição (método, caminho e corpo)."""
+    sensor_ids = simulator.sensor_ids.tolist()
+    zones = sorted(set(simulator.zone_ids.tolist()))
+
+    def sensor_reading(i: int) -> dict:
+        rng = np.random.default_rng(i)
+        return {
+            "sensor_id": sensor_ids[i % len(sensor_ids)],
+            "temperature": round(float(rng.uniform(18, 35)), 1),
+            "humidity": round(float(rng.uniform(45, 85)), 1),
+            "soil_moisture": round(float(rng.uniform(20, 80)), 1),
+            "ph_level": round(float(rng.uniform(5.5, 7.5)), 1),
+            "timestamp": datetime.now().isoformat(),
+            "zone_id": zones[i % len(zones)],
+        }
+
+    return {
+        "/sensors/data": lambda i: {"method": "POST", "url": "/sensors/data", "json": sensor_reading(i)},
+        "/sensors/current": lambda i: {"method": "GET", "url": "/sensors/current"},
+        "/weather/{city}": lambda i: {"method": "GET", "url": "/weather/Campinas"},
+        "/irrigation/activate": lambda i: {
+            "method": "POST", "url": "/irrigation/activate",
+            "json": {"zone_id": zones[i % len(zones)], "duration_minutes": 1},
+        },
+        "/analysis/soil-health": lambda i: {"method": "GET", "url": "/analysis/soil-health"},
+        "/dashboard/summary": lambda i: {"method": "GET", "url": "/dashboard/summary"},
+    }
+
+
+async def load_dataset(client: httpx.AsyncClient, simulator: FleetSimulator, steps: int) -> int:
+    loaded = 0
+    for batch in simulator.run(steps):
+        for lo in range(0, len(batch), LOAD_BATCH):
+            hi = min(lo + LOAD_BATCH, len(batch))
+            while True:
+                response = await client.post("/sensors/data/batch", content=columnar_body(batch, lo, hi),
+                                             headers={"Content-Type": "application/json"})
+                if response.status_code != 503:
+                    break
+                await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+            response.raise_for_status()
+            loaded += hi - lo
+    return loaded
+
+
+async def measure(client: httpx.AsyncClient, build: Callable[[int], dict], requests: int, concurrency: int,
+                  warmup: int) -> dict:
+    for i in range(warmup):
+        await client.request(**build(i))
+
+    latencies: List[float] = []
+    errors = 0
+    next_index = warmup
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < warmup + requests:
+            i, next_index = next_index, next_index + 1
+            t0 = time.perf_counter()
+            response = await client.request(**build(i))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = {f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in PERCENTILES}
+    result.update({
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "rps": round(requests / elapsed, 1),
+        "errors": errors,
+    })
+    return result
+
+
+async def run_suite(client: httpx.AsyncClient, transport: str, args) -> List[dict]:
+    simulator = FleetSimulator(args.sensors, seed=args.seed)
+    started = time.perf_counter()
+    loaded = await load_dataset(client, simulator, args.steps)
+    print(f"[{transport}] {loaded} leituras carregadas em {time.perf_counter() - started:.1f} s")
+
+    routes = build_routes(simulator)
+    selected = args.routes or list(routes)
+    results = []
+    for concurrency in args.concurrency:
+        for route in selected:
+            result = await measure(client, routes[route], args.requests, concurrency, args.warmup)
+            results.append({"transport": transport, "route": route, "concurrency": concurrency, **result})
+            print_row(results[-1])
+    return results
+
+
+async def run_asgi(args) -> List[dict]:
+    os.environ.update(BENCH_ENV)
+    for name in UNSET_ENV:
+        os.environ.pop(name, None)
+    import main  # depois do ambiente: a configuração é lida na importação
+
+    await main.start_background_tasks()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await run_suite(client, "asgi", args)
+    finally:
+        await main.stop_background_tasks()
+
+
+def start_server(port: int) -> subprocess.Popen:
+    env = {**os.environ, **BENCH_ENV}
+    for name in UNSET_ENV:
+        env.pop(name, None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def run_uvicorn(args) -> List[dict]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.port)
+    try:
+        await asyncio.to_thread(wait_ready, base_url)
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+            return await run_suite(client, "uvicorn", args)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_header():
+    print(f"{'transporte':<10} {'rota':<22} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>9} {'erros':>6}")
+
+
+def print_row(r: dict):
+    print(f"{r['transport']:<10} {r['route']:<22} {r['concurrency']:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+          f"{r['p99_ms']:>9.2f} {r['rps']:>9.1f} {r['errors']:>6}")
+
+
+def compare(results: List[dict], path: str):
+    """Variação de p95 e req/s em relação a um resultado gravado antes."""
+    with open(path) as f:
+        baseline = json.load(f)
+    key: Callable[[dict], Tuple] = lambda r: (r["transport"], r["route"], r["concurrency"])
+    before = {key(r): r for r in baseline["results"]}
+    print(f"\ncomparado com {path} (commit {baseline.get('commit')})")
+    print(f"{'transporte':<10} {'rota':<22} {'conc':>5} {'p95':>9} {'req/s':>9}")
+    for r in results:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        p95 = (r["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        rps = (r["rps"] / old["rps"] - 1) * 100 if old["rps"] else 0.0
+        print(f"{r['transport']:<10} {r['route']:<22} {r['concurrency']:>5} {p95:>+8.1f}% {rps:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", nargs="+", choices=("asgi", "uvicorn"), default=["asgi", "uvicorn"])
+    parser.add_argument("--routes", nargs="+", help="padrão: todas as rotas medidas")
+    parser.add_argument("--sensors", type=int, default=1000, help="sensores da frota carregada")
+    parser.add_argument("--steps", type=int, default=10, help="leituras por sensor carregadas antes das medições")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="clientes simultâneos")
+    parser.add_argument("--requests", type=int, default=200, help="requisições por rota e concorrência")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--baseline", help="JSON de uma rodada anterior para comparar")
+    args = parser.parse_args()
+    if args.routes:
+        unknown = set(args.routes) - set(build_routes(FleetSimulator(1)))
+        if unknown:
+            parser.error(f"rotas desconhecidas: {', '.join(sorted(unknown))}")
+
+    print(f"{os.cpu_count()} CPUs; {args.sensors} sensores x {args.steps} leituras, "
+          f"{args.requests} requisições por rota")
+    print_header()
+    results = []
+    for transport in args.transport:
+        runner = run_asgi if transport == "asgi" else run_uvicorn
+        results += asyncio.run(runner(args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+                "results": results,
+            }, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compara a serialização padrão do FastAPI com o caminho rápido (orjson).
+
+Monta um payload de leituras no formato de `SensorData` e mede, pela
+interface ASGI (sem rede), duas rotas idênticas:
+
+- `before`: `response_model=List[SensorData]`, com revalidação do modelo e
+  codificação padrão do FastAPI;
+- `after`: o mesmo conteúdo devolvido como `FastJSONResponse`.
+
+Uso (a partir de `backend/`):
+
+    python -m benchmarks.serialization --readings 10000 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+from main import SensorData
+from serialization import FastJSONResponse
+
+
+def build_readings(n: int, seed: int = 0) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    start = datetime.now() - timedelta(seconds=n)
+    temperature = np.round(rng.uniform(18, 35, n), 1).tolist()
+    humidity = np.round(rng.uniform(45, 85, n), 1).tolist()
+    moisture = np.round(rng.uniform(20, 80, n), 1).tolist()
+    ph = np.round(rng.uniform(5.5, 7.5, n), 1).tolist()
+    return [
+        {
+            "sensor_id": f"AGRO_{i % 1000:04d}",
+            "temperature": temperature[i],
+            "humidity": humidity[i],
+            "soil_moisture": moisture[i],
+            "ph_level": ph[i],
+            "timestamp": start + timedelta(seconds=i),
+            "zone_id": f"Zona {i % 50 + 1}",
+        }
+        for i in range(n)
+    ]
+
+
+def build_app(readings: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before", response_model=List[SensorData])
+    async def before():
+        return readings
+
+    @app.get("/after", response_model=List[SensorData])
+    async def after():
+        return FastJSONResponse(readings)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> dict:
+    await client.get(path)  # aquecimento
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    return {
+        "path": path,
+        "bytes": len(response.content),
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+        "rps": requests / elapsed,
+        "body": response.content,
+    }
+
+
+async def run(readings: int, requests: int):
+    app = build_app(build_readings(readings))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        before = await measure(client, "/before", requests)
+        after = await measure(client, "/after", requests)
+
+    # Os dois caminhos devem produzir o mesmo documento
+    assert json.loads(before.pop("body")) == json.loads(after.pop("body")), "respostas diferentes"
+
+    print(f"{readings} leituras por resposta, {requests} requisições por rota")
+    print(f"{'rota':<8} {'bytes':>10} {'média ms':>10} {'p50 ms':>10} {'máx ms':>10} {'req/s':>8}")
+    for result in (before, after):
+        print(f"{result['path']:<8} {result['bytes']:>10} {result['mean_ms']:>10.2f} {result['p50_ms']:>10.2f} "
+              f"{result['max_ms']:>10.2f} {result['rps']:>8.1f}")
+    print(f"ganho de vazão: {after['rps'] / before['rps']:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.readings, args.requests))
+
+
+if __name__ == "__main__":
+    main()
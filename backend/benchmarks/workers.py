@@ -0,0 +1,224 @@
+"""Ingestão e consistência com vários workers (backend de estado compartilhado).
+
+Para cada quantidade de workers, sobe `uvicorn main:app --workers N` com
+`SHARED_STATE_DIR` num diretório novo, envia lotes colunares de vários
+processos clientes (uma fazenda por conexão, espalhadas entre os workers
+donos) por `--duration` segundos e mede leituras/s. Em seguida verifica a
+consistência falando com cada worker pelo socket do slot dele:
+
+- a soma das leituras armazenadas pelos donos é igual ao total confirmado
+  aos clientes (cada leitura processada uma única vez);
+- o resumo da frota é o mesmo em todos os workers;
+- uma irrigação ativada num worker aparece no status de todos.
+
+Uso (a partir de `backend/`):
+
+    python -m benchmarks.workers --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers: int, port: int, state_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SHARED_STATE_DIR": state_dir,
+        "SHARED_WORKERS": str(workers),
+        "IRRIGATION_CONTROLLER_INTERVAL": "3600",
+        "INGEST_QUEUE_SIZE": "100000",
+        # Uma fazenda por conexão: buffers menores mantêm todos os sensores dentro do limite de memória
+        "SENSOR_BUFFER_CAPACITY": "512",
+    }
+    env.pop("AGROSMART_DB_PATH", None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/metrics/state", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Servidor não respondeu")
+
+
+def wait_workers(state_dir: str, workers: int, timeout: float = 60):
+    """Espera cada worker responder no socket do próprio slot."""
+    deadline = time.monotonic() + timeout
+    clients = worker_clients(state_dir, workers)
+    try:
+        for client in clients:
+            while True:
+                try:
+                    if client.get("/metrics/state", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Workers não responderam em {state_dir}")
+                time.sleep(0.2)
+    finally:
+        for client in clients:
+            client.close()
+
+
+async def _client(base_url: str, client_id: int, connections: int, batch_size: int, sensors: int,
+                  duration: float) -> tuple:
+    rng = np.random.default_rng(client_id)
+    sensor_ids = [f"B{client_id}_{i}" for i in range(sensors)]
+    sent = rejected = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient, offset: int, farm_id: str):
+        nonlocal sent, rejected
+        position = offset
+        while time.monotonic() < deadline:
+            ids = [sensor_ids[(position + i) % sensors] for i in range(batch_size)]
+            position += batch_size
+            body = {
+                "sensor_id": ids,
+                "temperature": rng.uniform(18, 35, batch_size).round(1).tolist(),
+                "humidity": rng.uniform(45, 85, batch_size).round(1).tolist(),
+                "soil_moisture": rng.uniform(20, 80, batch_size).round(1).tolist(),
+                "ph_level": rng.uniform(5.5, 7.5, batch_size).round(1).tolist(),
+                "zone_id": [f"Zona {i % 50 + 1}" for i in range(batch_size)],
+            }
+            response = await client.post(f"{base_url}/sensors/data/batch", params={"farm_id": farm_id}, json=body)
+            if response.status_code == 200:
+                sent += batch_size
+            else:
+                rejected += 1
+                await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(worker(client, i * batch_size, f"bench{client_id}-{i}") for i in range(connections)))
+    return sent, rejected
+
+
+def run_client(args: tuple) -> tuple:
+    return asyncio.run(_client(*args))
+
+
+def worker_clients(state_dir: str, workers: int) -> list:
+    """Um cliente por worker, pelo socket do slot (sem passar pelo roteamento entre workers)."""
+    return [
+        httpx.Client(transport=httpx.HTTPTransport(uds=os.path.join(state_dir, "slots", f"{slot}.sock")),
+                     base_url="http://worker", timeout=30)
+        for slot in range(workers)
+    ]
+
+
+def check_consistency(state_dir: str, workers: int, expected: int) -> dict:
+    """Lê de cada worker e compara as respostas."""
+    clients = worker_clients(state_dir, workers)
+    try:
+        states = [client.get("/metrics/state").json() for client in clients]
+        summaries = Counter(client.get("/dashboard/summary").json()["total_sensors"] for client in clients)
+
+        response = clients[0].post("/irrigation/activate", json={"zone_id": "BENCH", "duration_minutes": 5})
+        response.raise_for_status()
+        run_id = response.json()["run_id"]
+        time.sleep(0.5)  # espelho do estado de irrigação nos demais workers
+        irrigation = Counter(
+            any(run["run_id"] == run_id for run in client.get("/irrigation/status").json()["active_systems"])
+            for client in clients
+        )
+    finally:
+        for client in clients:
+            client.close()
+
+    stored = sum(state["stored_readings"] for state in states)
+    return {
+        "workers_seen": len({state["pid"] for state in states}),
+        "readings_consistent": stored == expected and len(summaries) == 1,
+        "stored_readings": [state["stored_readings"] for state in states],
+        "irrigation_consistent": list(irrigation) == [True],
+        "lost_readings": max(state["readings"]["lost"] for state in states),
+    }
+
+
+def run(workers: int, args) -> dict:
+    state_dir = tempfile.mkdtemp(prefix="agrosmart-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port, state_dir)
+    try:
+        wait_ready(base_url)
+        wait_workers(state_dir, workers)
+        jobs = [(base_url, i, args.connections, args.batch, args.sensors, args.duration)
+                for i in range(args.clients)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(run_client, jobs)
+        elapsed = time.perf_counter() - started
+        sent = sum(r[0] for r in results)
+        return {
+            "workers": workers,
+            "readings": sent,
+            "rejected_batches": sum(r[1] for r in results),
+            "readings_per_second": sent / elapsed,
+            **check_consistency(state_dir, workers, sent),
+        }
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10, help="segundos de carga por rodada")
+    parser.add_argument("--clients", type=int, default=4, help="processos clientes")
+    parser.add_argument("--connections", type=int, default=4, help="conexões por cliente")
+    parser.add_argument("--batch", type=int, default=500, help="leituras por requisição")
+    parser.add_argument("--sensors", type=int, default=1000, help="sensores por cliente")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs; {args.clients} clientes x {args.connections} conexões, lotes de {args.batch}")
+    print(f"{'workers':>7} {'leituras/s':>12} {'escala':>7} {'workers vistos':>15} {'leituras ok':>12} "
+          f"{'irrigação ok':>13} {'perdidas':>9}")
+    results = []
+    for workers in args.workers:
+        result = run(workers, args)
+        results.append(result)
+        scale = result["readings_per_second"] / results[0]["readings_per_second"]
+        print(f"{workers:>7} {result['readings_per_second']:>12.0f} {scale:>6.2f}x {result['workers_seen']:>15} "
+              f"{str(result['readings_consistent']):>12} {str(result['irrigation_consistent']):>13} "
+              f"{result['lost_readings']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(r["readings_consistent"] and r["irrigation_consistent"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
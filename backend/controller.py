@@ -0,0 +1,192 @@
+"""Controle automático de irrigação em malha fechada.
+
+A cada ciclo o controlador lê a umidade atual de todas as zonas (colunas
+por slot de `SoilAggregates`, em cada shard de fazendas com o lock do
+shard, via `ShardedStore.gather`; com vários workers, os shards dos outros
+processos decidem no worker dono), soma o crédito da chuva prevista e
+decide, numa passagem vetorizada por shard, quais zonas começam e quais
+param de irrigar:
+
+- inicia quando `umidade + chuva_prevista * rain_credit < start_below`;
+- para uma execução automática quando `umidade >= stop_above` (histerese).
+
+Só zonas com modo automático são controladas (ou todas, com
+`manage_all`), e execuções manuais nunca são interrompidas. Em `dry_run`
+as decisões são calculadas e registradas, mas não aplicadas.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from aggregates import SoilAggregates
+from irrigation import IrrigationScheduler
+from shards import ShardedStore
+
+logger = logging.getLogger(__name__)
+
+
+class IrrigationController:
+    def __init__(self, shards: ShardedStore, scheduler: IrrigationScheduler,
+                 precipitation: Callable[[], Optional[float]], interval: float = 60,
+                 start_below: float = 30, stop_above: float = 45, rain_credit: float = 1.0,
+                 run_minutes: int = 30, max_reading_age: float = 1800, manage_all: bool = False,
+                 dry_run: bool = False):
+        self.shards = shards  # ShardedStore; a decisão de cada shard é o parcial "irrigation_decisions"
+        shards.partials["irrigation_decisions"] = self._decide_zones
+        self.scheduler = scheduler
+        self.precipitation = precipitation  # mm previstos para as próximas 24h
+        self.interval = interval
+        self.start_below = start_below
+        self.stop_above = stop_above
+        self.rain_credit = rain_credit  # pontos de umidade por mm de chuva
+        self.run_minutes = run_minutes
+        self.max_reading_age = max_reading_age
+        self.manage_all = manage_all
+        self.dry_run = dry_run
+        self.auto_zones = set()
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.errors = 0
+        self.starts = 0
+        self.stops = 0
+        self.last_tick = None
+        self.max_decision_ms = 0.0
+        self.total_decision_ms = 0.0
+
+    def set_auto(self, zone_id: str, enabled: bool):
+        if enabled:
+            self.auto_zones.add(zone_id)
+        else:
+            self.auto_zones.discard(zone_id)
+
+    @staticmethod
+    def _slot_mask(aggregates: SoilAggregates, zones: Iterable[str], n: int) -> np.ndarray:
+        mask = np.zeros(n, dtype=bool)
+        slots = aggregates.zone_slots
+        idx = [slots[zone_id] for zone_id in zones if zone_id in slots]
+        mask[np.array(idx, dtype=np.intp)] = True
+        return mask
+
+    def decide(self, aggregates: SoilAggregates, rain: float, now: Optional[float] = None,
+               active: Optional[dict] = None, auto_zones: Optional[Iterable[str]] = None) -> dict:
+        """Calcula as máscaras de início e parada para todas as zonas dos agregados de uma vez.
+
+        `active` e `auto_zones` são cópias do estado do agendador, para a decisão
+        poder rodar numa thread enquanto o event loop o altera.
+        """
+        now = time.time() if now is None else now
+        moisture, last_update_ms = aggregates.zone_moisture()
+        n = len(moisture)
+
+        auto_zones = self.auto_zones if auto_zones is None else auto_zones
+        managed = np.ones(n, dtype=bool) if self.manage_all else self._slot_mask(aggregates, auto_zones, n)
+        active = self.scheduler.active if active is None else active
+        irrigating = self._slot_mask(aggregates, active, n)
+        auto_runs = self._slot_mask(aggregates, (z for z, log in active.items() if log["auto_mode"]), n)
+        fresh = (now * 1000 - last_update_ms) <= self.max_reading_age * 1000
+        known = ~np.isnan(moisture) & fresh
+
+        with np.errstate(invalid="ignore"):
+            start = managed & known & ~irrigating & (moisture + rain * self.rain_credit < self.start_below)
+            stop = managed & known & auto_runs & (moisture >= self.stop_above)
+        return {"start": start, "stop": stop, "managed": managed, "moisture": moisture}
+
+    def _decide_zones(self, shard, farm_id: Optional[str], rain: float, now: float, active: dict,
+                      auto_zones: Iterable[str]) -> tuple:
+        aggregates = shard.aggregates
+        decision = self.decide(aggregates, rain, now, active, auto_zones)
+        names = aggregates.zone_names
+        return (
+            [names[i] for i in np.flatnonzero(decision["start"])],
+            [names[i] for i in np.flatnonzero(decision["stop"])],
+            len(decision["moisture"]),
+            int(decision["managed"].sum()),
+        )
+
+    async def tick(self, now: Optional[float] = None, dry_run: Optional[bool] = None) -> dict:
+        """Um ciclo de decisão; `dry_run` substitui a configuração só neste ciclo."""
+        now = time.time() if now is None else now
+        dry_run = self.dry_run if dry_run is None else dry_run
+        rain = self.precipitation() or 0.0
+        # Só o necessário para a decisão, que pode seguir para outros workers
+        active = {zone_id: {"auto_mode": log["auto_mode"]} for zone_id, log in self.scheduler.active.items()}
+        auto_zones = sorted(self.auto_zones)
+        started, stopped = [], []
+        zones = managed = 0
+        t0 = time.perf_counter()
+        # Decide com o lock de cada shard; as execuções são aplicadas depois, já sem ele
+        for start, stop, shard_zones, shard_managed in await self.shards.gather(
+                "irrigation_decisions", None, rain, now, active, auto_zones):
+            started += start
+            stopped += stop
+            zones += shard_zones
+            managed += shard_managed
+        decision_ms = (time.perf_counter() - t0) * 1000
+
+        t1 = time.perf_counter()
+        if not dry_run:
+            for zone_id in started:
+                self.scheduler.start_run(zone_id, self.run_minutes, auto_mode=True, now=now)
+            for zone_id in stopped:
+                self.scheduler.stop_run(zone_id, now)
+            self.starts += len(started)
+            self.stops += len(stopped)
+        apply_ms = (time.perf_counter() - t1) * 1000
+
+        self.ticks += 1
+        self.total_decision_ms += decision_ms
+        self.max_decision_ms = max(self.max_decision_ms, decision_ms)
+        self.last_tick = {
+            "at": datetime.fromtimestamp(now),
+            "dry_run": dry_run,
+            "zones": zones,
+            "managed_zones": managed,
+            "forecast_precipitation": rain,
+            "start": started[:50],
+            "stop": stopped[:50],
+            "start_count": len(started),
+            "stop_count": len(stopped),
+            "decision_ms": round(decision_ms, 3),
+            "apply_ms": round(apply_ms, 3),
+        }
+        return self.last_tick
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception:
+                # Um ciclo com erro não derruba o controle: o próximo tenta de novo
+                self.errors += 1
+                logger.exception("Falha no ciclo do controle automático de irrigação")
+
+    def metrics(self) -> dict:
+        return {
+            "interval": self.interval,
+            "dry_run": self.dry_run,
+            "auto_zones": "all" if self.manage_all else len(self.auto_zones),
+            "ticks": self.ticks,
+            "errors": self.errors,
+            "starts": self.starts,
+            "stops": self.stops,
+            "avg_decision_ms": round(self.total_decision_ms / self.ticks, 3) if self.ticks else None,
+            "max_decision_ms": round(self.max_decision_ms, 3),
+            "last_tick": self.last_tick,
+        }
@@ -0,0 +1,40 @@
+"""Redução de séries para gráficos com Largest-Triangle-Three-Buckets (LTTB)."""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Retorna os índices dos `n_out` pontos que preservam a forma da série.
+
+    O primeiro e o último ponto são mantidos; os demais são divididos em
+    `n_out - 2` buckets e, em cada um, escolhe-se o ponto que forma o maior
+    triângulo com o ponto escolhido no bucket anterior e a média do próximo.
+    As médias e as áreas são calculadas com operações vetorizadas; o laço
+    percorre apenas os buckets, então o custo em Python depende de `n_out`.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Limites dos buckets sobre os pontos internos [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    # Para cada bucket, a média do bucket seguinte (o último usa o ponto final)
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
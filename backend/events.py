@@ -0,0 +1,152 @@
+"""Feed de eventos ao vivo (Server-Sent Events).
+
+Publica três tipos de evento para os clientes conectados:
+
+- `sensors`: última leitura de cada sensor que mudou, agrupada e enviada
+  a cada `flush_interval` segundos (no máximo uma entrada por sensor);
+- `alerts`: transições das regras de alerta (disparo/normalização);
+- `irrigation`: mudanças de estado das execuções de irrigação.
+
+Cada assinante tem uma fila limitada; um cliente lento que enche a fila
+perde eventos e recebe um evento `resync`, indicando que deve recarregar
+o estado completo. Os últimos eventos ficam num buffer para retomar a
+conexão a partir do cabeçalho `Last-Event-ID`. Eventos publicados durante
+essa retomada chegam pela fila e pelo buffer: o assinante descarta os que
+têm id já enviado.
+"""
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch, from_epoch_ms
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = 256, history: int = 1000, flush_interval: float = 1.0,
+                 heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[asyncio.Queue, bool] = {}  # fila -> perdeu eventos
+        self._history: deque = deque(maxlen=history)
+        self._pending_sensors: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.last_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data) -> None:
+        self.last_id += 1
+        message = f"id: {self.last_id}\nevent: {event}\ndata: {json.dumps(data, default=_encode)}\n\n"
+        self._history.append((self.last_id, message))
+        self.published += 1
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait((self.last_id, message))
+            except asyncio.QueueFull:
+                self._subscribers[queue] = True
+                self.dropped += 1
+
+    def stage_readings(self, batch: ReadingBatch):
+        """Guarda a última leitura de cada sensor do lote para o próximo envio."""
+        if not self._subscribers or not len(batch):
+            return
+        # Última ocorrência de cada sensor: primeira ocorrência no lote invertido
+        _, first = np.unique(batch.sensor_ids[::-1], return_index=True)
+        last = len(batch) - 1 - first
+        values = batch.values[:, last].T.tolist()
+        for i, row in zip(last.tolist(), values):
+            sensor_id = batch.sensor_ids[i]
+            self._pending_sensors[sensor_id] = {
+                "sensor_id": sensor_id,
+                "zone_id": batch.zone_ids[i],
+                "timestamp": from_epoch_ms(batch.timestamps[i]),
+                **dict(zip(METRICS, row)),
+            }
+
+    @staticmethod
+    def alert_changes(batch: ReadingBatch, result: Dict[str, Dict[str, np.ndarray]], limit: int = 500) -> List[dict]:
+        """Transições de alerta (disparo/normalização) do lote, no máximo `limit`."""
+        changes = []
+        for state, masks in (("raised", result["raised"]), ("cleared", result["cleared"])):
+            for rule_id, mask in masks.items():
+                for i in np.flatnonzero(mask)[:limit]:
+                    changes.append({"sensor_id": batch.sensor_ids[i], "rule_id": rule_id, "state": state})
+        return changes[:limit]
+
+    def flush(self):
+        if self._pending_sensors:
+            readings, self._pending_sensors = list(self._pending_sensors.values()), {}
+            self.publish("sensors", readings)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def stream(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Mensagens SSE para um assinante, desde `last_event_id` se ainda estiver no buffer."""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers[queue] = False
+        # Maior id já enviado; a fila recebe tudo a partir daqui
+        sent = self.last_id
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id is not None:
+                # Ids além do atual vêm de antes de um reinício da API: também pede recarga
+                if last_event_id > sent or (self._history and self._history[0][0] > last_event_id + 1):
+                    yield "event: resync\ndata: {}\n\n"
+                sent = min(last_event_id, sent)
+                for event_id, message in list(self._history):
+                    if event_id > sent:
+                        sent = event_id
+                        yield message
+            while True:
+                if self._subscribers[queue]:
+                    # Fila transbordou: descarta o atraso e pede recarga completa
+                    while not queue.empty():
+                        queue.get_nowait()
+                    self._subscribers[queue] = False
+                    yield "event: resync\ndata: {}\n\n"
+                try:
+                    event_id, message = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event_id > sent:
+                    sent = event_id
+                    yield message
+        finally:
+            self._subscribers.pop(queue, None)
+
+    def metrics(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "dropped": self.dropped,
+            "last_event_id": self.last_id,
+        }
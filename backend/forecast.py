@@ -0,0 +1,146 @@
+"""Previsões por cidade pré-calculadas e servidas como bytes imutáveis.
+
+Uma tarefa em segundo plano atualiza periodicamente a previsão de cada
+cidade conhecida e guarda o JSON já serializado junto com o seu ETag. A
+rota apenas consulta o dicionário e escreve os bytes; clientes que
+repetem a consulta com `If-None-Match` recebem `304 Not Modified`.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class ForecastSnapshot(NamedTuple):
+    body: bytes
+    etag: str
+    generated_at: float  # time.time()
+    forecast: tuple  # dias já decodificados, para consumo interno
+
+
+class SimulatedForecastProvider:
+    """Previsão simulada de 5 dias (sem chamada externa)."""
+
+    async def forecast(self, city: str, days: int = 5) -> List[dict]:
+        today = datetime.now()
+        return [
+            {
+                "date": (today + timedelta(days=i)).strftime("%Y-%m-%d"),
+                "temperature_max": round(random.uniform(25, 35), 1),
+                "temperature_min": round(random.uniform(15, 25), 1),
+                "humidity": round(random.uniform(50, 80), 1),
+                "precipitation": round(random.uniform(0, 10), 1),
+                "description": random.choice(["Sunny", "Partly cloudy", "Cloudy", "Light rain", "Heavy rain"]),
+            }
+            for i in range(days)
+        ]
+
+
+def build_snapshot(city: str, forecast: List[dict]) -> ForecastSnapshot:
+    body = json.dumps({"city": city, "forecast": forecast}, ensure_ascii=False, separators=(",", ":")).encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+    return ForecastSnapshot(body, etag, time.time(), tuple(forecast))
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Compara com `If-None-Match`: lista separada por vírgulas, `*` ou ETags fracas (W/)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ForecastService:
+    def __init__(self, provider, refresh_interval: float = 1800, max_cities: int = 256,
+                 cities: Iterable[str] = ()):
+        self.provider = provider
+        self.refresh_interval = refresh_interval
+        self.max_cities = max_cities
+        # chave -> snapshot; a ordem é a do último acesso (LRU)
+        self.snapshots: "OrderedDict[str, ForecastSnapshot]" = OrderedDict()
+        self.names: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._initial = [city for city in cities if city.strip()]
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @staticmethod
+    def key(city: str) -> str:
+        return city.strip().casefold()
+
+    def start(self):
+        for city in self._initial:
+            self.names.setdefault(self.key(city), city.strip())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self._refresh(key) for key in list(self.names)), return_exceptions=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    def _refresh(self, key: str) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._build(key))
+        return task
+
+    async def _build(self, key: str) -> ForecastSnapshot:
+        city = self.names[key]
+        try:
+            snapshot = build_snapshot(city, await self.provider.forecast(city))
+        except Exception:
+            self.refresh_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.refreshes += 1
+        if key in self.names:
+            self.snapshots[key] = snapshot
+        return snapshot
+
+    async def get(self, city: str) -> ForecastSnapshot:
+        key = self.key(city)
+        snapshot = self.snapshots.get(key)
+        if snapshot is not None:
+            self.snapshots.move_to_end(key)
+            return snapshot
+        # Cidade nova: passa a ser atualizada pela tarefa periódica
+        self.names.setdefault(key, city.strip())
+        snapshot = await self._refresh(key)
+        self.snapshots.move_to_end(key)
+        while len(self.snapshots) > self.max_cities:
+            old, _ = self.snapshots.popitem(last=False)
+            self.names.pop(old, None)
+        return snapshot
+
+    def precipitation(self, city: str, days: int = 1) -> Optional[float]:
+        """Precipitação prevista (mm) nos próximos `days` dias, se a cidade já tiver previsão."""
+        snapshot = self.snapshots.get(self.key(city))
+        if snapshot is None:
+            return None
+        return sum(day["precipitation"] for day in snapshot.forecast[:days])
+
+    def metrics(self) -> dict:
+        return {
+            "cities": len(self.snapshots),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refresh_interval": self.refresh_interval,
+        }
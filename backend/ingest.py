@@ -0,0 +1,168 @@
+"""Fila assíncrona de ingestão com gravação em lote e contrapressão.
+
+Os handlers HTTP enfileiram lotes de leituras e aguardam o resultado; uma
+tarefa em segundo plano drena a fila agrupando vários lotes numa única
+gravação. Com a fila perto do limite, `submit` recusa novos lotes com
+`QueueFullError` em vez de deixar a latência crescer.
+"""
+import asyncio
+import inspect
+import math
+import time
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from storage import ReadingBatch
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Fila de ingestão cheia")
+        self.retry_after = retry_after
+
+
+def _split(result: Dict, start: int, end: int) -> Dict:
+    """Recorta um resultado por leitura (dicts aninhados de sequências alinhadas ao lote)."""
+    return {
+        key: _split(values, start, end) if isinstance(values, dict) else values[start:end]
+        for key, values in result.items()
+    }
+
+
+class IngestQueue:
+    def __init__(self, commit: Callable[[ReadingBatch], Union[Dict, Awaitable[Dict]]], maxsize: int = 10000,
+                 batch_size: int = 5000, high_watermark: float = 0.9):
+        self._commit = commit
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.high_watermark = max(1, int(maxsize * high_watermark))
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.pending_readings = 0
+        self.rejected = 0
+        self.batches_committed = 0
+        self.readings_committed = 0
+        self.last_batch_size = 0
+        self.avg_batch_size = 0.0
+        self.last_drain_latency = 0.0
+        self.avg_drain_latency = 0.0
+        self.max_drain_latency = 0.0
+        self.avg_commit_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Grava o que ainda estiver na fila e encerra o consumidor."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def retry_after(self) -> int:
+        if not self.avg_batch_size or not self.avg_commit_seconds:
+            return 1
+        throughput = self.avg_batch_size / self.avg_commit_seconds
+        return max(1, math.ceil(self.pending_readings / throughput))
+
+    async def submit(self, batch: ReadingBatch, block: bool = False) -> Dict:
+        """Enfileira um lote e aguarda sua gravação.
+
+        Com `block=False`, recusa o lote quando a fila passou da marca de
+        saturação; com `block=True`, aguarda espaço (contrapressão para streams).
+        """
+        if not self.running:
+            # Sem consumidor (scripts, testes sem lifespan): grava direto
+            return await self._call_commit(batch)
+        if not block and self._queue.qsize() >= self.high_watermark:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        self.pending_readings += len(batch)
+        await self._queue.put((batch, future, time.monotonic()))
+        return await future
+
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            rows = len(items[0][0])
+            while rows < self.batch_size and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                rows += len(items[-1][0])
+            try:
+                await self._drain(items, rows)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            # Devolve o controle ao event loop entre gravações
+            await asyncio.sleep(0)
+
+    async def _call_commit(self, batch: ReadingBatch) -> Dict:
+        result = self._commit(batch)
+        # A gravação pode ser uma corrotina (ex.: processamento numa thread)
+        return await result if inspect.isawaitable(result) else result
+
+    async def _drain(self, items, rows: int):
+        self.pending_readings -= rows
+        batch = ReadingBatch.concat([batch for batch, _, _ in items])
+        started = time.monotonic()
+        try:
+            result = await self._call_commit(batch)
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.monotonic()
+
+        offset = 0
+        for part, future, _ in items:
+            if not future.done():
+                future.set_result(_split(result, offset, offset + len(part)))
+            offset += len(part)
+
+        latency = finished - min(enqueued for _, _, enqueued in items)
+        self.batches_committed += 1
+        self.readings_committed += rows
+        self.last_batch_size = rows
+        self.last_drain_latency = latency
+        self.max_drain_latency = max(self.max_drain_latency, latency)
+        # Médias móveis exponenciais para não guardar histórico
+        alpha = 0.1 if self.batches_committed > 1 else 1.0
+        self.avg_batch_size += alpha * (rows - self.avg_batch_size)
+        self.avg_drain_latency += alpha * (latency - self.avg_drain_latency)
+        self.avg_commit_seconds += alpha * (finished - started - self.avg_commit_seconds)
+
+    def metrics(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth,
+            "queue_maxsize": self.maxsize,
+            "high_watermark": self.high_watermark,
+            "pending_readings": self.pending_readings,
+            "rejected_requests": self.rejected,
+            "batches_committed": self.batches_committed,
+            "readings_committed": self.readings_committed,
+            "batch_size_limit": self.batch_size,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.avg_batch_size, 1),
+            "drain_latency_ms": {
+                "last": round(self.last_drain_latency * 1000, 3),
+                "avg": round(self.avg_drain_latency * 1000, 3),
+                "max": round(self.max_drain_latency * 1000, 3),
+            },
+            "avg_commit_ms": round(self.avg_commit_seconds * 1000, 3),
+        }
@@ -0,0 +1,276 @@
+"""Agendador de irrigação com expiração por heap de prazos.
+
+Cada acionamento entra num min-heap ordenado pelo horário de término; uma
+tarefa assíncrona dorme até o próximo prazo (ou até ser acordada por um
+acionamento que termina antes) e marca as execuções vencidas como
+concluídas. A execução ativa de cada zona fica num dicionário, então as
+consultas de status não percorrem o histórico.
+
+Entradas do heap de execuções interrompidas ou substituídas são
+descartadas quando chegam ao topo (remoção preguiçosa).
+
+Planos agrupam muitas zonas com durações, atrasos de início e um limite
+de zonas simultâneas (bomba/pressão): cada plano tem sua fila de etapas
+ordenada pelo início, e uma etapa só é acionada quando há capacidade.
+"""
+import asyncio
+import heapq
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+class IrrigationScheduler:
+    def __init__(self, on_change: Optional[Callable[[dict], None]] = None, max_plans: int = 1000):
+        self.on_change = on_change
+        self.active: Dict[str, dict] = {}
+        self._heap: List[tuple] = []  # (término em epoch s, run_id, zone_id)
+        self.plans: "OrderedDict[str, dict]" = OrderedDict()
+        self._plan_heap: List[tuple] = []  # (início da próxima etapa em epoch s, plan_id)
+        self.max_plans = max_plans
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started_runs = 0
+        self.completed_runs = 0
+        self.stopped_runs = 0
+
+    def _notify(self, log: dict):
+        if self.on_change is not None:
+            self.on_change(log)
+
+    def start_run(self, zone_id: str, duration_minutes: int, auto_mode: bool = False,
+                  now: Optional[float] = None, **extra) -> dict:
+        """Inicia uma execução; se a zona já estiver irrigando, a anterior é interrompida."""
+        now = time.time() if now is None else now
+        self.stop_run(zone_id, now, status="superseded")
+        log = {
+            "run_id": uuid.uuid4().hex,
+            "zone_id": zone_id,
+            "start_time": datetime.fromtimestamp(now),
+            "end_time": datetime.fromtimestamp(now + duration_minutes * 60),
+            "duration_minutes": duration_minutes,
+            "auto_mode": auto_mode,
+            "status": "active",
+            **extra,
+        }
+        self._track(log)
+        self.started_runs += 1
+        self._notify(log)
+        return log
+
+    def _track(self, log: dict):
+        end = log["end_time"].timestamp()
+        self.active[log["zone_id"]] = log
+        self._schedule(self._heap, (end, log["run_id"], log["zone_id"]))
+
+    def _schedule(self, heap: List[tuple], entry: tuple):
+        deadline = self.next_deadline()
+        if deadline is None or entry[0] < deadline:
+            # O novo prazo é o mais próximo: acorda a tarefa para reprogramar o sono
+            if self._wakeup is not None:
+                self._wakeup.set()
+        heapq.heappush(heap, entry)
+
+    def stop_run(self, zone_id: str, now: Optional[float] = None, status: str = "stopped") -> Optional[dict]:
+        log = self.active.pop(zone_id, None)
+        if log is None:
+            return None
+        now = time.time() if now is None else now
+        log["status"] = status
+        log["end_time"] = datetime.fromtimestamp(now)
+        self.stopped_runs += 1
+        self._notify(log)
+        self._finished(log, now)
+        return log
+
+    def tick(self, now: Optional[float] = None) -> List[dict]:
+        """Conclui as execuções cujo prazo venceu; custo O(k log n) para k vencidas."""
+        now = time.time() if now is None else now
+        completed = []
+        while self._heap and self._heap[0][0] <= now:
+            _, run_id, zone_id = heapq.heappop(self._heap)
+            log = self.active.get(zone_id)
+            if log is None or log["run_id"] != run_id:
+                continue  # execução já interrompida ou substituída
+            del self.active[zone_id]
+            log["status"] = "completed"
+            self.completed_runs += 1
+            self._notify(log)
+            self._finished(log, now)
+            completed.append(log)
+        while self._plan_heap and self._plan_heap[0][0] <= now:
+            _, plan_id = heapq.heappop(self._plan_heap)
+            plan = self.plans.get(plan_id)
+            if plan is not None:
+                self._advance(plan, now)
+        return completed
+
+    def next_deadline(self) -> Optional[float]:
+        deadlines = [heap[0][0] for heap in (self._heap, self._plan_heap) if heap]
+        return min(deadlines) if deadlines else None
+
+    # --- planos ---
+
+    def add_plan(self, steps: List[dict], max_concurrent_zones: int, auto_mode: bool = False,
+                 now: Optional[float] = None) -> dict:
+        """Registra um plano; `steps` tem zone_id, duration_minutes e start_offset_minutes."""
+        now = time.time() if now is None else now
+        plan_id = uuid.uuid4().hex
+        plan = {
+            "plan_id": plan_id,
+            "created_at": datetime.fromtimestamp(now),
+            "max_concurrent_zones": max_concurrent_zones,
+            "auto_mode": auto_mode,
+            "steps": [
+                {
+                    "zone_id": step["zone_id"],
+                    "duration_minutes": step["duration_minutes"],
+                    "start_at": now + step.get("start_offset_minutes", 0) * 60,
+                    "status": "pending",
+                    "run_id": None,
+                }
+                for step in steps
+            ],
+            "running": set(),
+            "advancing": False,
+            "counts": {"pending": len(steps), "active": 0, "completed": 0, "stopped": 0},
+        }
+        # Fila de etapas por horário de início; empates seguem a ordem do plano
+        plan["queue"] = [(step["start_at"], i) for i, step in enumerate(plan["steps"])]
+        heapq.heapify(plan["queue"])
+        self.plans[plan_id] = plan
+        while len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+        self._advance(plan, now)
+        return plan
+
+    def _advance(self, plan: dict, now: float):
+        """Aciona as etapas prontas enquanto houver capacidade no plano."""
+        if plan["advancing"]:
+            # Uma etapa repetiu a zona de outra ainda ativa: `start_run` interrompeu a anterior
+            # e chegou aqui por `_finished`. O laço de fora reavalia a capacidade
+            return
+        queue = plan["queue"]
+        plan["advancing"] = True
+        try:
+            while queue and queue[0][0] <= now and len(plan["running"]) < plan["max_concurrent_zones"]:
+                _, i = heapq.heappop(queue)
+                step = plan["steps"][i]
+                log = self.start_run(step["zone_id"], step["duration_minutes"], plan["auto_mode"], now,
+                                     plan_id=plan["plan_id"], plan_step=i)
+                step["run_id"] = log["run_id"]
+                step["status"] = "active"
+                plan["running"].add(log["run_id"])
+                plan["counts"]["pending"] -= 1
+                plan["counts"]["active"] += 1
+        finally:
+            plan["advancing"] = False
+        if queue and queue[0][0] > now and len(plan["running"]) < plan["max_concurrent_zones"]:
+            # Há capacidade, mas a próxima etapa ainda não começou
+            self._schedule(self._plan_heap, (queue[0][0], plan["plan_id"]))
+
+    def _finished(self, log: dict, now: float):
+        plan = self.plans.get(log.get("plan_id"))
+        if plan is None or log["run_id"] not in plan["running"]:
+            return
+        plan["running"].discard(log["run_id"])
+        step = plan["steps"][log["plan_step"]]
+        step["status"] = "completed" if log["status"] == "completed" else "stopped"
+        plan["counts"]["active"] -= 1
+        plan["counts"][step["status"]] += 1
+        self._advance(plan, now)
+
+    def plan_status(self, plan_id: str) -> Optional[dict]:
+        plan = self.plans.get(plan_id)
+        if plan is None:
+            return None
+        counts = plan["counts"]
+        total = len(plan["steps"])
+        if counts["completed"] + counts["stopped"] == total:
+            status = "completed"
+        elif counts["active"] or counts["completed"] or counts["stopped"]:
+            status = "running"
+        else:
+            status = "scheduled"
+        return {
+            "plan_id": plan_id,
+            "status": status,
+            "created_at": plan["created_at"],
+            "max_concurrent_zones": plan["max_concurrent_zones"],
+            "total_zones": total,
+            **counts,
+            "progress": round((counts["completed"] + counts["stopped"]) / total * 100, 1) if total else 100.0,
+            "steps": [
+                {
+                    "zone_id": step["zone_id"],
+                    "duration_minutes": step["duration_minutes"],
+                    "start_at": datetime.fromtimestamp(step["start_at"]),
+                    "status": step["status"],
+                    "run_id": step["run_id"],
+                }
+                for step in plan["steps"]
+            ],
+        }
+
+    def restore(self, logs: List[dict], now: Optional[float] = None):
+        """Recarrega o histórico; execuções ainda dentro do prazo voltam ao heap."""
+        for log in logs:
+            if log["status"] == "active":
+                self._track(log)
+        self.tick(now)
+
+    # --- espelho em outros processos ---
+
+    def apply(self, log: dict):
+        """Aplica uma mudança de estado publicada pelo coordenador (sem heap de prazos)."""
+        zone_id = log["zone_id"]
+        current = self.active.get(zone_id)
+        if current is not None and current["run_id"] == log["run_id"]:
+            current.update(log)
+            log = current
+        if log["status"] == "active":
+            self.active[zone_id] = log
+            self.started_runs += 1
+        else:
+            if log is current:
+                del self.active[zone_id]
+            if log["status"] == "completed":
+                self.completed_runs += 1
+            else:
+                self.stopped_runs += 1
+        self._notify(log)
+
+    def replace_active(self, logs: List[dict]):
+        self.active = {log["zone_id"]: log for log in logs}
+
+    def takeover(self):
+        """Reconstrói o heap de prazos a partir das execuções ativas (novo coordenador)."""
+        self._heap = [(log["end_time"].timestamp(), log["run_id"], zone_id) for zone_id, log in self.active.items()]
+        heapq.heapify(self._heap)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self.tick()
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
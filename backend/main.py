@@ -1,17 +1,52 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import requests
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from starlette.requests import ClientDisconnect
+from starlette.routing import Match
+from typing import Annotated, List, Optional, Union
+from urllib.parse import parse_qs
+from collections import Counter, OrderedDict, defaultdict
+import httpx
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import asyncio
+import copy
+import functools
+import json
+import os
+import queue
+import time
 import uvicorn
 
+import numpy as np
+
+from alerts import RuleEngine
+from anomaly import describe_flags
+from controller import IrrigationController
+from downsampling import lttb
+from events import EventBroker
+from forecast import ForecastService, SimulatedForecastProvider, etag_matches
+import ingest
+from irrigation import IrrigationScheduler
+from peers import PeerNetwork, PeerRouter, PeerUnavailable
+import streaming
+from persistence import SQLitePersistence
+from rollups import RESOLUTIONS
+from serialization import FastJSONResponse, dumps
+from shared_state import CoordinatorUnavailable, LocalState, SharedState
+from shards import FARM_ID_PATTERN, FarmShard, ShardedStore
+from simulator import FleetSimulator
+from storage import (DEFAULT_FARM, FARM_ID_MAX_LENGTH, LOCAL_ID_MAX_LENGTH, METRICS, ReadingBatch, SensorStore,
+                     SharedBudget, scoped_key, split_key, to_epoch_ms, to_local)
+from water import WaterLedger
+from weather import OpenWeatherProvider, SimulatedProvider, WeatherCache, WeatherProviderError
+
 app = FastAPI(
     title="AgroSmart API",
     description="API de Automação Inteligente para Agricultura",
-    version="1.0.0"
+    version="1.0.0",
 )
 
 # CORS middleware
@@ -24,13 +59,61 @@ app.add_middleware(
 )
 
 # Models
+# Ids locais à fazenda; a "/" separa o farm_id nas chaves internas. Os limites de
+# tamanho garantem que as chaves caibam nos registros do anel compartilhado
+LocalId = Annotated[str, Field(pattern=r"^[^/]*$", max_length=LOCAL_ID_MAX_LENGTH)]
+FarmId = Annotated[str, Query(pattern=FARM_ID_PATTERN, max_length=FARM_ID_MAX_LENGTH)]
+# ausente = frota inteira
+OptionalFarmId = Annotated[Optional[str], Query(pattern=FARM_ID_PATTERN, max_length=FARM_ID_MAX_LENGTH)]
+# Medições finitas: "nan"/"inf" (que o pydantic converte para float) contaminariam as somas por zona
+Metric = Annotated[float, Field(allow_inf_nan=False)]
+
 class SensorData(BaseModel):
-    sensor_id: str
-    temperature: float
-    humidity: float
-    soil_moisture: float
-    ph_level: float
+    sensor_id: LocalId
+    temperature: Metric
+    humidity: Metric
+    soil_moisture: Metric
+    ph_level: Metric
     timestamp: datetime
+    zone_id: Optional[LocalId] = None
+
+class SensorColumns(BaseModel):
+    """Lote de leituras em formato colunar compacto"""
+    sensor_id: List[LocalId]
+    temperature: List[Metric]
+    humidity: List[Metric]
+    soil_moisture: List[Metric]
+    ph_level: List[Metric]
+    timestamp: Optional[List[float]] = None  # segundos desde a época; ausente = agora
+    zone_id: Optional[List[Optional[LocalId]]] = None
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        sizes = {len(getattr(self, name)) for name in ("sensor_id",) + METRICS}
+        for optional in (self.timestamp, self.zone_id):
+            if optional is not None:
+                sizes.add(len(optional))
+        if len(sizes) != 1:
+            raise ValueError("Todas as colunas devem ter o mesmo tamanho")
+        return self
+
+    def to_batch(self) -> ReadingBatch:
+        n = len(self.sensor_id)
+        if self.timestamp is None:
+            timestamps = np.full(n, int(datetime.now().timestamp() * 1000), dtype=np.int64)
+        else:
+            timestamps = (np.asarray(self.timestamp, dtype=np.float64) * 1000).astype(np.int64)
+        values = np.array([getattr(self, name) for name in METRICS], dtype=np.float64).reshape(len(METRICS), n)
+        zone_ids = np.array(self.zone_id, dtype=object) if self.zone_id is not None else None
+        return ReadingBatch(np.array(self.sensor_id, dtype=object), timestamps, values, zone_ids)
+
+class SensorRegistration(BaseModel):
+    sensor_id: LocalId
+    zone_id: Optional[LocalId] = None
+    crop: Optional[str] = None  # aplica os ajustes de alerta da cultura à zona
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    farm_id: str = Field(DEFAULT_FARM, pattern=FARM_ID_PATTERN, max_length=FARM_ID_MAX_LENGTH)
 
 class WeatherData(BaseModel):
     location: str
@@ -41,10 +124,26 @@ class WeatherData(BaseModel):
     description: str
     timestamp: datetime
 
+# Limites de duração e atraso de uma irrigação (minutos)
+MAX_IRRIGATION_MINUTES = 24 * 60
+MAX_START_OFFSET_MINUTES = 7 * 24 * 60
+
 class IrrigationCommand(BaseModel):
-    zone_id: str
-    duration_minutes: int
+    zone_id: LocalId
+    duration_minutes: int = Field(gt=0, le=MAX_IRRIGATION_MINUTES)
     auto_mode: bool = False
+    farm_id: str = Field(DEFAULT_FARM, pattern=FARM_ID_PATTERN, max_length=FARM_ID_MAX_LENGTH)
+
+class IrrigationPlanStep(BaseModel):
+    zone_id: LocalId
+    duration_minutes: int = Field(gt=0, le=MAX_IRRIGATION_MINUTES)
+    start_offset_minutes: float = Field(0, ge=0, le=MAX_START_OFFSET_MINUTES)
+
+class IrrigationPlan(BaseModel):
+    zones: List[IrrigationPlanStep] = Field(min_length=1)
+    max_concurrent_zones: int = Field(1, ge=1)  # limite da bomba/pressão
+    auto_mode: bool = False
+    farm_id: str = Field(DEFAULT_FARM, pattern=FARM_ID_PATTERN, max_length=FARM_ID_MAX_LENGTH)
 
 class CropPrediction(BaseModel):
     crop_type: str
@@ -53,135 +152,720 @@ class CropPrediction(BaseModel):
     confidence: float
     recommendations: List[str]
 
-# Simulação de banco de dados em memória
-sensors_data = []
-irrigation_logs = []
-weather_cache = {}
-
 # Configurações de APIs externas
-OPENWEATHER_API_KEY = "demo_key"  # Substitua pela sua chave real
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "demo_key")  # Substitua pela sua chave real
 NASA_API_KEY = "DEMO_KEY"  # Substitua pela sua chave real
 
+# Retenção do armazenamento de sensores
+SENSOR_BUFFER_CAPACITY = int(os.getenv("SENSOR_BUFFER_CAPACITY", "4096"))  # leituras por sensor
+SENSOR_RETENTION_HOURS = float(os.getenv("SENSOR_RETENTION_HOURS", "24"))
+SENSOR_STORE_MAX_MB = float(os.getenv("SENSOR_STORE_MAX_MB", "256"))
+SENSOR_SILENT_MINUTES = float(os.getenv("SENSOR_SILENT_MINUTES", "15"))  # sem contato = sensor inativo
+
+HISTORY_MAX_BUCKETS = 1500  # limite usado na escolha automática de resolução
+
+# Regras de alerta (limites, histerese e ajustes por cultura/zona); cada shard avalia com uma cópia
+ALERT_RULES_PATH = os.getenv("ALERT_RULES_PATH")
+rule_engine = RuleEngine.from_file(ALERT_RULES_PATH)
+
+# Simulação de banco de dados em memória, particionada por fazenda (hash do farm_id -> shard).
+# Cada shard tem séries, rollups, agregados por zona, alertas, anomalias e lock próprios
+FARM_SHARDS = int(os.getenv("FARM_SHARDS", "8"))
+sensor_budget = SharedBudget(int(SENSOR_STORE_MAX_MB * 1024 * 1024))  # limite de memória comum aos shards
+
+def create_shard(index: int) -> FarmShard:
+    sensor_store = SensorStore(
+        capacity_per_sensor=SENSOR_BUFFER_CAPACITY,
+        retention_seconds=SENSOR_RETENTION_HOURS * 3600,
+        max_bytes=sensor_budget.max_bytes,
+        budget=sensor_budget,
+    )
+    return FarmShard(index, sensor_store, copy.deepcopy(rule_engine), silent_after=SENSOR_SILENT_MINUTES * 60)
+
+farm_shards = ShardedStore(FARM_SHARDS, create_shard)
+
+# Sensores simulados de /sensors/current (um simulador por fazenda, as menos usadas saem primeiro)
+SIMULATED_SENSORS = int(os.getenv("SIMULATED_SENSORS", "5"))
+SIMULATED_FARMS = int(os.getenv("SIMULATED_FARMS", "100"))
+SIMULATOR_SEED = int(os.environ["SIMULATOR_SEED"]) if os.getenv("SIMULATOR_SEED") else None
+simulators = OrderedDict()
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))  # leituras por micro-lote
+STREAM_ACK_INTERVAL = float(os.getenv("STREAM_ACK_INTERVAL", "2"))  # segundos
+STREAM_MAX_LINE_BYTES = 64 * 1024
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))  # lotes pendentes por shard
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  # leituras por gravação
+
+
+# Clima: cliente HTTP compartilhado (pool de conexões) e cache por cidade
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))  # segundos
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "3600"))  # valor antigo servido durante a revalidação
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+http_client = httpx.AsyncClient(
+    timeout=WEATHER_TIMEOUT,
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+)
+if OPENWEATHER_API_KEY and OPENWEATHER_API_KEY != "demo_key":
+    weather_provider = OpenWeatherProvider(OPENWEATHER_API_KEY, http_client)
+else:
+    weather_provider = SimulatedProvider()  # sem chave, dados simulados
+
+def persist_weather(city: str, payload: dict):
+    if db is not None:
+        db.save_weather(city, WeatherData(**payload).model_dump(mode="json"))
+
+# Eventos ao vivo (SSE) para o dashboard
+EVENTS_FLUSH_INTERVAL = float(os.getenv("EVENTS_FLUSH_INTERVAL", "1"))  # segundos entre envios de leituras
+event_broker = EventBroker(flush_interval=EVENTS_FLUSH_INTERVAL)
+IRRIGATION_EVENT_FIELDS = ("run_id", "zone_id", "status", "start_time", "end_time", "auto_mode", "plan_id")
+
+# Consumo de água: vazão por zona (L/min) x duração real de cada execução
+IRRIGATION_FLOW_LPM = float(os.getenv("IRRIGATION_FLOW_LPM", "20"))
+IRRIGATION_FLOW_RATES = json.loads(os.getenv("IRRIGATION_FLOW_RATES", "{}"))  # {"Zona 1": 35}
+water_ledgers = {}  # por fazenda, criado na primeira execução registrada
+irrigation_runs = defaultdict(Counter)  # execuções por fazenda e status
+# As consultas não criam estado: fazendas sem execuções leem este ledger, que nunca recebe registros
+empty_water_ledger = WaterLedger(IRRIGATION_FLOW_LPM, IRRIGATION_FLOW_RATES)
+
+def water_ledger_for(farm_id: str) -> WaterLedger:
+    ledger = water_ledgers.get(farm_id)
+    if ledger is None:
+        ledger = water_ledgers[farm_id] = WaterLedger(IRRIGATION_FLOW_LPM, IRRIGATION_FLOW_RATES)
+    return ledger
+
+def on_irrigation_change(log: dict):
+    farm_id = split_key(log["zone_id"])[0]
+    irrigation_runs[farm_id][log["status"]] += 1
+    if log["status"] != "active":
+        water_ledger_for(farm_id).record(log)
+    if db is not None and state_backend.is_leader:
+        db.save_irrigation(log)
+    state_backend.publish_irrigation(log)
+    event_broker.publish("irrigation", {key: log[key] for key in IRRIGATION_EVENT_FIELDS if key in log})
+
+# Execuções de irrigação: heap de prazos e execução ativa por zona (chaves "fazenda/zona")
+irrigation_scheduler = IrrigationScheduler(on_change=on_irrigation_change)
+MAX_PLAN_ZONES = int(os.getenv("MAX_PLAN_ZONES", "10000"))
+
+weather_cache = WeatherCache(weather_provider, ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_STALE_TTL,
+                             timeout=WEATHER_TIMEOUT, on_update=persist_weather)
+
+# Previsões pré-calculadas, atualizadas em segundo plano
+FORECAST_REFRESH_SECONDS = float(os.getenv("FORECAST_REFRESH_SECONDS", "1800"))
+FORECAST_CITIES = os.getenv("FORECAST_CITIES", "Campinas").split(",")
+forecast_service = ForecastService(SimulatedForecastProvider(), refresh_interval=FORECAST_REFRESH_SECONDS,
+                                   cities=FORECAST_CITIES)
+
+# Controle automático: zonas acionadas com auto_mode (ou todas) seguem a umidade e a chuva prevista
+IRRIGATION_CONTROLLER_INTERVAL = float(os.getenv("IRRIGATION_CONTROLLER_INTERVAL", "60"))  # segundos
+IRRIGATION_DRY_RUN = os.getenv("IRRIGATION_DRY_RUN", "false").lower() == "true"
+IRRIGATION_AUTO_ALL = os.getenv("IRRIGATION_AUTO_ALL", "false").lower() == "true"
+irrigation_controller = IrrigationController(
+    farm_shards,
+    irrigation_scheduler,
+    precipitation=lambda: forecast_service.precipitation(FORECAST_CITIES[0]),
+    interval=IRRIGATION_CONTROLLER_INTERVAL,
+    start_below=float(os.getenv("IRRIGATION_START_BELOW", "30")),
+    stop_above=float(os.getenv("IRRIGATION_STOP_ABOVE", "45")),
+    manage_all=IRRIGATION_AUTO_ALL,
+    dry_run=IRRIGATION_DRY_RUN,
+)
+
+# Snapshot do dashboard por cidade e fazenda: (expira em, payload)
+DASHBOARD_SNAPSHOT_TTL = float(os.getenv("DASHBOARD_SNAPSHOT_TTL", "5"))  # segundos
+dashboard_cache = {}
+dashboard_inflight = {}
+
+# Persistência opcional: sem AGROSMART_DB_PATH o estado fica só em memória
+AGROSMART_DB_PATH = os.getenv("AGROSMART_DB_PATH")
+# Leituras aguardando gravação antes de a ingestão responder 503
+AGROSMART_DB_MAX_PENDING = int(os.getenv("AGROSMART_DB_MAX_PENDING", "500000"))
+# Dias de leituras brutas mantidos no banco (0 = sem limite)
+AGROSMART_DB_RETENTION_DAYS = float(os.getenv("AGROSMART_DB_RETENTION_DAYS", "90"))
+db = SQLitePersistence(
+    AGROSMART_DB_PATH,
+    max_pending_rows=AGROSMART_DB_MAX_PENDING,
+    retention_days=AGROSMART_DB_RETENTION_DAYS or None,
+) if AGROSMART_DB_PATH else None
+
+# Estado compartilhado entre workers (uvicorn --workers N); sem SHARED_STATE_DIR, processo único
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR")  # de preferência num tmpfs, ex. /dev/shm/agrosmart
+# Workers que dividem os shards: o mesmo valor de --workers (o uvicorn também lê WEB_CONCURRENCY)
+SHARED_WORKERS = int(os.getenv("SHARED_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+SHARED_RING_CAPACITY = int(os.getenv("SHARED_RING_CAPACITY", "131072"))  # leituras no anel compartilhado
+if SHARED_STATE_DIR:
+    # Com SQLite, o worker restaura os próprios shards do banco em vez de reaplicar o anel
+    state_backend = SharedState(SHARED_STATE_DIR, workers=SHARED_WORKERS, ring_capacity=SHARED_RING_CAPACITY,
+                                replay=db is None)
+    # Requisições de fazendas de outro worker seguem para o dono pelo socket dele
+    peer_network = PeerNetwork(SHARED_STATE_DIR)
+else:
+    state_backend = LocalState()
+    peer_network = None
+farm_shards.assign(state_backend.slot, state_backend.workers)
+
+async def restore_state():
+    """Recarrega do SQLite as leituras dentro da retenção, os logs de irrigação e o cache de clima"""
+    # Com vários workers, cada um restaura só os shards de que é dono
+    for entry in await asyncio.to_thread(db.load_sensors):
+        apply_owned_registration(entry)
+    now_ms = to_epoch_ms(datetime.now())
+    cutoff_ms = now_ms - int(SENSOR_RETENTION_HOURS * 3600 * 1000)
+    batch = await asyncio.to_thread(db.load_readings, cutoff_ms)
+    if len(batch):
+        for shard, part in farm_shards.split(batch):
+            if farm_shards.owns(shard):
+                shard.restore(part)
+    # Agregados anteriores à retenção vêm prontos do SQLite (GROUP BY por bucket)
+    max_buckets = farm_shards.shards[0].rollups.max_buckets
+    for resolution, width in RESOLUTIONS.items():
+        since_ms = now_ms - width * max_buckets[resolution]
+        if since_ms >= cutoff_ms:
+            continue
+        for sensor_id, *aggregates in await asyncio.to_thread(db.load_rollups, width, since_ms, cutoff_ms):
+            shard = farm_shards.shard_for(split_key(sensor_id)[0])
+            if not farm_shards.owns(shard):
+                continue
+            with shard.lock:
+                # Os agregados vivem enquanto o sensor tem buffer (são descartados na expulsão)
+                if sensor_id in shard.sensor_store:
+                    shard.rollups.merge(sensor_id, resolution, *aggregates)
+    logs = await asyncio.to_thread(db.load_irrigation_logs)
+    for log in logs:
+        log["start_time"] = datetime.fromisoformat(log["start_time"])
+        if "end_time" in log:
+            log["end_time"] = datetime.fromisoformat(log["end_time"])
+        else:
+            log["end_time"] = log["start_time"] + timedelta(minutes=log["duration_minutes"])
+    for log in logs:
+        if log["status"] != "active":
+            water_ledger_for(split_key(log["zone_id"])[0]).record(log)
+    irrigation_scheduler.restore(logs)
+    for city, payload in (await asyncio.to_thread(db.load_weather)).items():
+        age = datetime.now() - datetime.fromisoformat(payload["timestamp"])
+        weather_cache.seed(city, payload, age.total_seconds())
+
+def start_irrigation():
+    """Só o coordenador roda o agendador e o controle automático"""
+    irrigation_scheduler.takeover()
+    irrigation_scheduler.start()
+    irrigation_controller.start()
+
+state_backend.on_promote = start_irrigation
+state_backend.on_irrigation = irrigation_scheduler.apply
+state_backend.on_irrigation_snapshot = irrigation_scheduler.replace_active
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if db is not None:
+        db.start()
+    await state_backend.start()
+    if db is not None:
+        await restore_state()
+    for shard in farm_shards:
+        shard.queue.start()
+    event_broker.start()
+    forecast_service.start()
+    if peer_network is not None and state_backend.slot is not None:
+        # Só depois de restaurar os shards: a partir daqui os outros workers encaminham para cá
+        await peer_network.start(app, state_backend.slot)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await asyncio.gather(*(shard.queue.stop() for shard in farm_shards))
+    await event_broker.stop()
+    await forecast_service.stop()
+    await irrigation_controller.stop()
+    await irrigation_scheduler.stop()
+    if peer_network is not None:
+        await peer_network.stop()
+    await state_backend.stop()
+    await http_client.aclose()
+    if db is not None:
+        await asyncio.to_thread(db.close)
+
 @app.get("/")
 async def root():
     return {"message": "AgroSmart API - Sistema de Automação Agrícola"}
 
 # === ROTAS DE SENSORES ===
+async def read_current_sensors(farm_id: str = DEFAULT_FARM) -> List[dict]:
+    """Leituras atuais de todos os sensores da fazenda, já no formato de `SensorData`"""
+    simulator = simulators.get(farm_id)
+    if simulator is None:
+        # Uma zona por sensor, como nos sensores de demonstração originais
+        simulator = simulators[farm_id] = FleetSimulator(SIMULATED_SENSORS, zones=SIMULATED_SENSORS, seed=SIMULATOR_SEED)
+        while len(simulators) > SIMULATED_FARMS:
+            simulators.popitem(last=False)
+    simulators.move_to_end(farm_id)
+    batch = simulator.step()
+    
+    await farm_shards.shard_for(farm_id).queue.submit(batch.with_farm(farm_id), block=True)
+    return FleetSimulator.records(batch)
+
 @app.get("/sensors/current", response_model=List[SensorData])
-async def get_current_sensors():
+async def get_current_sensors(farm_id: FarmId = DEFAULT_FARM):
     """Retorna dados atuais de todos os sensores"""
-    # Simulação de 5 sensores diferentes
-    current_sensors = []
-    for i in range(1, 6):
-        sensor = SensorData(
-            sensor_id=f"AGRO_{i:03d}",
-            temperature=round(random.uniform(18, 35), 1),
-            humidity=round(random.uniform(45, 85), 1),
-            soil_moisture=round(random.uniform(20, 80), 1),
-            ph_level=round(random.uniform(5.5, 7.5), 1),
-            timestamp=datetime.now()
+    return FastJSONResponse(await read_current_sensors(farm_id))
+
+def publish_events(batch: ReadingBatch, result: dict):
+    event_broker.stage_readings(batch)
+    changes = EventBroker.alert_changes(batch, result["alerts"])
+    if changes:
+        event_broker.publish("alerts", changes)
+        state_backend.publish_alerts(changes)
+
+def replay_readings(batch: ReadingBatch):
+    """Leituras do anel compartilhado ao subir: só as dos shards deste worker (roda numa thread)"""
+    for shard, part in farm_shards.split(batch):
+        if farm_shards.owns(shard):
+            shard.process(part)
+
+# Com vários workers, o feed ao vivo também recebe as leituras e alertas processados nos outros
+state_backend.on_replay = replay_readings
+state_backend.on_readings = event_broker.stage_readings
+state_backend.wants_readings = lambda: event_broker.subscribers > 0
+state_backend.on_alerts = functools.partial(event_broker.publish, "alerts")
+
+def process_readings(shard: FarmShard, batch: ReadingBatch) -> dict:
+    state_backend.publish_readings(batch)
+    return shard.process(batch)
+
+async def commit_readings(shard: FarmShard, batch: ReadingBatch):
+    """Grava um lote de leituras e o processa no shard
+
+    O processamento roda numa thread segurando só o lock do shard: as filas
+    e consultas das outras fazendas seguem enquanto isso. Com vários
+    workers, o lote também vai para o anel compartilhado (log do shard).
+    """
+    if db is not None:
+        try:
+            db.save_readings(batch, block=False)
+        except queue.Full:
+            # O lote já foi aceito: espera a gravadora abrir espaço, segurando a fila de ingestão
+            await asyncio.to_thread(db.save_readings, batch)
+    result = await asyncio.to_thread(process_readings, shard, batch)
+    publish_events(batch, result)
+    return result
+
+for _shard in farm_shards:
+    _shard.queue = ingest.IngestQueue(functools.partial(commit_readings, _shard), maxsize=INGEST_QUEUE_SIZE,
+                                      batch_size=INGEST_BATCH_SIZE)
+
+def apply_registration(entry: dict):
+    shard = farm_shards.shard_for(entry["farm_id"])
+    shard.call(shard.register, entry)
+
+def apply_owned_registration(entry: dict):
+    if farm_shards.owns(farm_shards.shard_for(entry["farm_id"])):
+        apply_registration(entry)
+
+# Cadastros do anel (reaplicados ao subir) valem só nos shards deste worker
+state_backend.on_sensor = apply_owned_registration
+
+async def submit_readings(farm_id: str, batch: ReadingBatch):
+    """Enfileira um lote no shard da fazenda, respondendo 503 se a fila ou o banco estiverem saturados"""
+    try:
+        if db is not None and db.saturated():
+            raise ingest.QueueFullError(db.retry_after())
+        return await farm_shards.shard_for(farm_id).queue.submit(batch.with_farm(farm_id))
+    except ingest.QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de ingestão saturada, tente novamente",
+            headers={"Retry-After": str(e.retry_after)},
         )
-        current_sensors.append(sensor)
-        
-    sensors_data.extend(current_sensors)
-    return current_sensors
 
 @app.post("/sensors/data")
-async def receive_sensor_data(sensor: SensorData):
+async def receive_sensor_data(sensor: SensorData, farm_id: FarmId = DEFAULT_FARM):
     """Recebe dados de sensores IoT"""
-    sensors_data.append(sensor)
+    result = await submit_readings(farm_id, ReadingBatch.from_readings([sensor]))
+    alerts, anomaly = result["alerts"], result["anomaly"]
+    flags = int(anomaly["flags"][0])
+    
+    return {
+        "status": "success",
+        "alerts": rule_engine.messages_at(alerts["raised"], 0),
+        "cleared": rule_engine.messages_at(alerts["cleared"], 0),
+        "active_alerts": rule_engine.messages_at(alerts["firing"], 0),
+        "anomaly": {
+            "score": round(float(anomaly["score"][0]), 2),
+            "anomalous": bool(flags),
+            "reasons": describe_flags(flags),
+        },
+    }
+
+async def _ingest_ndjson(request: Request, farm_id: str):
+    """Consome o corpo NDJSON em micro-lotes e emite uma confirmação por lote"""
+    queue = farm_shards.shard_for(farm_id).queue
+    pending = []
+    errors = []
+    totals = {"lines": 0, "committed": 0, "rejected": 0, "anomaly_count": 0,
+              "alert_counts": dict.fromkeys(rule_engine.rule_ids, 0)}
+    acks = 0
+    last_ack = time.monotonic()
+
+    async def flush():
+        nonlocal pending, errors, acks, last_ack
+        batch_alerts = dict.fromkeys(rule_engine.rule_ids, 0)
+        batch_anomalies = 0
+        if pending:
+            # Aguarda espaço na fila: a contrapressão desacelera a leitura do corpo
+            result = await queue.submit(ReadingBatch.from_readings(pending).with_farm(farm_id), block=True)
+            batch_alerts = rule_engine.counts(result["alerts"]["raised"])
+            for key, count in batch_alerts.items():
+                totals["alert_counts"][key] += count
+            batch_anomalies = int(np.count_nonzero(result["anomaly"]["flags"]))
+            totals["anomaly_count"] += batch_anomalies
+            totals["committed"] += len(pending)
+        acks += 1
+        ack = {
+            "ack": acks,
+            "lines": totals["lines"],
+            "committed": totals["committed"],
+            "rejected": totals["rejected"],
+            "batch_size": len(pending),
+            "alert_counts": batch_alerts,
+            "anomaly_count": batch_anomalies,
+            "errors": errors,
+        }
+        pending, errors = [], []
+        last_ack = time.monotonic()
+        return json.dumps(ack).encode() + b"\n"
+
+    try:
+        async for line in streaming.iter_lines(request.stream(), STREAM_MAX_LINE_BYTES):
+            if line is not None and not line.strip():
+                continue
+            totals["lines"] += 1
+            error = None
+            if line is None:
+                error = "Linha excede o tamanho máximo"
+            else:
+                try:
+                    pending.append(SensorData.model_validate_json(line))
+                except ValidationError as e:
+                    error = e.errors()[0]["msg"]
+            if error is not None:
+                totals["rejected"] += 1
+                if len(errors) < 10:
+                    errors.append({"line": totals["lines"], "error": error})
+            if len(pending) >= STREAM_BATCH_SIZE or time.monotonic() - last_ack >= STREAM_ACK_INTERVAL:
+                yield await flush()
+    except ClientDisconnect:
+        # Conexão caiu: grava o que já foi recebido
+        if pending:
+            await flush()
+        return
+
+    if pending or errors:
+        yield await flush()
+    yield json.dumps({"status": "completed", **totals}).encode() + b"\n"
+
+@app.post("/sensors/data/stream")
+async def receive_sensor_stream(request: Request, farm_id: FarmId = DEFAULT_FARM):
+    """Recebe leituras em NDJSON num único request de longa duração"""
+    return streaming.IngestStreamResponse(_ingest_ndjson(request, farm_id), media_type="application/x-ndjson")
+
+@app.post("/sensors/data/batch")
+async def receive_sensor_data_batch(readings: Union[List[SensorData], SensorColumns],
+                                    farm_id: FarmId = DEFAULT_FARM):
+    """Recebe um lote de leituras (lista de objetos ou formato colunar)"""
+    if isinstance(readings, SensorColumns):
+        batch = readings.to_batch()
+    else:
+        batch = ReadingBatch.from_readings(readings)
+    
+    if len(batch) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lote excede o limite de {MAX_BATCH_SIZE} leituras")
+    
+    result = await submit_readings(farm_id, batch)
+    anomalous = np.flatnonzero(result["anomaly"]["flags"])
+    return {
+        "status": "success",
+        **rule_engine.summarize(batch, result["alerts"]),
+        "anomaly_count": len(anomalous),
+        "anomalies": [
+            {
+                "index": int(i),
+                "sensor_id": batch.sensor_ids[i],
+                "score": round(float(result["anomaly"]["score"][i]), 2),
+                "reasons": describe_flags(int(result["anomaly"]["flags"][i])),
+            }
+            for i in anomalous[:100]
+        ],
+    }
+
+@app.get("/sensors/{sensor_id}/history")
+async def get_sensor_history(sensor_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             resolution: str = "auto", max_points: Optional[int] = Query(None, ge=3),
+                             downsample_metric: str = "soil_moisture", farm_id: FarmId = DEFAULT_FARM):
+    """Histórico do sensor com min/max/média/contagem por intervalo de tempo
+    
+    Com `max_points`, a série é reduzida por LTTB sobre a média de `downsample_metric`.
+    """
+    if downsample_metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Métrica inválida: {downsample_metric}")
+    # Datas com fuso (ex.: "...Z") são comparadas com as sem fuso no horário local
+    end = to_local(end) or datetime.now()
+    start = to_local(start) or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'start' deve ser anterior a 'end'")
+    
+    start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+    if resolution == "auto":
+        # Menor resolução que mantém o número de buckets sob o limite
+        span_ms = end_ms - start_ms
+        resolution = next((r for r, w in RESOLUTIONS.items() if span_ms / w <= HISTORY_MAX_BUCKETS), "1d")
+    if resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Resolução inválida (use auto, raw, 1m, 1h ou 1d)")
+    
+    shard = farm_shards.shard_for(farm_id)
+    key = scoped_key(farm_id, sensor_id)
     
-    # Verificar alertas automáticos
-    alerts = []
-    if sensor.soil_moisture < 30:
-        alerts.append("Baixa umidade do solo - Irrigação recomendada")
-    if sensor.ph_level < 6.0 or sensor.ph_level > 7.0:
-        alerts.append("pH do solo fora da faixa ideal")
-    if sensor.temperature > 32:
-        alerts.append("Temperatura alta - Monitorar stress térmico")
+    def read_series():
+        if key not in shard.rollups:
+            return None
+        if resolution == "raw":
+            timestamps, values = shard.sensor_store.slice(key, start, end)
+            return timestamps, np.ones(len(timestamps), dtype=np.int64), values.astype(np.float64), values, values
+        # Cópias: o shard pode gravar nos mesmos buckets depois que o lock for liberado
+        return tuple(part.copy() for part in shard.rollups.query(key, resolution, start_ms, end_ms))
     
-    return {"status": "success", "alerts": alerts}
+    series = await shard.read(read_series)
+    if series is None:
+        raise HTTPException(status_code=404, detail="Sensor não encontrado")
+    timestamps, count, sums, mins, maxs = series
+    
+    means = sums / np.maximum(count, 1)
+    mins, maxs = mins.astype(np.float64), maxs.astype(np.float64)
+    
+    downsampled = max_points is not None and len(timestamps) > max_points
+    if downsampled:
+        keep = lttb(timestamps, means[METRICS.index(downsample_metric)], max_points)
+        timestamps, count = timestamps[keep], count[keep]
+        means, mins, maxs = means[:, keep], mins[:, keep], maxs[:, keep]
+    return FastJSONResponse({
+        "sensor_id": sensor_id,
+        "resolution": resolution,
+        "downsampled": downsampled,
+        "start": start,
+        "end": end,
+        "timestamps": [datetime.fromtimestamp(ms / 1000) for ms in timestamps.tolist()],
+        "count": count,
+        "metrics": {
+            name: {
+                "min": np.round(mins[i], 4),
+                "max": np.round(maxs[i], 4),
+                "mean": np.round(means[i], 4),
+            }
+            for i, name in enumerate(METRICS)
+        },
+    })
+
+@app.post("/sensors/register")
+async def register_sensor(registration: SensorRegistration, request: Request):
+    """Cadastra ou atualiza um sensor (zona, cultura e coordenadas)"""
+    owner = farm_shards.owner(registration.farm_id)
+    if peer_network is not None and owner != state_backend.slot and not request.scope.get("peer"):
+        # O farm_id vem no corpo: o PeerRouter não o vê, o repasse ao dono é feito aqui
+        response = await peer_network.relay(owner, request.method, request.url.path, request.headers.raw,
+                                            await request.body())
+        return Response(content=response.content, status_code=response.status_code,
+                        media_type=response.headers.get("content-type"))
+    entry = {**registration.model_dump(), "registered_at": time.time()}
+    apply_registration(entry)
+    state_backend.publish_sensor(entry)
+    if db is not None:
+        db.save_sensor(entry)
+    return {"status": "success", "sensor": await describe_sensor(registration.farm_id, registration.sensor_id)}
+
+@app.get("/sensors/silent")
+async def get_silent_sensors(minutes: Optional[float] = Query(None, gt=0), farm_id: OptionalFarmId = None,
+                             limit: int = Query(100, ge=1, le=10000)):
+    """Sensores sem contato há mais de `minutes` (padrão SENSOR_SILENT_MINUTES), do mais antigo ao mais recente"""
+    minutes = minutes or SENSOR_SILENT_MINUTES
+    now = time.time()
+    silent = await farm_shards.silent_sensors(farm_id, minutes * 60, limit)
+    return {
+        "minutes": minutes,
+        "count": len(silent),
+        "truncated": len(silent) == limit,
+        "sensors": [
+            {
+                "sensor_id": sensor_id,
+                "farm_id": farm,
+                "last_seen": datetime.fromtimestamp(seen),
+                "silent_minutes": round((now - seen) / 60, 1),
+            }
+            for seen, farm, sensor_id in silent
+        ],
+    }
+
+async def describe_sensor(farm_id: str, sensor_id: str) -> Optional[dict]:
+    shard = farm_shards.shard_for(farm_id)
+    key = scoped_key(farm_id, sensor_id)
+    
+    def describe():
+        registry = shard.registries.get(farm_id)
+        info = registry.describe(sensor_id) if registry is not None else None
+        if info is None:
+            return None
+        zone_id = info.get("zone_id") or split_key(shard.aggregates.sensor_zone.get(key, ""))[1] or None
+        latest = shard.aggregates.latest_reading(key)
+        if latest is not None:
+            latest = {**latest, "sensor_id": sensor_id, "zone_id": split_key(latest["zone_id"])[1]}
+        return {**info, "farm_id": farm_id, "zone_id": zone_id, "latest_reading": latest}
+    
+    return await shard.read(describe)
+
+@app.get("/sensors/{sensor_id}")
+async def get_sensor(sensor_id: str, farm_id: FarmId = DEFAULT_FARM):
+    """Cadastro, último contato e última leitura de um sensor"""
+    info = await describe_sensor(farm_id, sensor_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Sensor não encontrado")
+    return info
 
 # === ROTAS DE CLIMA ===
 @app.get("/weather/{city}", response_model=WeatherData)
 async def get_weather(city: str):
-    """Obtém dados meteorológicos usando OpenWeather API"""
+    """Obtém dados meteorológicos usando OpenWeather API (com cache por cidade)"""
     try:
-        # API real do OpenWeather (requer chave válida)
-        url = f"http://api.openweathermap.org/data/2.5/weather"
-        params = {
-            "q": city,
-            "appid": OPENWEATHER_API_KEY,
-            "units": "metric"
-        }
-        
-        # Para demo, vamos simular a resposta
-        weather_data = WeatherData(
-            location=city,
-            temperature=round(random.uniform(20, 30), 1),
-            humidity=round(random.uniform(50, 80), 1),
-            pressure=round(random.uniform(1010, 1025), 1),
-            wind_speed=round(random.uniform(0, 15), 1),
-            description=random.choice(["Clear sky", "Few clouds", "Scattered clouds", "Light rain"]),
-            timestamp=datetime.now()
-        )
-        
-        weather_cache[city] = weather_data
-        return weather_data
-        
+        return await weather_cache.get(city)
+    except WeatherProviderError as e:
+        raise HTTPException(status_code=503, detail=f"Serviço meteorológico indisponível: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter dados meteorológicos: {str(e)}")
 
 @app.get("/weather/forecast/{city}")
-async def get_weather_forecast(city: str):
-    """Previsão do tempo para 5 dias"""
-    forecast = []
-    for i in range(5):
-        day_data = {
-            "date": (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d"),
-            "temperature_max": round(random.uniform(25, 35), 1),
-            "temperature_min": round(random.uniform(15, 25), 1),
-            "humidity": round(random.uniform(50, 80), 1),
-            "precipitation": round(random.uniform(0, 10), 1),
-            "description": random.choice(["Sunny", "Partly cloudy", "Cloudy", "Light rain", "Heavy rain"])
-        }
-        forecast.append(day_data)
-    
-    return {"city": city, "forecast": forecast}
+async def get_weather_forecast(city: str, request: Request):
+    """Previsão do tempo para 5 dias (pré-calculada, com ETag)"""
+    snapshot = await forecast_service.get(city)
+    headers = {"ETag": snapshot.etag, "Cache-Control": f"max-age={int(FORECAST_REFRESH_SECONDS)}"}
+    if etag_matches(snapshot.etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # === ROTAS DE IRRIGAÇÃO ===
+# Comandos que alteram a irrigação rodam no coordenador (único escritor entre os workers)
+def activate_run(zone_id: str, duration_minutes: int, auto_mode: bool):
+    irrigation_log = irrigation_scheduler.start_run(zone_id, duration_minutes, auto_mode)
+    irrigation_controller.set_auto(zone_id, auto_mode)
+    return {"run_id": irrigation_log["run_id"], "end_time": irrigation_log["end_time"]}
+
+def create_plan(steps: List[dict], max_concurrent_zones: int, auto_mode: bool):
+    created = irrigation_scheduler.add_plan(steps, max_concurrent_zones, auto_mode)
+    status = irrigation_scheduler.plan_status(created["plan_id"])
+    status.pop("steps")
+    return status
+
+state_backend.handlers.update({
+    "activate": activate_run,
+    "create_plan": create_plan,
+    "plan_status": irrigation_scheduler.plan_status,
+    "controller_metrics": irrigation_controller.metrics,
+    "controller_tick": irrigation_controller.tick,
+    "irrigation_active": lambda: list(irrigation_scheduler.active.values()),
+})
+
+async def irrigation_command(command: str, **args):
+    try:
+        return await state_backend.call(command, **args)
+    except CoordinatorUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
 @app.post("/irrigation/activate")
 async def activate_irrigation(command: IrrigationCommand):
     """Ativa sistema de irrigação"""
-    irrigation_log = {
-        "zone_id": command.zone_id,
-        "start_time": datetime.now(),
-        "duration_minutes": command.duration_minutes,
-        "auto_mode": command.auto_mode,
-        "status": "active"
-    }
-    
-    irrigation_logs.append(irrigation_log)
+    irrigation_log = await irrigation_command(
+        "activate", zone_id=scoped_key(command.farm_id, command.zone_id),
+        duration_minutes=command.duration_minutes, auto_mode=command.auto_mode,
+    )
     
     return {
         "message": f"Irrigação ativada na zona {command.zone_id}",
+        "run_id": irrigation_log["run_id"],
         "duration": command.duration_minutes,
-        "estimated_completion": datetime.now() + timedelta(minutes=command.duration_minutes)
+        "estimated_completion": irrigation_log["end_time"]
     }
 
+@app.post("/irrigation/plans")
+async def create_irrigation_plan(plan: IrrigationPlan):
+    """Agenda um plano de irrigação para várias zonas em uma única requisição"""
+    if len(plan.zones) > MAX_PLAN_ZONES:
+        raise HTTPException(status_code=413, detail=f"Plano excede o limite de {MAX_PLAN_ZONES} zonas")
+    steps = [{**step.model_dump(), "zone_id": scoped_key(plan.farm_id, step.zone_id)} for step in plan.zones]
+    return await irrigation_command(
+        "create_plan", steps=steps, max_concurrent_zones=plan.max_concurrent_zones, auto_mode=plan.auto_mode,
+    )
+
+def unscoped_zone(log: dict) -> dict:
+    """Execução ou etapa com o zone_id sem o prefixo da fazenda"""
+    return {**log, "zone_id": split_key(log["zone_id"])[1]}
+
+@app.get("/irrigation/plans/{plan_id}")
+async def get_irrigation_plan(plan_id: str):
+    """Progresso de um plano de irrigação"""
+    status = await irrigation_command("plan_status", plan_id=plan_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Plano não encontrado")
+    return {**status, "steps": [unscoped_zone(step) for step in status["steps"]]}
+
+@app.get("/irrigation/controller")
+async def get_irrigation_controller():
+    """Estado do controle automático: decisões e tempo de cada ciclo"""
+    return await irrigation_command("controller_metrics")
+
+@app.post("/irrigation/controller/tick")
+async def run_irrigation_controller(dry_run: Optional[bool] = None):
+    """Executa um ciclo do controle automático imediatamente"""
+    return await irrigation_command("controller_tick", dry_run=dry_run)
+
+def farm_active_runs(farm_id: str) -> List[dict]:
+    return [log for zone_id, log in irrigation_scheduler.active.items() if split_key(zone_id)[0] == farm_id]
+
 @app.get("/irrigation/status")
-async def get_irrigation_status():
+async def get_irrigation_status(farm_id: FarmId = DEFAULT_FARM):
     """Status atual dos sistemas de irrigação"""
-    active_zones = [log for log in irrigation_logs if log["status"] == "active"]
+    active = farm_active_runs(farm_id)
+    water = water_ledgers.get(farm_id, empty_water_ledger).summary(active)
+    runs = irrigation_runs.get(farm_id, Counter())
+    totals = await farm_shards.totals(farm_id)
     
     return {
-        "active_zones": len(active_zones),
-        "total_zones": 5,
-        "water_usage_today": round(random.uniform(100, 500), 1),
-        "efficiency_score": round(random.uniform(80, 95), 1),
-        "active_systems": active_zones[-3:] if active_zones else []
+        "farm_id": farm_id,
+        "active_zones": len(active),
+        "total_zones": max(totals["zones"], len(active)),
+        "water_usage_today": round(water["water_usage_today"], 1),
+        "water_usage_week": round(water["water_usage_week"], 1),
+        "efficiency_score": round(water["efficiency_score"], 1),
+        "active_systems": [unscoped_zone(log) for log in active[-3:]],
+        "started_runs": runs["active"],
+        "completed_runs": runs["completed"],
     }
 
+@app.get("/irrigation/water-usage")
+async def get_water_usage(start: Optional[date] = None, end: Optional[date] = None, zone_id: Optional[str] = None,
+                          farm_id: FarmId = DEFAULT_FARM):
+    """Consumo de água (litros) num intervalo de datas, total e por zona"""
+    end = end or date.today()
+    start = start or end
+    if start > end:
+        raise HTTPException(status_code=400, detail="start deve ser anterior a end")
+    zone_key = scoped_key(farm_id, zone_id) if zone_id is not None else None
+    ledger = water_ledgers.get(farm_id, empty_water_ledger)
+    usage = ledger.usage(start, end, zone_key, active=farm_active_runs(farm_id))
+    for key in ("liters", "finished_liters", "effective_liters"):
+        if key in usage:
+            usage[key] = round(usage[key], 1)
+    if "zone_id" in usage:
+        usage["zone_id"] = zone_id
+    if "zones" in usage:
+        usage["zones"] = {split_key(zone)[1]: round(liters, 1) for zone, liters in usage["zones"].items()}
+    return {"start": start, "end": end, "farm_id": farm_id, **usage}
+
 # === ROTAS DE ANÁLISE E PREDIÇÃO ===
 @app.post("/analysis/crop-prediction", response_model=CropPrediction)
 async def predict_crop_yield(crop_type: str, area_hectares: float):
@@ -219,18 +903,8 @@ async def predict_crop_yield(crop_type: str, area_hectares: float):
         recommendations=recommendations
     )
 
-@app.get("/analysis/soil-health")
-async def get_soil_health_analysis():
-    """Análise da saúde do solo baseada nos sensores"""
-    if not sensors_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado de sensor disponível")
-    
-    recent_data = sensors_data[-5:]  # Últimos 5 registros
-    
-    avg_ph = sum(s.ph_level for s in recent_data) / len(recent_data)
-    avg_moisture = sum(s.soil_moisture for s in recent_data) / len(recent_data)
-    
-    # Classificação da saúde do solo
+def soil_health_report(avg_ph: float, avg_moisture: float) -> dict:
+    """Classificação da saúde do solo a partir das médias de pH e umidade"""
     health_score = 0
     if 6.0 <= avg_ph <= 7.0:
         health_score += 30
@@ -252,21 +926,202 @@ async def get_soil_health_analysis():
         ]
     }
 
+@app.get("/analysis/soil-health")
+async def get_soil_health_analysis(farm_id: OptionalFarmId = None):
+    """Análise da saúde do solo baseada na última leitura de cada sensor (da fazenda ou da frota)"""
+    # Somas por shard combinadas; as médias saem só no fim
+    totals = await farm_shards.totals(farm_id)
+    sensors = totals["sensors"]
+    if not sensors:
+        raise HTTPException(status_code=404, detail="Nenhum dado de sensor disponível")
+    
+    return {
+        **soil_health_report(totals["ph_sum"] / sensors, totals["moisture_sum"] / sensors),
+        "sensors": sensors,
+        "zones": totals["zones"],
+    }
+
+@app.get("/analysis/soil-health/{zone_id}")
+async def get_zone_soil_health(zone_id: str, farm_id: FarmId = DEFAULT_FARM):
+    """Análise da saúde do solo de uma zona, com médias móveis exponenciais"""
+    shard = farm_shards.shard_for(farm_id)
+    zone = await shard.read(shard.aggregates.zone, scoped_key(farm_id, zone_id))
+    if zone is None:
+        raise HTTPException(status_code=404, detail="Zona sem dados de sensores")
+    
+    return {
+        **soil_health_report(zone["average_ph"], zone["average_moisture"]),
+        "zone_id": zone_id,
+        "sensors": zone["sensors"],
+        "readings": zone["readings"],
+        "ewma_ph": round(zone["ewma_ph"], 2),
+        "ewma_moisture": round(zone["ewma_moisture"], 1),
+        "last_update": zone["last_update"],
+    }
+
+@app.get("/analysis/anomalies")
+async def get_anomalies(limit: int = Query(100, ge=1, le=1000), farm_id: OptionalFarmId = None):
+    """Sensores cuja última leitura desviou da própria linha de base"""
+    result = await farm_shards.anomalies(limit, farm_id)
+    if farm_id is not None:
+        result["anomalies"] = [{**a, "sensor_id": split_key(a["sensor_id"])[1]} for a in result["anomalies"]]
+    return FastJSONResponse(result)
+
 @app.get("/dashboard/summary")
-async def get_dashboard_summary():
-    """Resumo geral para o dashboard"""
+async def get_dashboard_summary(farm_id: OptionalFarmId = None):
+    """Resumo geral para o dashboard (da fazenda ou da frota)"""
+    totals, sensors, alerts = await asyncio.gather(
+        farm_shards.totals(farm_id), farm_shards.sensor_counts(farm_id), farm_shards.active_alerts(rule_engine, farm_id)
+    )
+    active = irrigation_scheduler.active if farm_id is None else farm_active_runs(farm_id)
     return {
-        "total_sensors": 5,
-        "active_sensors": 5,
-        "irrigation_zones": 5,
-        "active_irrigations": len([log for log in irrigation_logs if log["status"] == "active"]),
+        "total_sensors": sensors["total"],
+        "active_sensors": sensors["active"],
+        "silent_sensors": sensors["silent"],
+        "irrigation_zones": totals["zones"],
+        "active_irrigations": len(active),
         "last_update": datetime.now(),
-        "alerts": [
-            {"type": "info", "message": "Sistema funcionando normalmente"},
-            {"type": "warning", "message": "Zona 3 com baixa umidade do solo"}
+        "alerts": alerts or [
+            {"type": "info", "message": "Sistema funcionando normalmente"}
         ],
         "weather_status": "Parcialmente nublado, 25°C"
     }
 
+async def get_forecast_data(city: str):
+    snapshot = await forecast_service.get(city)
+    return {"city": city, "forecast": list(snapshot.forecast)}
+
+async def build_dashboard_snapshot(city: str, farm_id: Optional[str]):
+    """Monta todas as seções do dashboard em paralelo; seções com erro vêm como None"""
+    snapshot = {"city": city, "farm_id": farm_id, "generated_at": datetime.now(), "errors": {}}
+    farm = farm_id or DEFAULT_FARM
+    # Primeiro as leituras atuais (que entram no armazenamento) junto com as fontes externas;
+    # depois as seções que agregam o estado já atualizado
+    stages = (
+        {
+            "sensors": read_current_sensors(farm),
+            "weather": get_weather(city),
+            "forecast": get_forecast_data(city),
+            "irrigation": get_irrigation_status(farm),
+        },
+        {
+            "summary": get_dashboard_summary(farm_id),
+            "soil_health": get_soil_health_analysis(farm_id),
+        },
+    )
+    for sections in stages:
+        results = await asyncio.gather(*sections.values(), return_exceptions=True)
+        for name, result in zip(sections, results):
+            if isinstance(result, Exception):
+                snapshot[name] = None
+                snapshot["errors"][name] = result.detail if isinstance(result, HTTPException) else str(result)
+            else:
+                snapshot[name] = result
+    # Serializado uma vez; as requisições dentro do TTL recebem os mesmos bytes
+    body = dumps(snapshot)
+    dashboard_cache[city.strip().casefold(), farm_id] = (time.monotonic() + DASHBOARD_SNAPSHOT_TTL, body)
+    return body
+
+@app.get("/dashboard/snapshot")
+async def get_dashboard_snapshot(city: str = "São Paulo", farm_id: OptionalFarmId = None):
+    """Todos os dados do dashboard numa única resposta (cache de alguns segundos)"""
+    key = city.strip().casefold(), farm_id
+    cached = dashboard_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return Response(content=cached[1], media_type="application/json")
+    # Requisições simultâneas da mesma cidade aguardam a mesma montagem
+    task = dashboard_inflight.get(key)
+    if task is None:
+        task = dashboard_inflight[key] = asyncio.create_task(build_dashboard_snapshot(city, farm_id))
+        task.add_done_callback(lambda _: dashboard_inflight.pop(key, None))
+    return Response(content=await asyncio.shield(task), media_type="application/json")
+
+# === EVENTOS AO VIVO ===
+@app.get("/events/stream")
+async def stream_events(request: Request, last_event_id: Optional[int] = None):
+    """Leituras, alertas e irrigação em tempo real (Server-Sent Events)"""
+    header = request.headers.get("last-event-id")
+    if last_event_id is None and header and header.isdigit():
+        last_event_id = int(header)
+    return StreamingResponse(
+        event_broker.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# === MÉTRICAS ===
+@app.get("/metrics/ingest")
+async def get_ingest_metrics():
+    """Profundidade das filas, tamanho dos lotes e latência de gravação (total e por shard deste worker)"""
+    shards = [shard.metrics() for shard in farm_shards.local_shards()]
+    queues = [shard["queue"] for shard in shards]
+    return {
+        "shards": len(shards),
+        **{key: sum(queue[key] for queue in queues)
+           for key in ("queue_depth", "pending_readings", "rejected_requests", "batches_committed",
+                       "readings_committed")},
+        "stored_readings": sum(shard["stored_readings"] for shard in shards),
+        "stored_sensors": sum(shard["stored_sensors"] for shard in shards),
+        "persistence": db.metrics() if db is not None else None,
+        "per_shard": shards,
+    }
+
+@app.get("/metrics/weather")
+async def get_weather_metrics():
+    """Acertos do cache de clima e chamadas ao provedor"""
+    return {**weather_cache.metrics(), "forecast": forecast_service.metrics()}
+
+@app.get("/metrics/state")
+async def get_state_metrics():
+    """Backend de estado deste worker: slot, shards próprios, posição nos anéis e coordenador"""
+    return {
+        **state_backend.metrics(),
+        "shards": [shard.index for shard in farm_shards.local_shards()],
+        "stored_readings": sum(len(shard.sensor_store) for shard in farm_shards.local_shards()),
+        "peers": peer_network.metrics() if peer_network is not None else None,
+    }
+
+@app.get("/metrics/events")
+async def get_event_metrics():
+    """Assinantes do feed ao vivo e eventos publicados/descartados"""
+    return event_broker.metrics()
+
+# === VÁRIOS WORKERS ===
+# Rotas com o parâmetro farm_id rodam no worker dono da fazenda (sem ele, a fazenda
+# padrão, que também responde pela frota somando os parciais de todos os workers)
+farm_endpoints = {
+    route.endpoint for route in app.routes
+    if isinstance(route, APIRoute) and any(param.name == "farm_id" for param in route.dependant.query_params)
+}
+
+def request_owner(scope) -> Optional[int]:
+    """Slot do worker dono da fazenda da requisição; None = atende neste worker"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            break
+    else:
+        return None
+    if route.endpoint not in farm_endpoints:
+        return None
+    farm_id = parse_qs(scope["query_string"].decode("latin-1")).get("farm_id", [DEFAULT_FARM])[0]
+    owner = farm_shards.owner(farm_id)
+    return None if owner == state_backend.slot else owner
+
+async def peer_partials(name: str, farm_id: Optional[str], args: list) -> list:
+    return await farm_shards.local_partials(name, farm_id, args)
+
+async def remote_partials(slot: int, name: str, farm_id: Optional[str], args: list) -> list:
+    return await peer_network.call(slot, "partials", name=name, farm_id=farm_id, args=args)
+
+@app.exception_handler(PeerUnavailable)
+async def peer_unavailable(request: Request, exc: PeerUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+if peer_network is not None:
+    app.add_middleware(PeerRouter, network=peer_network, resolve=request_owner)
+    peer_network.handlers["partials"] = peer_partials
+    farm_shards.remote = remote_partials
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,225 @@
+"""Encaminhamento de requisições entre os workers donos dos shards.
+
+Com `SharedState` e vários workers, cada worker com slot serve o mesmo app
+também num socket Unix (`<SHARED_STATE_DIR>/slots/<slot>.sock`). O
+`PeerRouter`, na frente do app, descobre o slot dono da fazenda da
+requisição e, se não for este worker, repassa a requisição inteira ao
+dono pelo socket (corpo e resposta em streaming, então a ingestão NDJSON
+e as respostas longas não ficam na memória do intermediário).
+
+Requisições repassadas chegam marcadas (`scope["peer"]`) e são atendidas
+no worker que as recebeu, sem novo encaminhamento. Rotas sob `/_peer/`
+existem só no socket: são as chamadas internas entre workers (ex.: os
+parciais por shard de uma consulta da frota inteira).
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+import orjson
+import uvicorn
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+PEER_PREFIX = "/_peer/"
+FORWARDED_HEADER = b"x-agrosmart-forwarded"
+# Cabeçalhos da conexão, que não passam de um salto para o outro
+HOP_HEADERS = {b"connection", b"keep-alive", b"transfer-encoding", b"upgrade", b"te", b"trailer",
+               b"proxy-connection", FORWARDED_HEADER}
+
+
+class PeerUnavailable(Exception):
+    pass
+
+
+class _PeerServer(uvicorn.Server):
+    def install_signal_handlers(self):
+        pass  # os sinais continuam com o servidor principal do worker
+
+
+class PeerNetwork:
+    def __init__(self, directory: str, connect_timeout: float = 2.0, call_timeout: float = 30.0,
+                 max_connections: int = 100):
+        self.directory = directory
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.handlers: Dict[str, Callable[..., Awaitable]] = {}  # chamadas internas (`/_peer/<nome>`)
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+        self._server: Optional[_PeerServer] = None
+        self._task: Optional[asyncio.Task] = None
+        self.forwarded = 0
+        self.received = 0
+        self.calls_sent = 0
+        self.calls_handled = 0
+        self.unavailable = 0
+
+    def socket_path(self, slot: int) -> str:
+        return os.path.join(self.directory, "slots", f"{slot}.sock")
+
+    # --- servidor deste worker ---
+
+    async def start(self, app, slot: int):
+        """Passa a atender `app` e as chamadas internas no socket do slot."""
+        config = uvicorn.Config(self._asgi(app), uds=self.socket_path(slot), interface="asgi3", lifespan="off",
+                                log_config=None, access_log=False, timeout_graceful_shutdown=5)
+        self._server = _PeerServer(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                await self._task  # falhou ao abrir o socket
+                raise RuntimeError(f"Servidor do slot {slot} encerrou ao iniciar")
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        if self._task is not None:
+            self._server.should_exit = True
+            await self._task
+            self._task = None
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def _asgi(self, app):
+        async def peer_app(scope, receive, send):
+            if scope["type"] == "http" and scope["path"].startswith(PEER_PREFIX):
+                await self._handle_call(scope, receive, send)
+                return
+            if scope["type"] == "http" and any(name == FORWARDED_HEADER for name, _ in scope["headers"]):
+                # Já encaminhada por outro worker: atende aqui. Sem a marca, a requisição que
+                # chega direto pelo socket é roteada como se viesse da porta pública
+                self.received += 1
+                scope = {**scope, "peer": True}
+            await app(scope, receive, send)
+
+        return peer_app
+
+    async def _handle_call(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        handler = self.handlers.get(scope["path"][len(PEER_PREFIX):])
+        if handler is None:
+            status, content = 404, dumps({"error": "Chamada desconhecida"})
+        else:
+            try:
+                status, content = 200, dumps(await handler(**orjson.loads(body)))
+                self.calls_handled += 1
+            except Exception as e:
+                logger.exception("Falha na chamada interna %s", scope["path"])
+                status, content = 500, dumps({"error": f"{type(e).__name__}: {e}"})
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": content})
+
+    # --- chamadas para os outros workers ---
+
+    def _client(self, slot: int) -> httpx.AsyncClient:
+        client = self._clients.get(slot)
+        if client is None:
+            client = self._clients[slot] = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=self.socket_path(slot), limits=self.limits),
+                base_url="http://agrosmart",
+                # Sem limite de leitura: a ingestão repassada segue a contrapressão do dono
+                timeout=httpx.Timeout(None, connect=self.connect_timeout),
+            )
+        return client
+
+    async def call(self, slot: int, handler: str, **payload):
+        """Executa a chamada interna `handler` no worker do slot e devolve o resultado."""
+        self.calls_sent += 1
+        try:
+            response = await self._client(slot).post(PEER_PREFIX + handler, content=dumps(payload),
+                                                     timeout=self.call_timeout)
+        except httpx.TransportError as e:
+            self.unavailable += 1
+            raise PeerUnavailable(f"Worker do slot {slot} indisponível") from e
+        if response.status_code != 200:
+            raise RuntimeError(response.json()["error"])
+        return orjson.loads(response.content)
+
+    async def forward(self, slot: int, scope, receive, send):
+        """Repassa a requisição ASGI ao worker do slot e devolve a resposta dele em streaming."""
+        async def body():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                yield message.get("body", b"")
+                if not message.get("more_body", False):
+                    return
+
+        headers = [(name, value) for name, value in scope["headers"] if name not in HOP_HEADERS]
+        headers.append((FORWARDED_HEADER, b"1"))
+        url = scope["path"] + ("?" + scope["query_string"].decode("latin-1") if scope["query_string"] else "")
+        client = self._client(slot)
+        request = client.build_request(scope["method"], url, headers=headers, content=body())
+        self.forwarded += 1
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.TransportError:
+            self.unavailable += 1
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body",
+                        "body": dumps({"detail": "Worker dono da fazenda indisponível, tente novamente"})})
+            return
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(name, value) for name, value in response.headers.raw if name.lower() not in HOP_HEADERS],
+            })
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+
+    async def relay(self, slot: int, method: str, url: str, headers, content: bytes) -> httpx.Response:
+        """Repassa uma requisição já lida (ex.: o corpo decidiu o dono) e devolve a resposta completa."""
+        headers = [(name, value) for name, value in headers if name not in HOP_HEADERS]
+        headers.append((FORWARDED_HEADER, b"1"))
+        self.forwarded += 1
+        try:
+            return await self._client(slot).request(method, url, headers=headers, content=content)
+        except httpx.TransportError as e:
+            self.unavailable += 1
+            raise PeerUnavailable(f"Worker do slot {slot} indisponível") from e
+
+    def metrics(self) -> dict:
+        return {
+            "serving": self._server is not None and self._server.started,
+            "forwarded": self.forwarded,
+            "received": self.received,
+            "calls_sent": self.calls_sent,
+            "calls_handled": self.calls_handled,
+            "unavailable": self.unavailable,
+        }
+
+
+class PeerRouter:
+    """Middleware ASGI: requisições de fazendas de outro worker seguem para o dono.
+
+    `resolve(scope)` devolve o slot dono da requisição, ou None para atender aqui.
+    """
+
+    def __init__(self, app, network: PeerNetwork, resolve: Callable[[dict], Optional[int]]):
+        self.app = app
+        self.network = network
+        self.resolve = resolve
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope.get("peer"):
+            slot = self.resolve(scope)
+            if slot is not None:
+                await self.network.forward(slot, scope, receive, send)
+                return
+        await self.app(scope, receive, send)
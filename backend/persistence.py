@@ -0,0 +1,354 @@
+"""Persistência opcional em SQLite (modo WAL).
+
+Todas as escritas passam por uma única thread gravadora, que agrupa as
+operações pendentes numa transação com `executemany`; os handlers apenas
+enfileiram. As leituras pendentes de gravação têm um limite
+(`max_pending_rows`): com o disco lento ou o banco travado, `saturated()`
+sinaliza a ingestão para recusar lotes (503) e `save_readings` espera por
+espaço em vez de acumular memória. Uma transação que falha é repetida
+algumas vezes antes de ser descartada e registrada no log.
+
+Com `retention_days`, a thread gravadora apaga periodicamente as leituras
+mais antigas que a janela.
+
+As leituras são síncronas e devem ser chamadas via `asyncio.to_thread`,
+cada thread com sua conexão.
+"""
+import json
+import logging
+import math
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    sensor_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    temperature REAL NOT NULL,
+    humidity REAL NOT NULL,
+    soil_moisture REAL NOT NULL,
+    ph_level REAL NOT NULL,
+    zone_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_sensor_ts
+    ON sensor_readings (sensor_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_ts
+    ON sensor_readings (timestamp);
+
+CREATE TABLE IF NOT EXISTS irrigation_logs (
+    run_id TEXT PRIMARY KEY,
+    zone_id TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    auto_mode INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_irrigation_logs_zone_start
+    ON irrigation_logs (zone_id, start_time);
+
+CREATE TABLE IF NOT EXISTS sensors (
+    farm_id TEXT NOT NULL,
+    sensor_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (farm_id, sensor_id)
+);
+
+CREATE TABLE IF NOT EXISTS weather_cache (
+    city TEXT PRIMARY KEY,
+    payload TEXT NOT NULL
+);
+"""
+
+# SQL constante: o sqlite3 reaproveita o statement preparado do cache da conexão
+INSERT_READING = (
+    "INSERT INTO sensor_readings (sensor_id, timestamp, temperature, humidity, soil_moisture, ph_level, zone_id) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+UPSERT_IRRIGATION = (
+    "INSERT INTO irrigation_logs (run_id, zone_id, start_time, duration_minutes, auto_mode, status, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(run_id) DO UPDATE SET status = excluded.status, payload = excluded.payload"
+)
+UPSERT_SENSOR = (
+    "INSERT INTO sensors (farm_id, sensor_id, payload) VALUES (?, ?, ?) "
+    "ON CONFLICT(farm_id, sensor_id) DO UPDATE SET payload = excluded.payload"
+)
+UPSERT_WEATHER = (
+    "INSERT INTO weather_cache (city, payload) VALUES (?, ?) "
+    "ON CONFLICT(city) DO UPDATE SET payload = excluded.payload"
+)
+SELECT_READINGS_SINCE = (
+    "SELECT sensor_id, timestamp, temperature, humidity, soil_moisture, ph_level, zone_id "
+    "FROM sensor_readings WHERE timestamp >= ? ORDER BY timestamp"
+)
+SELECT_ROLLUPS = (
+    "SELECT sensor_id, timestamp / ? AS bucket, COUNT(*), "
+    + ", ".join(f"SUM({m})" for m in METRICS) + ", "
+    + ", ".join(f"MIN({m})" for m in METRICS) + ", "
+    + ", ".join(f"MAX({m})" for m in METRICS) + " "
+    "FROM sensor_readings WHERE timestamp >= ? AND timestamp < ? "
+    "GROUP BY sensor_id, bucket ORDER BY sensor_id, bucket"
+)
+SELECT_IRRIGATION = "SELECT payload FROM irrigation_logs ORDER BY start_time DESC LIMIT ?"
+SELECT_SENSORS = "SELECT payload FROM sensors"
+SELECT_WEATHER = "SELECT city, payload FROM weather_cache"
+# Em blocos, para não segurar o lock de escrita do banco por muito tempo
+DELETE_READINGS_BEFORE = (
+    "DELETE FROM sensor_readings WHERE rowid IN "
+    "(SELECT rowid FROM sensor_readings WHERE timestamp < ? LIMIT ?)"
+)
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence:
+    def __init__(self, path: str, max_batch: int = 50000, max_pending_rows: int = 500000,
+                 retention_days: Optional[float] = None, prune_interval: float = 3600,
+                 write_retries: int = 3, high_watermark: float = 0.9):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_pending_rows = max_pending_rows
+        self.high_watermark = max(1, int(max_pending_rows * high_watermark))
+        self.retention_ms = int(retention_days * 86400 * 1000) if retention_days else None
+        self.prune_interval = prune_interval
+        self.write_retries = write_retries
+        self._queue: "queue.Queue" = queue.Queue()
+        # Leituras enfileiradas e ainda não gravadas (irrigação, sensores e clima não contam)
+        self._pending_rows = 0
+        self._space = threading.Condition()
+        self._local = threading.local()
+        self._writer = None
+        self._last_prune = 0.0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_pruned = 0
+        self.transactions = 0
+        self.write_errors = 0
+        self.avg_rows_per_second = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def start(self):
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._writer = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """Grava as operações pendentes e encerra a thread gravadora."""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+    # --- escritas ---
+
+    @property
+    def pending_rows(self) -> int:
+        return self._pending_rows
+
+    def saturated(self) -> bool:
+        """Leituras pendentes acima da marca de saturação: a ingestão deve recusar novos lotes."""
+        return self._pending_rows >= self.high_watermark
+
+    def retry_after(self) -> int:
+        if not self.avg_rows_per_second:
+            return 1
+        return max(1, math.ceil(self._pending_rows / self.avg_rows_per_second))
+
+    def save_readings(self, batch: ReadingBatch, block: bool = True, timeout: Optional[float] = None):
+        """Enfileira as leituras; sem espaço, espera (`block`) ou levanta `queue.Full`.
+
+        Um lote maior que o limite inteiro é aceito quando não há nada pendente.
+        """
+        n = len(batch)
+        with self._space:
+            has_space = self._space.wait_for(
+                lambda: not self._pending_rows or self._pending_rows + n <= self.max_pending_rows,
+                timeout if block else 0,
+            )
+            if not has_space:
+                raise queue.Full
+            self._pending_rows += n
+        rows = zip(
+            batch.sensor_ids.tolist(),
+            batch.timestamps.tolist(),
+            *(batch.values[i].tolist() for i in range(len(METRICS))),
+            batch.zone_ids.tolist(),
+        )
+        self._queue.put((INSERT_READING, list(rows)))
+
+    def save_irrigation(self, log: dict):
+        payload = json.dumps(log, default=str)
+        row = (log["run_id"], log["zone_id"], int(log["start_time"].timestamp() * 1000),
+               log["duration_minutes"], int(log["auto_mode"]), log["status"], payload)
+        self._queue.put((UPSERT_IRRIGATION, [row]))
+
+    def save_sensor(self, entry: dict):
+        self._queue.put((UPSERT_SENSOR, [(entry["farm_id"], entry["sensor_id"], json.dumps(entry, default=str))]))
+
+    def save_weather(self, city: str, payload: dict):
+        self._queue.put((UPSERT_WEATHER, [(city, json.dumps(payload, default=str))]))
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            try:
+                ops = [self._queue.get(timeout=self.prune_interval if self.retention_ms else None)]
+            except queue.Empty:
+                self._prune(conn)
+                continue
+            rows = 0
+            while rows < self.max_batch:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if ops[-1] is not _STOP:
+                    rows += len(ops[-1][1])
+            if _STOP in ops:
+                stopping = True
+                ops = [op for op in ops if op is not _STOP]
+
+            # Agrupa por statement mantendo a ordem de chegada dentro de cada um
+            grouped: Dict[str, list] = {}
+            for sql, params in ops:
+                grouped.setdefault(sql, []).extend(params)
+            readings = len(grouped.get(INSERT_READING, ()))
+            try:
+                if grouped:
+                    self._write(conn, grouped)
+            finally:
+                with self._space:
+                    self._pending_rows -= readings
+                    self._space.notify_all()
+            if self.retention_ms and time.monotonic() - self._last_prune >= self.prune_interval:
+                self._prune(conn)
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, grouped: Dict[str, list]):
+        rows = sum(len(params) for params in grouped.values())
+        for attempt in range(self.write_retries + 1):
+            started = time.monotonic()
+            try:
+                with conn:
+                    for sql, params in grouped.items():
+                        conn.executemany(sql, params)
+            except sqlite3.Error:
+                self.write_errors += 1
+                if attempt < self.write_retries:
+                    # Banco travado ou disco ocupado: espera um pouco e repete a transação inteira
+                    time.sleep(0.1 * 2 ** attempt)
+                    continue
+                self.rows_failed += rows
+                logger.exception("Falha ao gravar %d linhas no SQLite após %d tentativas; operações descartadas",
+                                 rows, attempt + 1)
+                return
+            self.rows_written += rows
+            self.transactions += 1
+            elapsed = max(time.monotonic() - started, 1e-6)
+            alpha = 0.1 if self.transactions > 1 else 1.0
+            self.avg_rows_per_second += alpha * (rows / elapsed - self.avg_rows_per_second)
+            return
+
+    def _prune(self, conn: sqlite3.Connection, chunk: int = 50000):
+        """Apaga as leituras anteriores à janela de retenção (na thread gravadora)."""
+        self._last_prune = time.monotonic()
+        cutoff_ms = int(time.time() * 1000) - self.retention_ms
+        try:
+            while True:
+                with conn:
+                    deleted = conn.execute(DELETE_READINGS_BEFORE, (cutoff_ms, chunk)).rowcount
+                self.rows_pruned += deleted
+                if deleted < chunk:
+                    break
+        except sqlite3.Error:
+            self.write_errors += 1
+            logger.exception("Falha ao apagar leituras antigas do SQLite")
+
+    # --- leituras (bloqueantes, fora do event loop) ---
+
+    def load_readings(self, since_ms: int) -> ReadingBatch:
+        rows = self._reader().execute(SELECT_READINGS_SINCE, (since_ms,)).fetchall()
+        if not rows:
+            return ReadingBatch(np.empty(0, dtype=object), np.empty(0, dtype=np.int64),
+                                np.empty((len(METRICS), 0)))
+        columns = list(zip(*rows))
+        return ReadingBatch(
+            np.array(columns[0], dtype=object),
+            np.array(columns[1], dtype=np.int64),
+            np.array(columns[2:2 + len(METRICS)], dtype=np.float64),
+            np.array(columns[-1], dtype=object),
+        )
+
+    def load_rollups(self, width_ms: int, since_ms: int, until_ms: int):
+        """Agrega no SQLite as leituras do intervalo em buckets de `width_ms`.
+
+        Retorna uma lista de (sensor_id, buckets, count, sum, min, max) por sensor.
+        """
+        rows = self._reader().execute(SELECT_ROLLUPS, (width_ms, since_ms, until_ms)).fetchall()
+        n = len(METRICS)
+        series = []
+        start = 0
+        while start < len(rows):
+            sensor_id = rows[start][0]
+            end = start
+            while end < len(rows) and rows[end][0] == sensor_id:
+                end += 1
+            data = np.array([row[1:] for row in rows[start:end]], dtype=np.float64).T
+            series.append((
+                sensor_id,
+                data[0].astype(np.int64),
+                data[1].astype(np.int64),
+                data[2:2 + n],
+                data[2 + n:2 + 2 * n].astype(np.float32),
+                data[2 + 2 * n:].astype(np.float32),
+            ))
+            start = end
+        return series
+
+    def load_irrigation_logs(self, limit: int = 10000) -> List[dict]:
+        rows = self._reader().execute(SELECT_IRRIGATION, (limit,)).fetchall()
+        return [json.loads(payload) for (payload,) in reversed(rows)]
+
+    def load_sensors(self) -> List[dict]:
+        return [json.loads(payload) for (payload,) in self._reader().execute(SELECT_SENSORS)]
+
+    def load_weather(self) -> Dict[str, dict]:
+        return {city: json.loads(payload) for city, payload in self._reader().execute(SELECT_WEATHER)}
+
+    def metrics(self) -> dict:
+        return {
+            "path": self.path,
+            "pending_operations": self._queue.qsize(),
+            "pending_rows": self._pending_rows,
+            "max_pending_rows": self.max_pending_rows,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_pruned": self.rows_pruned,
+            "retention_days": self.retention_ms / 86400000 if self.retention_ms else None,
+            "transactions": self.transactions,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,107 @@
+"""Cadastro de sensores com metadados e índice de último contato.
+
+Cada sensor conhecido (cadastrado pela API ou que já enviou leituras) fica
+em um de três grupos:
+
+- `active`: contato dentro da janela `silent_after`;
+- `silent`: sem contato há mais que a janela;
+- `pending`: cadastrado, mas ainda sem nenhuma leitura.
+
+`active` e `silent` são OrderedDicts ordenados pelo horário do último
+contato (relógio do servidor, que só avança): uma leitura move o sensor
+para o fim de `active` em O(1), e `expire` tira do início de `active` os
+que passaram da janela, cada um uma única vez por contato. Assim as
+contagens saem do tamanho dos grupos e a lista de sensores silenciosos é
+lida do início de `silent`, sem percorrer a frota.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class SensorRegistry:
+    def __init__(self, silent_after: float = 900):
+        self.silent_after = silent_after
+        self.metadata: Dict[str, dict] = {}
+        self.active: "OrderedDict[str, float]" = OrderedDict()
+        self.silent: "OrderedDict[str, float]" = OrderedDict()
+        self.pending = set()
+        self._newest = 0.0
+
+    def __len__(self) -> int:
+        return len(self.active) + len(self.silent) + len(self.pending)
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self.active or sensor_id in self.silent or sensor_id in self.pending
+
+    def register(self, sensor_id: str, **metadata) -> dict:
+        """Cadastra ou atualiza os metadados (zone_id, crop, latitude, longitude, registered_at)."""
+        self.metadata[sensor_id] = metadata
+        if sensor_id not in self:
+            self.pending.add(sensor_id)
+        return metadata
+
+    def touch(self, sensor_id: str, seen: float):
+        # Mantém a ordem por último contato mesmo se o relógio recuar
+        seen = self._newest = max(seen, self._newest)
+        self.pending.discard(sensor_id)
+        self.silent.pop(sensor_id, None)
+        self.active[sensor_id] = seen
+        self.active.move_to_end(sensor_id)
+
+    def expire(self, now: Optional[float] = None):
+        """Passa para `silent` os sensores ativos cujo último contato saiu da janela."""
+        cutoff = (time.time() if now is None else now) - self.silent_after
+        while self.active:
+            sensor_id, seen = next(iter(self.active.items()))
+            if seen >= cutoff:
+                break
+            del self.active[sensor_id]
+            self.silent[sensor_id] = seen
+
+    def counts(self, now: Optional[float] = None) -> dict:
+        self.expire(now)
+        return {
+            "total": len(self),
+            "active": len(self.active),
+            "silent": len(self.silent),
+            "never_seen": len(self.pending),
+        }
+
+    def last_seen(self, sensor_id: str) -> Optional[float]:
+        return self.active.get(sensor_id, self.silent.get(sensor_id))
+
+    def silent_for(self, seconds: float, limit: int, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Até `limit` sensores sem contato há mais de `seconds`, do mais antigo para o mais recente.
+
+        O custo é proporcional ao resultado: a varredura para no primeiro
+        sensor com contato dentro do intervalo.
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+        cutoff = now - seconds
+        found = []
+        # `silent` vem antes de `active` na ordem de último contato
+        for group in (self.silent, self.active):
+            for sensor_id, seen in group.items():
+                if seen >= cutoff or len(found) >= limit:
+                    return found
+                found.append((sensor_id, seen))
+        return found
+
+    def describe(self, sensor_id: str, now: Optional[float] = None) -> Optional[dict]:
+        if sensor_id not in self:
+            return None
+        self.expire(now)
+        metadata = dict(self.metadata.get(sensor_id, {}))
+        registered_at = metadata.pop("registered_at", None)
+        seen = self.last_seen(sensor_id)
+        status = "active" if sensor_id in self.active else "silent" if sensor_id in self.silent else "never_seen"
+        return {
+            "sensor_id": sensor_id,
+            **metadata,
+            "registered_at": datetime.fromtimestamp(registered_at) if registered_at else None,
+            "last_seen": datetime.fromtimestamp(seen) if seen is not None else None,
+            "status": status,
+        }
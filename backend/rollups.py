@@ -0,0 +1,207 @@
+"""Agregados pré-calculados (1 minuto, 1 hora, 1 dia) por sensor.
+
+Cada série guarda, por bucket, contagem, soma, mínimo e máximo de cada
+métrica em arrays ordenados pelo início do bucket. Os lotes de leituras são
+agregados de forma vetorizada e mesclados incrementalmente; consultas de
+histórico leem só os buckets do intervalo, sem varrer leituras brutas.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch
+
+RESOLUTIONS = {"1m": 60_000, "1h": 3_600_000, "1d": 86_400_000}
+
+# Buckets mantidos por resolução: 2 dias de minutos, 90 dias de horas, 2 anos de dias
+DEFAULT_MAX_BUCKETS = {"1m": 2 * 1440, "1h": 90 * 24, "1d": 2 * 365}
+
+_N = len(METRICS)
+
+
+def aggregate(bucket_ids: np.ndarray, values: np.ndarray):
+    """Agrega leituras por bucket: retorna (buckets, count, sum, min, max)."""
+    if len(bucket_ids) > 1 and (np.diff(bucket_ids) < 0).any():
+        order = np.argsort(bucket_ids, kind="stable")
+        bucket_ids, values = bucket_ids[order], values[:, order]
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+    count = np.diff(np.r_[starts, len(bucket_ids)]).astype(np.int64)
+    return (
+        bucket_ids[starts],
+        count,
+        np.add.reduceat(values.astype(np.float64), starts, axis=1),
+        np.minimum.reduceat(values, starts, axis=1).astype(np.float32),
+        np.maximum.reduceat(values, starts, axis=1).astype(np.float32),
+    )
+
+
+class RollupSeries:
+    """Buckets de uma resolução para um sensor, em ordem crescente.
+
+    Os arrays têm folga no fim: um bucket novo depois do último (o caso
+    comum) é escrito no lugar e o descarte dos mais antigos só avança o
+    início da janela. A cópia acontece quando a folga acaba, com custo
+    amortizado constante por bucket.
+    """
+
+    def __init__(self, max_buckets: int, capacity: int = 16):
+        self.max_buckets = max_buckets
+        self._start = 0
+        self._n = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self._buckets = np.empty(capacity, dtype=np.int64)
+        self._count = np.empty(capacity, dtype=np.int64)
+        self._sum = np.empty((_N, capacity))
+        self._min = np.empty((_N, capacity), dtype=np.float32)
+        self._max = np.empty((_N, capacity), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def buckets(self) -> np.ndarray:
+        return self._buckets[self._start:self._start + self._n]
+
+    @property
+    def count(self) -> np.ndarray:
+        return self._count[self._start:self._start + self._n]
+
+    @property
+    def sum(self) -> np.ndarray:
+        return self._sum[:, self._start:self._start + self._n]
+
+    @property
+    def min(self) -> np.ndarray:
+        return self._min[:, self._start:self._start + self._n]
+
+    @property
+    def max(self) -> np.ndarray:
+        return self._max[:, self._start:self._start + self._n]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self._buckets, self._count, self._sum, self._min, self._max))
+
+    def _replace(self, buckets, count, sums, mins, maxs, capacity: int):
+        self._alloc(capacity)
+        n = len(buckets)
+        self._buckets[:n] = buckets
+        self._count[:n] = count
+        self._sum[:, :n] = sums
+        self._min[:, :n] = mins
+        self._max[:, :n] = maxs
+        self._start, self._n = 0, n
+
+    def _reserve(self, extra: int):
+        """Garante espaço para `extra` buckets no fim, compactando ou aumentando os arrays."""
+        if self._start + self._n + extra <= len(self._buckets):
+            return
+        needed = self._n + extra
+        capacity = max(16, min(2 * needed, 2 * self.max_buckets), needed)
+        self._replace(self.buckets, self.count, self.sum, self.min, self.max, capacity)
+
+    def merge(self, buckets, count, sums, mins, maxs):
+        """Incorpora agregados de buckets ordenados e sem repetição."""
+        current = self.buckets
+        pos = np.searchsorted(current, buckets)
+        exists = pos < len(current)
+        exists[exists] = current[pos[exists]] == buckets[exists]
+
+        # Buckets existentes: combina no lugar
+        p = pos[exists] + self._start
+        self._count[p] += count[exists]
+        self._sum[:, p] += sums[:, exists]
+        self._min[:, p] = np.minimum(self._min[:, p], mins[:, exists])
+        self._max[:, p] = np.maximum(self._max[:, p], maxs[:, exists])
+
+        new = ~exists
+        if not new.any():
+            return
+        k = int(new.sum())
+        if not self._n or buckets[new][0] > current[-1]:
+            # Caso comum (leituras em ordem): escreve depois do último bucket
+            self._reserve(k)
+            end = self._start + self._n
+            self._buckets[end:end + k] = buckets[new]
+            self._count[end:end + k] = count[new]
+            self._sum[:, end:end + k] = sums[:, new]
+            self._min[:, end:end + k] = mins[:, new]
+            self._max[:, end:end + k] = maxs[:, new]
+            self._n += k
+        else:
+            # Leituras atrasadas abrindo buckets no meio da série
+            at = pos[new]
+            merged = (
+                np.insert(current, at, buckets[new]),
+                np.insert(self.count, at, count[new]),
+                np.insert(self.sum, at, sums[:, new], axis=1),
+                np.insert(self.min, at, mins[:, new], axis=1),
+                np.insert(self.max, at, maxs[:, new], axis=1),
+            )
+            self._replace(*merged, capacity=max(16, len(merged[0])))
+        self._trim()
+
+    def _trim(self):
+        extra = self._n - self.max_buckets
+        if extra > 0:
+            self._start += extra
+            self._n -= extra
+
+    def range(self, start_bucket: int, end_bucket: int) -> slice:
+        lo = np.searchsorted(self.buckets, start_bucket, side="left")
+        hi = np.searchsorted(self.buckets, end_bucket, side="right")
+        return slice(lo, hi)
+
+
+class RollupStore:
+    def __init__(self, max_buckets: Optional[Dict[str, int]] = None):
+        self.max_buckets = dict(DEFAULT_MAX_BUCKETS, **(max_buckets or {}))
+        self._series: Dict[str, Dict[str, RollupSeries]] = {}
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for series in self._series.values() for s in series.values())
+
+    def drop(self, sensor_id: str):
+        """Descarta os agregados do sensor (ex.: sensor expulso do armazenamento)."""
+        self._series.pop(sensor_id, None)
+
+    def _series_for(self, sensor_id: str) -> Dict[str, RollupSeries]:
+        series = self._series.get(sensor_id)
+        if series is None:
+            series = self._series[sensor_id] = {
+                resolution: RollupSeries(self.max_buckets[resolution]) for resolution in RESOLUTIONS
+            }
+        return series
+
+    def add_batch(self, batch: ReadingBatch):
+        for sensor_id, idx in batch.groups():
+            series = self._series_for(sensor_id)
+            timestamps = batch.timestamps[idx]
+            values = batch.values[:, idx]
+            for resolution, width in RESOLUTIONS.items():
+                series[resolution].merge(*aggregate(timestamps // width, values))
+
+    def merge(self, sensor_id: str, resolution: str, buckets, count, sums, mins, maxs):
+        """Incorpora agregados já calculados (ex.: vindos do SQLite)."""
+        self._series_for(sensor_id)[resolution].merge(buckets, count, sums, mins, maxs)
+
+    def query(self, sensor_id: str, resolution: str, start_ms: int,
+              end_ms: int) -> Optional[Tuple[np.ndarray, ...]]:
+        """Retorna (início_ms, count, sum, min, max) dos buckets no intervalo."""
+        series = self._series.get(sensor_id)
+        if series is None:
+            return None
+        s = series[resolution]
+        width = RESOLUTIONS[resolution]
+        window = s.range(start_ms // width, end_ms // width)
+        return (s.buckets[window] * width, s.count[window], s.sum[:, window],
+                s.min[:, window], s.max[:, window])
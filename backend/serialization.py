@@ -0,0 +1,30 @@
+"""Serialização JSON rápida para as rotas de leitura mais acessadas.
+
+Essas rotas montam dicionários e listas já no formato de saída e devolvem
+uma `Response` pronta: o FastAPI não revalida o `response_model` (que
+continua documentando o schema) nem percorre o conteúdo com
+`jsonable_encoder`. O orjson serializa datetime, arrays e escalares NumPy
+diretamente.
+"""
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
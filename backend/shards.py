@@ -0,0 +1,313 @@
+"""Estado em memória particionado por fazenda (farm_id).
+
+Cada fazenda pertence a um shard, escolhido por hash do `farm_id`. O shard
+tem seus próprios armazenamentos (séries, agregados, alertas, anomalias),
+um `threading.Lock` e contadores; a gravação de um lote roda numa thread
+segurando só o lock do shard dono, e as consultas de outras fazendas
+seguem em paralelo nos demais shards. Dentro do shard, sensores e zonas
+usam chaves com escopo ("fazenda/id", ver `storage.scoped_key`).
+
+O resumo da frota inteira não varre sensores: soma os totais de cada
+shard (contagens e somas de pH/umidade) e só então calcula as médias.
+O cadastro de sensores (`registry.SensorRegistry`) é um por fazenda,
+também protegido pelo lock do shard.
+
+Com vários workers (ver `shared_state`), cada processo é dono dos shards
+com `índice % workers == slot`. As consultas da frota calculam um parcial
+por shard (`ShardedStore.gather`): os shards deste processo respondem
+aqui e os dos outros workers pelo `remote`, um pedido por worker.
+"""
+import asyncio
+import heapq
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from aggregates import SoilAggregates
+from alerts import RuleEngine
+from anomaly import AnomalyDetector
+from registry import SensorRegistry
+from rollups import RollupStore
+from storage import FARM_ID_MAX_LENGTH, ReadingBatch, SensorStore, group_indices, scoped_key, split_key
+
+FARM_ID_PATTERN = rf"^[A-Za-z0-9_.-]{{1,{FARM_ID_MAX_LENGTH}}}$"
+
+
+class FarmShard:
+    def __init__(self, index: int, sensor_store: SensorStore, rule_engine: RuleEngine, silent_after: float = 900):
+        self.index = index
+        self.lock = threading.Lock()
+        self.sensor_store = sensor_store
+        self.sensor_store.on_evict = self.forget_sensor
+        self.rollups = RollupStore()
+        self.aggregates = SoilAggregates()
+        self.rule_engine = rule_engine
+        self.anomaly_detector = AnomalyDetector()
+        self.silent_after = silent_after
+        self.registries: Dict[str, SensorRegistry] = {}  # fazendas com leituras ou cadastros neste shard
+        self.queue = None  # IngestQueue do shard, ligada em main
+        self.batches = 0
+        self.readings = 0
+        self.contended = 0  # acessos que encontraram o lock ocupado
+        self.lock_wait_seconds = 0.0
+
+    def _acquire(self):
+        if not self.lock.acquire(blocking=False):
+            started = time.perf_counter()
+            self.lock.acquire()
+            self.contended += 1
+            self.lock_wait_seconds += time.perf_counter() - started
+
+    def registry(self, farm_id: str) -> SensorRegistry:
+        registry = self.registries.get(farm_id)
+        if registry is None:
+            registry = self.registries[farm_id] = SensorRegistry(self.silent_after)
+        return registry
+
+    def _farm_registries(self, farm_id: Optional[str]) -> List[SensorRegistry]:
+        if farm_id is None:
+            return list(self.registries.values())
+        registry = self.registries.get(farm_id)
+        return [registry] if registry is not None else []
+
+    def touch(self, batch: ReadingBatch, now: Optional[float] = None):
+        """Último contato de cada sensor do lote: `now`, ou o timestamp da leitura mais recente."""
+        sensors, inverse = np.unique(batch.sensor_ids, return_inverse=True)
+        if now is None:
+            last_ms = np.zeros(len(sensors), dtype=np.int64)
+            np.maximum.at(last_ms, inverse, batch.timestamps)
+            order = np.argsort(last_ms, kind="stable").tolist()
+            seen = (last_ms / 1000).tolist()
+        else:
+            order = range(len(sensors))
+            seen = [now] * len(sensors)
+        sensors = sensors.tolist()
+        for i in order:
+            farm_id, sensor_id = split_key(sensors[i])
+            self.registry(farm_id).touch(sensor_id, seen[i])
+
+    def register(self, entry: dict):
+        """Cadastra um sensor; zona e cultura informadas valem para as leituras e regras seguintes."""
+        farm_id, sensor_id = entry["farm_id"], entry["sensor_id"]
+        metadata = {key: entry.get(key) for key in ("zone_id", "crop", "latitude", "longitude", "registered_at")}
+        self.registry(farm_id).register(sensor_id, **metadata)
+        if entry.get("zone_id"):
+            zone_id = scoped_key(farm_id, entry["zone_id"])
+            self.aggregates.sensor_zone.setdefault(scoped_key(farm_id, sensor_id), zone_id)
+            if entry.get("crop"):
+                self.rule_engine.set_zone_crop(zone_id, entry["crop"])
+
+    def totals(self, farm_id: Optional[str] = None) -> dict:
+        return self.aggregates.totals(farm_id)
+
+    def sensor_counts(self, farm_id: Optional[str] = None, now: Optional[float] = None) -> dict:
+        counts = {"total": 0, "active": 0, "silent": 0, "never_seen": 0}
+        for registry in self._farm_registries(farm_id):
+            for key, value in registry.counts(now).items():
+                counts[key] += value
+        return counts
+
+    def silent_sensors(self, farm_id: Optional[str], seconds: float, limit: int,
+                       now: Optional[float] = None) -> List[tuple]:
+        """(último contato, farm_id, sensor_id) dos sensores silenciosos, do mais antigo ao mais recente."""
+        farms = list(self.registries) if farm_id is None else [farm_id]
+        found = [
+            [(seen, farm, sensor_id) for sensor_id, seen in self.registries[farm].silent_for(seconds, limit, now)]
+            for farm in farms if farm in self.registries
+        ]
+        return list(heapq.merge(*found))[:limit]
+
+    def active_alerts(self, farm_id: Optional[str] = None) -> Dict[str, List[str]]:
+        """Sensores com alerta ativo por regra (ids locais quando filtrado por fazenda)."""
+        if farm_id is None:
+            return {rule_id: sorted(sensors) for rule_id, sensors in self.rule_engine.active.items()}
+        return {
+            rule_id: sorted(local for farm, local in map(split_key, sensors) if farm == farm_id)
+            for rule_id, sensors in self.rule_engine.active.items()
+        }
+
+    def anomalies(self, farm_id: Optional[str], limit: int) -> tuple:
+        """(maiores anomalias, total de sensores anômalos, sensores acompanhados)."""
+        detector = self.anomaly_detector
+        flagged = [a for a in detector.flagged.values() if farm_id is None or split_key(a["sensor_id"])[0] == farm_id]
+        flagged.sort(key=lambda a: a["score"], reverse=True)
+        if farm_id is None:
+            tracked = len(detector.slots)
+        else:
+            tracked = sum(1 for s in detector.slots if split_key(s)[0] == farm_id)
+        return flagged[:limit], len(flagged), tracked
+
+    def forget_sensor(self, sensor_id: str):
+        """Descarta agregados, anomalias e alertas de um sensor expulso do armazenamento (chamado com o lock)."""
+        self.rollups.drop(sensor_id)
+        self.aggregates.forget(sensor_id)
+        self.anomaly_detector.forget(sensor_id)
+        self.rule_engine.forget(sensor_id)
+        # A zona do cadastro continua valendo se o sensor voltar a enviar leituras
+        farm_id, local_id = split_key(sensor_id)
+        registry = self.registries.get(farm_id)
+        zone_id = registry.metadata.get(local_id, {}).get("zone_id") if registry is not None else None
+        if zone_id:
+            self.aggregates.sensor_zone[sensor_id] = scoped_key(farm_id, zone_id)
+
+    def index_batch(self, batch: ReadingBatch):
+        """Atualiza séries, rollups e agregados (chamar com o lock)."""
+        self.sensor_store.append_batch(batch)
+        self.rollups.add_batch(batch)
+        self.aggregates.add_batch(batch)
+        self.batches += 1
+        self.readings += len(batch)
+
+    def process(self, batch: ReadingBatch) -> dict:
+        """Indexa o lote, avalia as regras de alerta e pontua anomalias."""
+        self._acquire()
+        try:
+            self.index_batch(batch)
+            self.touch(batch, time.time())
+            return {
+                "alerts": self.rule_engine.evaluate(batch, self.aggregates.resolve_zones(batch)),
+                "anomaly": self.anomaly_detector.observe(batch),
+            }
+        finally:
+            self.lock.release()
+
+    def restore(self, batch: ReadingBatch):
+        with self.lock:
+            self.index_batch(batch)
+            self.touch(batch)
+            self.anomaly_detector.observe(batch)
+
+    def call(self, fn: Callable, *args):
+        self._acquire()
+        try:
+            return fn(*args)
+        finally:
+            self.lock.release()
+
+    async def read(self, fn: Callable, *args):
+        """Executa `fn` com o lock; se o shard estiver gravando, espera numa thread sem travar o event loop."""
+        if self.lock.acquire(blocking=False):
+            try:
+                return fn(*args)
+            finally:
+                self.lock.release()
+        return await asyncio.to_thread(self.call, fn, *args)
+
+    def metrics(self) -> dict:
+        return {
+            "shard": self.index,
+            "farms": len(self.registries),
+            "batches": self.batches,
+            "readings": self.readings,
+            "stored_readings": len(self.sensor_store),
+            "stored_sensors": len(self.sensor_store.sensor_ids()),
+            "rollup_sensors": len(self.rollups),
+            "rollup_mb": round(self.rollups.nbytes / 1024 / 1024, 2),
+            "lock_contended": self.contended,
+            "lock_wait_ms": round(self.lock_wait_seconds * 1000, 3),
+            "queue": self.queue.metrics() if self.queue is not None else None,
+        }
+
+
+class ShardedStore:
+    def __init__(self, count: int, factory: Callable[[int], FarmShard]):
+        self.shards: List[FarmShard] = [factory(i) for i in range(max(1, count))]
+        # Shards deste processo: índice % workers == slot (slot None: nenhum, só encaminha)
+        self.slot: Optional[int] = 0
+        self.workers = 1
+        # Parciais calculados por shard nas consultas da frota: fn(shard, farm_id, *args)
+        self.partials: Dict[str, Callable[..., Any]] = {
+            name: getattr(FarmShard, name)
+            for name in ("totals", "sensor_counts", "silent_sensors", "active_alerts", "anomalies")
+        }
+        # Parciais dos shards de outro worker: remote(slot, nome, farm_id, args) -> um resultado por shard
+        self.remote: Optional[Callable[[int, str, Optional[str], list], Awaitable[list]]] = None
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def assign(self, slot: Optional[int], workers: int):
+        self.slot, self.workers = slot, max(1, workers)
+
+    def owner(self, farm_id: str) -> int:
+        """Slot do worker dono da fazenda."""
+        return self._index(farm_id) % self.workers
+
+    def owns(self, shard: FarmShard) -> bool:
+        return shard.index % self.workers == self.slot
+
+    def local_shards(self) -> List[FarmShard]:
+        return [shard for shard in self.shards if self.owns(shard)]
+
+    def _index(self, farm_id: str) -> int:
+        # crc32 é estável entre processos (hash() de str não é)
+        return zlib.crc32(farm_id.encode()) % len(self.shards)
+
+    def shard_for(self, farm_id: str) -> FarmShard:
+        # Só calcula o shard: consultas de fazendas desconhecidas não deixam estado
+        return self.shards[self._index(farm_id)]
+
+    def split(self, batch: ReadingBatch) -> Iterable[Tuple[FarmShard, ReadingBatch]]:
+        """Divide um lote com várias fazendas (chaves com escopo) entre os shards donos."""
+        sensors, inverse = np.unique(batch.sensor_ids, return_inverse=True)
+        owners = np.array([self.shard_for(split_key(s)[0]).index for s in sensors.tolist()], dtype=np.intp)
+        for index, idx in group_indices(owners[inverse]):
+            yield self.shards[index], batch.select(idx)
+
+    async def local_partials(self, name: str, farm_id: Optional[str], args: list) -> list:
+        """Parcial `name` de cada shard deste processo (da fazenda ou todos), com o lock do shard."""
+        fn = self.partials[name]
+        shards = self.shards if farm_id is None else [self.shard_for(farm_id)]
+        return list(await asyncio.gather(*(shard.read(fn, shard, farm_id, *args) for shard in shards
+                                           if self.owns(shard))))
+
+    async def gather(self, name: str, farm_id: Optional[str] = None, *args) -> list:
+        """Parcial `name` de cada shard da fazenda (ou da frota), daqui e dos outros workers em paralelo."""
+        shards = self.shards if farm_id is None else [self.shard_for(farm_id)]
+        slots = sorted({shard.index % self.workers for shard in shards} - {self.slot})
+        parts = await asyncio.gather(
+            self.local_partials(name, farm_id, list(args)),
+            *(self.remote(slot, name, farm_id, list(args)) for slot in slots),
+        )
+        return [part for worker in parts for part in worker]
+
+    async def totals(self, farm_id: Optional[str] = None) -> dict:
+        """Totais da fazenda, ou da frota somando os totais de todos os shards."""
+        merged = {"sensors": 0, "zones": 0, "ph_sum": 0.0, "moisture_sum": 0.0}
+        for part in await self.gather("totals", farm_id):
+            for key, value in part.items():
+                merged[key] += value
+        return merged
+
+    async def sensor_counts(self, farm_id: Optional[str] = None) -> dict:
+        """Sensores ativos, silenciosos e sem leitura, somados entre os shards."""
+        parts = await self.gather("sensor_counts", farm_id)
+        return {key: sum(part[key] for part in parts) for key in parts[0]}
+
+    async def silent_sensors(self, farm_id: Optional[str], seconds: float, limit: int) -> List[tuple]:
+        parts = await self.gather("silent_sensors", farm_id, seconds, limit)
+        # Parciais de outros workers chegam como listas (JSON): tuplas para comparar com os locais
+        return list(heapq.merge(*([tuple(entry) for entry in part] for part in parts)))[:limit]
+
+    async def active_alerts(self, template: RuleEngine, farm_id: Optional[str] = None) -> List[dict]:
+        """Alertas ativos de todos os shards (ou de uma fazenda) agrupados por regra."""
+        merged = {rule_id: set() for rule_id in template.rule_ids}
+        for part in await self.gather("active_alerts", farm_id):
+            for rule_id, sensors in part.items():
+                merged[rule_id].update(sensors)
+        return list(template.active_alerts(active=merged))
+
+    async def anomalies(self, limit: int, farm_id: Optional[str] = None) -> dict:
+        parts = await self.gather("anomalies", farm_id, limit)
+        anomalies = sorted((a for part, _, _ in parts for a in part), key=lambda a: a["score"], reverse=True)
+        return {
+            "sensors_tracked": sum(tracked for _, _, tracked in parts),
+            "anomalous_sensors": sum(count for _, count, _ in parts),
+            "anomalies": anomalies[:limit],
+        }
@@ -0,0 +1,521 @@
+"""Estado compartilhado entre processos (uvicorn --workers N).
+
+Dois backends com a mesma interface:
+
+- `LocalState`: um único processo, tudo em memória (padrão);
+- `SharedState`: vários workers na mesma máquina, coordenados por arquivos
+  num diretório (de preferência um tmpfs, como /dev/shm).
+
+No `SharedState`, cada worker reserva um slot (`flock` em `slots/<n>.lock`)
+e passa a ser o dono dos shards de fazenda com `índice % workers == slot`:
+só ele grava e consulta esses shards, e as requisições das outras fazendas
+seguem para o worker dono (ver `peers`). A ingestão se divide entre os
+processos em vez de cada worker repetir o trabalho de todos.
+
+O dono também grava cada lote num anel de registros de tamanho fixo num
+arquivo mapeado em memória. O anel funciona como log: o worker que sobe
+(ou reinicia) num slot reconstrói os próprios shards com o que ainda está
+lá, e os demais acompanham o anel numa tarefa de fundo, fora do caminho
+das requisições, só para alimentar o feed ao vivo.
+
+A irrigação tem um único escritor: o worker que obtém o `flock` de
+`coordinator.lock` vira o coordenador e só ele roda o agendador e o
+controle automático. Os demais enviam comandos por uma caixa de mensagens
+(arquivos JSON) e recebem as mudanças de estado por um segundo anel,
+mantendo um espelho local para as consultas. Se o coordenador cair, o lock
+é liberado e outro worker assume as execuções ativas (planos em andamento
+ficam no processo antigo e se perdem).
+
+O anel de eventos também leva os cadastros de sensores (reaplicados pelo
+dono ao subir) e as transições de alerta para o feed ao vivo dos outros
+workers.
+"""
+import asyncio
+import fcntl
+import inspect
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from serialization import dumps
+from storage import FARM_ID_MAX_LENGTH, LOCAL_ID_MAX_LENGTH, METRICS, ReadingBatch
+
+logger = logging.getLogger(__name__)
+
+# sensor_id e zone_id com o prefixo da fazenda, em UTF-8 (até 4 bytes por caractere)
+ID_BYTES = FARM_ID_MAX_LENGTH + 1 + 4 * LOCAL_ID_MAX_LENGTH
+
+READING_DTYPE = np.dtype([
+    ("origin", "<i4"),
+    ("sensor_id", f"S{ID_BYTES}"),
+    ("zone_id", f"S{ID_BYTES}"),
+    ("timestamp", "<i8"),
+    ("values", "<f8", (len(METRICS),)),
+])
+
+EVENT_DTYPE = np.dtype([
+    ("origin", "<i4"),
+    ("kind", "u1"),
+    ("data", "S1019"),  # log de irrigação, cadastro de sensor ou transições de alerta em JSON
+])
+EVENT_IRRIGATION = 0
+EVENT_SENSOR = 1
+EVENT_ALERTS = 2
+
+
+class CoordinatorUnavailable(Exception):
+    pass
+
+
+class SharedRing:
+    """Anel de registros de tamanho fixo num arquivo mapeado em memória.
+
+    O cabeçalho guarda o total de registros já gravados; o registro `i` fica
+    na posição `i % capacity`. Gravações usam `flock` exclusivo e leituras
+    `flock` compartilhado, então um leitor nunca copia um registro pela
+    metade. Um leitor que ficou mais de `capacity` registros para trás perde
+    os mais antigos (contados em `lost`).
+    """
+
+    HEADER_BYTES = 64
+
+    def __init__(self, path: str, dtype: np.dtype, capacity: int):
+        self.path = path
+        self.dtype = dtype
+        self.capacity = capacity
+        size = self.HEADER_BYTES + capacity * dtype.itemsize
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size != size:
+                # Arquivo novo ou com outro formato: recomeça vazio
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(self.HEADER_BYTES // 8,))
+        self._records = np.memmap(path, dtype=dtype, mode="r+", offset=self.HEADER_BYTES, shape=(capacity,))
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def head(self) -> int:
+        return int(self._header[0])
+
+    @property
+    def oldest(self) -> int:
+        """Posição do registro mais antigo ainda no anel."""
+        return max(0, self.head - self.capacity)
+
+    def append(self, records: np.ndarray) -> int:
+        """Grava os registros e devolve a posição do primeiro."""
+        n = len(records)
+        if n > self.capacity:
+            raise ValueError(f"Lote maior que a capacidade do anel ({self.capacity})")
+        with self._locked(fcntl.LOCK_EX):
+            start = self.head
+            positions = np.arange(start, start + n) % self.capacity
+            self._records[positions] = records
+            self._header[0] = start + n
+        return start
+
+    def read(self, cursor: int, until: Optional[int] = None):
+        """Registros em [cursor, until); devolve (registros, nova posição, perdidos)."""
+        with self._locked(fcntl.LOCK_SH):
+            end = self.head if until is None else until
+            start = max(cursor, end - self.capacity)
+            records = self._records[np.arange(start, end) % self.capacity]
+        return records, end, start - cursor
+
+    def close(self):
+        for array in (self._header, self._records):
+            array._mmap.close()
+        os.close(self._fd)
+
+
+def _encode_ids(ids: np.ndarray, name: str) -> np.ndarray:
+    encoded = np.array([(value or "").encode() for value in ids.tolist()], dtype=bytes)
+    if encoded.dtype.itemsize > ID_BYTES:
+        raise ValueError(f"{name} excede {ID_BYTES} bytes")
+    return encoded
+
+
+def to_records(batch: ReadingBatch, origin: int) -> np.ndarray:
+    records = np.empty(len(batch), dtype=READING_DTYPE)
+    records["origin"] = origin
+    records["sensor_id"] = _encode_ids(batch.sensor_ids, "sensor_id")
+    records["zone_id"] = _encode_ids(batch.zone_ids, "zone_id")
+    records["timestamp"] = batch.timestamps
+    records["values"] = batch.values.T
+    return records
+
+
+def from_records(records: np.ndarray) -> ReadingBatch:
+    zone_ids = [value.decode() or None for value in records["zone_id"].tolist()]
+    return ReadingBatch(
+        np.array([value.decode() for value in records["sensor_id"].tolist()], dtype=object),
+        records["timestamp"].copy(),
+        np.ascontiguousarray(records["values"].T),
+        np.array(zone_ids, dtype=object),
+    )
+
+
+def _parse_log(log: dict) -> dict:
+    for key in ("start_time", "end_time"):
+        if isinstance(log.get(key), str):
+            log[key] = datetime.fromisoformat(log[key])
+    return log
+
+
+class LocalState:
+    """Backend de um único processo: nada a sincronizar, dono de todos os shards e sempre coordenador."""
+
+    backend = "local"
+    slot: Optional[int] = 0
+    workers = 1
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable] = {}  # comandos de irrigação executados pelo coordenador
+        self.on_promote: Optional[Callable[[], None]] = None  # este processo passou a ser o coordenador
+        self.on_replay: Optional[Callable[[ReadingBatch], None]] = None  # leituras do anel ao subir
+        self.on_readings: Optional[Callable[[ReadingBatch], None]] = None  # lote gravado por outro worker
+        self.wants_readings: Callable[[], bool] = lambda: True  # sem interessados, o anel só avança
+        self.on_alerts: Optional[Callable[[List[dict]], None]] = None  # transições de alerta de outro worker
+        self.on_irrigation: Optional[Callable[[dict], None]] = None  # mudança de estado vinda do coordenador
+        self.on_irrigation_snapshot: Optional[Callable[[List[dict]], None]] = None  # execuções ativas
+        self.on_sensor: Optional[Callable[[dict], None]] = None  # sensor cadastrado (reaplicado ao subir)
+
+    @property
+    def is_leader(self) -> bool:
+        return True
+
+    async def start(self):
+        if self.on_promote is not None:
+            self.on_promote()
+
+    async def stop(self):
+        pass
+
+    def publish_readings(self, batch: ReadingBatch):
+        pass
+
+    def publish_alerts(self, changes: List[dict]):
+        pass
+
+    def publish_irrigation(self, log: dict):
+        pass
+
+    def publish_sensor(self, entry: dict):
+        pass
+
+    async def _execute(self, command: str, args: dict):
+        result = self.handlers[command](**args)
+        # Comandos podem ser corrotinas (ex.: ciclo do controle automático)
+        return await result if inspect.isawaitable(result) else result
+
+    async def call(self, command: str, **args):
+        return await self._execute(command, args)
+
+    def metrics(self) -> dict:
+        return {"backend": self.backend, "pid": os.getpid(), "slot": self.slot, "workers": self.workers,
+                "leader": True}
+
+
+class SharedState(LocalState):
+    backend = "shared"
+
+    def __init__(self, directory: str, workers: int = 1, ring_capacity: int = 131072, event_capacity: int = 16384,
+                 interval: float = 0.05, command_timeout: float = 5.0, replay: bool = True, read_chunk: int = 65536):
+        super().__init__()
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.command_timeout = command_timeout
+        self.replay = replay
+        self.read_chunk = read_chunk  # registros por leitura do anel
+        self.pid = os.getpid()
+        for sub in ("commands", "results", "slots"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        self.readings = SharedRing(os.path.join(directory, "readings.ring"), READING_DTYPE, ring_capacity)
+        self.events = SharedRing(os.path.join(directory, "irrigation.ring"), EVENT_DTYPE, event_capacity)
+        self._lock_fd = os.open(os.path.join(directory, "coordinator.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._leader = False
+        self._task: Optional[asyncio.Task] = None
+        # O slot é reservado já na criação: os shards deste worker ficam definidos antes da primeira requisição
+        self.slot: Optional[int] = None
+        self._slot_fd: Optional[int] = None
+        self._claim_slot()
+        # Tudo até aqui é reaplicado por `start` (com `replay`); depois, só acompanhado
+        self.reading_cursor = self.readings.head
+        self.event_cursor = self.events.head
+        self._resync = True  # execuções ativas iniciadas antes deste worker subir
+        self.replayed_readings = 0
+        self.live_readings = 0
+        self.lost_readings = 0
+        self.lost_events = 0
+        self.commands_sent = 0
+        self.commands_handled = 0
+        self.errors = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader
+
+    def _claim_slot(self):
+        """Reserva o primeiro slot livre; sem nenhum, o worker não tem shards e só encaminha as requisições."""
+        for slot in range(self.workers):
+            fd = os.open(os.path.join(self.directory, "slots", f"{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self.slot, self._slot_fd = slot, fd
+            return
+
+    def _elect(self):
+        if self._leader:
+            return
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        self._leader = True
+        # Estado espelhado até aqui passa a ser deste processo
+        self._sync_events()
+        if self.on_promote is not None:
+            self.on_promote()
+
+    async def start(self):
+        if self.replay and self.slot is not None:
+            await asyncio.to_thread(self._replay)
+        self._elect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._leader:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            self._leader = False
+        self.readings.close()
+        self.events.close()
+        os.close(self._lock_fd)
+        if self._slot_fd is not None:
+            os.close(self._slot_fd)  # libera o slot para o worker que vier depois
+            self._slot_fd = None
+
+    async def _run(self):
+        while True:
+            try:
+                self._elect()
+                self._sync_events()
+                await self._follow_readings()
+                if self._leader:
+                    await self._handle_commands()
+                    self._expire_results()
+                elif self._resync:
+                    await self._resync_irrigation()
+            except Exception:
+                # Um erro (ex.: evento inválido) não pode parar a sincronização deste worker
+                self.errors += 1
+                logger.exception("Falha ao sincronizar o estado compartilhado")
+            await asyncio.sleep(self.interval)
+
+    def _replay(self):
+        """Reaplica aos shards deste worker o que ainda está nos anéis (roda numa thread, ao subir)."""
+        records, _, _ = self.events.read(self.events.oldest, self.event_cursor)
+        for data in records[records["kind"] == EVENT_SENSOR]["data"].tolist():
+            self.on_sensor(orjson.loads(data))
+        cursor = self.readings.oldest
+        while cursor < self.reading_cursor:
+            records, cursor, _ = self.readings.read(cursor, min(self.reading_cursor, cursor + self.read_chunk))
+            if len(records):
+                self.replayed_readings += len(records)
+                self.on_replay(from_records(records))
+
+    # --- leituras ---
+
+    def publish_readings(self, batch: ReadingBatch):
+        """Grava no anel um lote já processado por este worker (dono dos shards do lote)."""
+        self.readings.append(to_records(batch, self.pid))
+
+    def _read_from_others(self, cursor: int, until: int):
+        records, end, lost = self.readings.read(cursor, min(until, cursor + self.read_chunk))
+        return from_records(records[records["origin"] != self.pid]), end, lost
+
+    async def _follow_readings(self):
+        """Leituras gravadas pelos outros workers, só para o feed ao vivo (decodificadas numa thread)."""
+        head = self.readings.head
+        if head == self.reading_cursor:
+            return
+        if self.on_readings is None or not self.wants_readings():
+            self.reading_cursor = head  # ninguém acompanhando: só avança
+            return
+        batch, self.reading_cursor, lost = await asyncio.to_thread(self._read_from_others, self.reading_cursor, head)
+        self.lost_readings += lost
+        if len(batch):
+            self.live_readings += len(batch)
+            self.on_readings(batch)
+
+    # --- eventos ---
+
+    def _publish_event(self, kind: int, payload):
+        data = dumps(payload)
+        if len(data) > EVENT_DTYPE["data"].itemsize:
+            raise ValueError("Evento excede o tamanho do registro")
+        record = np.zeros(1, dtype=EVENT_DTYPE)
+        record["origin"], record["kind"], record["data"] = self.pid, kind, data
+        self.events.append(record)
+
+    def publish_irrigation(self, log: dict):
+        if self._leader:
+            self._publish_event(EVENT_IRRIGATION, log)
+
+    def publish_sensor(self, entry: dict):
+        self._publish_event(EVENT_SENSOR, entry)
+
+    def publish_alerts(self, changes: List[dict]):
+        """Transições de alerta para o feed ao vivo dos outros workers, em quantos registros forem precisos."""
+        limit = EVENT_DTYPE["data"].itemsize
+        chunk, size = [], 2  # "[]"
+        for change in changes:
+            length = len(dumps(change)) + 1
+            if chunk and size + length > limit:
+                self._publish_event(EVENT_ALERTS, chunk)
+                chunk, size = [], 2
+            chunk.append(change)
+            size += length
+        if chunk:
+            self._publish_event(EVENT_ALERTS, chunk)
+
+    def _sync_events(self):
+        if self.events.head == self.event_cursor:
+            return
+        records, self.event_cursor, lost = self.events.read(self.event_cursor)
+        if lost:
+            # Eventos perdidos: pede ao coordenador as execuções ativas
+            self.lost_events += lost
+            self._resync = True
+        records = records[records["origin"] != self.pid]
+        for kind, data in zip(records["kind"].tolist(), records["data"].tolist()):
+            if kind == EVENT_SENSOR:
+                self.on_sensor(orjson.loads(data))
+            elif kind == EVENT_ALERTS:
+                self.on_alerts(orjson.loads(data))
+            else:
+                self.on_irrigation(_parse_log(orjson.loads(data)))
+
+    async def _resync_irrigation(self):
+        self._resync = False
+        try:
+            active = await self.call("irrigation_active")
+        except CoordinatorUnavailable:
+            self._resync = True
+            return
+        self.on_irrigation_snapshot([_parse_log(log) for log in active])
+
+    # --- comandos para o coordenador ---
+
+    def _path(self, kind: str, command_id: str) -> str:
+        return os.path.join(self.directory, kind, f"{command_id}.json")
+
+    def _write(self, path: str, payload: dict):
+        tmp = f"{path}.{self.pid}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps(payload))
+        os.replace(tmp, path)  # o outro lado só vê o arquivo completo
+
+    async def call(self, command: str, **args):
+        """Executa o comando no coordenador (localmente, se este worker for o coordenador)."""
+        if self._leader:
+            return await self._execute(command, args)
+        # Prefixo de tempo: o coordenador atende os comandos na ordem de chegada
+        command_id = f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+        self._write(self._path("commands", command_id), {"command": command, "args": args})
+        self.commands_sent += 1
+        result_path = self._path("results", command_id)
+        deadline = time.monotonic() + self.command_timeout
+        while not os.path.exists(result_path):
+            if time.monotonic() > deadline:
+                try:
+                    os.remove(self._path("commands", command_id))
+                except FileNotFoundError:
+                    pass
+                raise CoordinatorUnavailable("Coordenador de irrigação não respondeu")
+            await asyncio.sleep(0.005)
+        with open(result_path, "rb") as f:
+            response = orjson.loads(f.read())
+        os.remove(result_path)
+        # O coordenador publica os eventos antes da resposta: o espelho já reflete o comando
+        self._sync_events()
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def _handle_commands(self):
+        directory = os.path.join(self.directory, "commands")
+        for entry in sorted((e for e in os.scandir(directory) if e.name.endswith(".json")), key=lambda e: e.name):
+            command_id = entry.name[:-len(".json")]
+            try:
+                with open(entry.path, "rb") as f:
+                    request = orjson.loads(f.read())
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue  # chamador desistiu
+            try:
+                response = {"result": await self._execute(request["command"], request["args"])}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self._write(self._path("results", command_id), response)
+            self.commands_handled += 1
+
+    def _expire_results(self, max_age: float = 60):
+        """Remove respostas que ninguém buscou (chamador desistiu por timeout)."""
+        cutoff = time.time() - max_age
+        for entry in os.scandir(os.path.join(self.directory, "results")):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> dict:
+        return {
+            "backend": self.backend,
+            "pid": self.pid,
+            "slot": self.slot,
+            "workers": self.workers,
+            "leader": self._leader,
+            "readings": {
+                "head": self.readings.head,
+                "cursor": self.reading_cursor,
+                "capacity": self.readings.capacity,
+                "replayed": self.replayed_readings,
+                "live_from_workers": self.live_readings,
+                "lost": self.lost_readings,
+            },
+            "irrigation_events": {
+                "head": self.events.head,
+                "cursor": self.event_cursor,
+                "lost": self.lost_events,
+            },
+            "commands_sent": self.commands_sent,
+            "commands_handled": self.commands_handled,
+            "errors": self.errors,
+        }
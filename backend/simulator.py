@@ -0,0 +1,274 @@
+"""Simulador vetorizado de frotas de sensores.
+
+Cada sensor tem um perfil e um estado próprios, mantidos em colunas NumPy;
+um passo gera a leitura de todos os sensores de uma vez:
+
+- temperatura: média do sensor + curva diária (mínima de madrugada, pico
+  no meio da tarde) + ruído;
+- umidade do ar: cai quando a temperatura sobe acima da média do sensor;
+- umidade do solo: decai exponencialmente até o ponto de murcha, mais
+  rápido no calor; quando a média da zona fica abaixo de `irrigate_below`
+  a zona inteira é irrigada e volta perto da capacidade de campo;
+- pH: deriva lenta por sensor, com reversão à linha de base e ruído.
+
+Com a mesma `seed`, a mesma sequência de passos gera as mesmas leituras.
+
+Também é um gerador de carga: envia N sensores x T passos para
+`/sensors/data/batch` (colunar) ou `/sensors/data/stream` (NDJSON) numa
+taxa alvo, para testes de capacidade com frotas de 100 mil sensores.
+
+Uso (a partir de `backend/`, com a API no ar):
+
+    python -m simulator --sensors 100000 --steps 10 --rate 50000 --connections 8
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import httpx
+import numpy as np
+import orjson
+
+from storage import METRICS, ReadingBatch, record
+
+
+class FleetSimulator:
+    def __init__(self, sensors: int = 5, zones: Optional[int] = None, seed: Optional[int] = None,
+                 prefix: str = "AGRO_", irrigate_below: float = 25.0, field_capacity: float = 75.0):
+        rng = self.rng = np.random.default_rng(seed)
+        n = self.size = sensors
+        zones = zones or max(1, n // 20)
+        self.irrigate_below = irrigate_below
+        self.field_capacity = field_capacity
+        self.sensor_ids = np.array([f"{prefix}{i + 1:03d}" for i in range(n)], dtype=object)
+        # Zonas em blocos contíguos de sensores
+        self.zone_index = np.arange(n) * zones // n
+        self.zone_sizes = np.bincount(self.zone_index, minlength=zones)
+        self.zone_ids = np.array([f"Zona {z + 1}" for z in range(zones)], dtype=object)[self.zone_index]
+
+        # Perfil de cada sensor
+        self.temp_mean = rng.normal(25, 2.5, n)
+        self.temp_amplitude = rng.uniform(4, 8, n)
+        self.humidity_mean = rng.uniform(55, 75, n)
+        self.dry_rate = rng.uniform(0.03, 0.06, n)  # fração da água disponível perdida por hora a 25 °C
+        self.wilting_point = rng.uniform(10, 18, n)
+        self.ph_base = rng.normal(6.5, 0.3, n)
+        self.ph_drift = rng.normal(0, 0.02, n)  # unidades de pH por dia
+
+        # Estado
+        self.moisture = rng.uniform(30, 70, n)
+        self.ph = self.ph_base + rng.normal(0, 0.1, n)
+        self.clock: Optional[float] = None  # epoch (s) do último passo
+        self.irrigations = 0  # zonas irrigadas pelo simulador
+
+    def step(self, ts: Optional[float] = None) -> ReadingBatch:
+        """Avança o estado até `ts` (epoch em segundos) e gera uma leitura por sensor."""
+        ts = time.time() if ts is None else ts
+        hours = 0.0 if self.clock is None else max(ts - self.clock, 0) / 3600
+        self.clock = ts
+        rng, n = self.rng, self.size
+
+        local = datetime.fromtimestamp(ts)
+        hour = local.hour + local.minute / 60
+        # Curva diária com mínima às 3h e pico às 15h
+        diurnal = np.sin(2 * np.pi * (hour - 9) / 24)
+        temperature = self.temp_mean + self.temp_amplitude * diurnal + rng.normal(0, 0.4, n)
+        humidity = np.clip(self.humidity_mean - 2.0 * (temperature - self.temp_mean) + rng.normal(0, 1.5, n), 15, 100)
+
+        if hours:
+            heat = np.clip(1 + 0.04 * (temperature - 25), 0.2, None)
+            available = self.moisture - self.wilting_point
+            self.moisture = self.wilting_point + available * np.exp(-self.dry_rate * heat * hours)
+            self.ph += (self.ph_drift / 24 + 0.01 * (self.ph_base - self.ph)) * hours
+            self.ph += rng.normal(0, 0.01 * math.sqrt(hours), n)
+        self._irrigate()
+
+        soil_moisture = np.clip(self.moisture + rng.normal(0, 0.5, n), 0, 100)
+        ph_level = np.clip(self.ph + rng.normal(0, 0.02, n), 3.5, 9.5)
+        values = np.round(np.vstack((temperature, humidity, soil_moisture, ph_level)), 1)
+        return ReadingBatch(self.sensor_ids, np.full(n, int(ts * 1000), dtype=np.int64), values, self.zone_ids)
+
+    def _irrigate(self):
+        zone_moisture = np.bincount(self.zone_index, self.moisture) / np.maximum(self.zone_sizes, 1)
+        dry = np.flatnonzero(zone_moisture < self.irrigate_below)
+        if len(dry):
+            irrigated = np.isin(self.zone_index, dry)
+            self.moisture[irrigated] = self.field_capacity + self.rng.normal(0, 2, int(irrigated.sum()))
+            self.irrigations += len(dry)
+
+    def run(self, steps: int, step_seconds: float = 60, start: Optional[float] = None) -> Iterator[ReadingBatch]:
+        """`steps` passos de `step_seconds`; por padrão o último passo cai no instante atual."""
+        start = time.time() - (steps - 1) * step_seconds if start is None else start
+        for k in range(steps):
+            yield self.step(start + k * step_seconds)
+
+    def generate(self, steps: int, step_seconds: float = 60, start: Optional[float] = None) -> ReadingBatch:
+        """N sensores x T passos num único lote, ordenado por passo."""
+        return ReadingBatch.concat(list(self.run(steps, step_seconds, start)))
+
+    @staticmethod
+    def records(batch: ReadingBatch) -> List[dict]:
+        """Leituras no formato de `SensorData`."""
+        return [
+            {**record(sensor_id, ts_ms, values), "zone_id": zone_id}
+            for sensor_id, ts_ms, values, zone_id in zip(
+                batch.sensor_ids.tolist(), batch.timestamps.tolist(), batch.values.T.tolist(), batch.zone_ids.tolist()
+            )
+        ]
+
+
+# --- gerador de carga ---
+
+class Pacer:
+    """Libera envios na taxa alvo (leituras/s); sem taxa, não espera."""
+
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.scheduled = 0
+
+    async def wait(self, readings: int):
+        if not self.rate:
+            return
+        due = self.started + self.scheduled / self.rate
+        self.scheduled += readings
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def columnar_body(batch: ReadingBatch, lo: int, hi: int) -> bytes:
+    body = {"sensor_id": batch.sensor_ids[lo:hi].tolist()}
+    for i, name in enumerate(METRICS):
+        body[name] = batch.values[i, lo:hi]
+    body["timestamp"] = batch.timestamps[lo:hi] / 1000
+    body["zone_id"] = batch.zone_ids[lo:hi].tolist()
+    return orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ndjson_body(batch: ReadingBatch, lo: int, hi: int) -> bytes:
+    rows = FleetSimulator.records(batch.select(np.arange(lo, hi)))
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+async def load(args) -> dict:
+    simulator = FleetSimulator(args.sensors, args.zones, args.seed, prefix=args.prefix)
+    stream = args.mode == "stream"
+    encode = ndjson_body if stream else columnar_body
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.connections * 2)
+    pacer = Pacer(args.rate)
+    params = {"farm_id": args.farm_id}
+    stats = {"sent": 0, "rejected": 0, "errors": 0, "latencies": []}
+
+    async def produce():
+        for batch in simulator.run(args.steps, args.step_seconds):
+            for lo in range(0, len(batch), args.batch):
+                hi = min(lo + args.batch, len(batch))
+                await queue.put((hi - lo, encode(batch, lo, hi)))
+        for _ in range(args.connections):
+            await queue.put(None)
+
+    async def send_batches(client: httpx.AsyncClient):
+        while (item := await queue.get()) is not None:
+            size, body = item
+            await pacer.wait(size)
+            while True:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/sensors/data/batch", content=body, params=params,
+                                                 headers={"Content-Type": "application/json"})
+                except httpx.HTTPError:
+                    stats["errors"] += 1
+                    break
+                stats["latencies"].append(time.perf_counter() - started)
+                if response.status_code == 503:
+                    # Fila saturada: espera o Retry-After e reenvia o mesmo lote
+                    stats["rejected"] += 1
+                    await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+                    continue
+                if response.status_code == 200:
+                    stats["sent"] += size
+                else:
+                    stats["errors"] += 1
+                break
+
+    async def send_stream(client: httpx.AsyncClient):
+        async def lines():
+            while (item := await queue.get()) is not None:
+                size, body = item
+                await pacer.wait(size)
+                yield body
+
+        started = time.perf_counter()
+        summary = {}
+        try:
+            async with client.stream("POST", "/sensors/data/stream", content=lines(), params=params,
+                                     headers={"Content-Type": "application/x-ndjson"}) as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        summary = json.loads(line)
+                if response.status_code != 200:
+                    stats["errors"] += 1
+                    return
+        except httpx.HTTPError:
+            stats["errors"] += 1
+            return
+        stats["latencies"].append(time.perf_counter() - started)
+        stats["sent"] += summary.get("committed", 0)
+        stats["rejected"] += summary.get("rejected", 0)
+
+    send = send_stream if stream else send_batches
+    limits = httpx.Limits(max_connections=args.connections)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=None) as client:
+        await asyncio.gather(produce(), *(send(client) for _ in range(args.connections)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array(stats["latencies"]) * 1000
+    return {
+        "mode": args.mode,
+        "sensors": args.sensors,
+        "steps": args.steps,
+        "target_rate": args.rate,
+        "readings": stats["sent"],
+        "seconds": round(elapsed, 3),
+        "readings_per_second": round(stats["sent"] / elapsed, 1),
+        "rejected": stats["rejected"],
+        "errors": stats["errors"],
+        "simulated_irrigations": simulator.irrigations,
+        "request_ms": {
+            f"p{q}": round(float(np.percentile(latencies, q)), 2) for q in (50, 95, 99)
+        } if len(latencies) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera uma frota simulada e envia as leituras à API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--zones", type=int, help="padrão: um a cada 20 sensores")
+    parser.add_argument("--steps", type=int, default=10, help="leituras por sensor")
+    parser.add_argument("--step-seconds", type=float, default=60, help="intervalo simulado entre leituras")
+    parser.add_argument("--rate", type=float, help="leituras/s (padrão: o máximo que a API aceitar)")
+    parser.add_argument("--batch", type=int, default=5000, help="leituras por requisição ou bloco do stream")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--mode", choices=("batch", "stream"), default="batch")
+    parser.add_argument("--farm-id", default="default")
+    parser.add_argument("--prefix", default="SIM_")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    args = parser.parse_args()
+
+    result = asyncio.run(load(args))
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
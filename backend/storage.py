@@ -0,0 +1,285 @@
+"""Armazenamento em memória das séries temporais dos sensores.
+
+Cada sensor tem um buffer circular colunar: float32 para as medições e
+int64 para o timestamp (milissegundos desde a época). O armazenamento
+respeita uma janela de retenção e um orçamento total de bytes; quando o
+orçamento estoura, os sensores há mais tempo sem escrita são descartados.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+METRICS = ("temperature", "humidity", "soil_moisture", "ph_level")
+ROW_BYTES = 4 * len(METRICS) + 8
+
+# Sensores e zonas de outras fazendas usam a chave "fazenda/id"; a fazenda padrão fica sem prefixo
+DEFAULT_FARM = "default"
+FARM_SEPARATOR = "/"
+FARM_ID_MAX_LENGTH = 32
+LOCAL_ID_MAX_LENGTH = 64  # sensor_id e zone_id, em caracteres
+
+
+def scoped_key(farm_id: str, key: str) -> str:
+    return key if farm_id == DEFAULT_FARM else f"{farm_id}{FARM_SEPARATOR}{key}"
+
+
+def split_key(key: str) -> Tuple[str, str]:
+    """(farm_id, id sem prefixo) de uma chave com escopo."""
+    farm_id, separator, local = key.partition(FARM_SEPARATOR)
+    return (farm_id, local) if separator else (DEFAULT_FARM, key)
+
+
+def to_epoch_ms(ts: datetime) -> int:
+    return int(ts.timestamp() * 1000)
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(int(ms) / 1000)
+
+
+def to_local(ts: Optional[datetime]) -> Optional[datetime]:
+    """Converte datas com fuso para o horário local sem fuso, como as leituras armazenadas."""
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone().replace(tzinfo=None)
+
+
+def record(sensor_id: str, ts_ms: int, values) -> dict:
+    """Monta uma leitura no formato de `SensorData` a partir das colunas."""
+    row = {"sensor_id": sensor_id, "timestamp": from_epoch_ms(ts_ms)}
+    for name, value in zip(METRICS, values):
+        # float32 -> float com as casas decimais que os sensores enviam
+        row[name] = round(float(value), 4)
+    return row
+
+
+def group_indices(keys: np.ndarray):
+    """Itera (chave, índices) de um array, preservando a ordem dentro de cada grupo."""
+    if len(keys) == 1:
+        yield keys[0], np.zeros(1, dtype=np.intp)
+        return
+    unique, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+    for i, key in enumerate(unique):
+        yield key, order[bounds[i]:bounds[i + 1]]
+
+
+class ReadingBatch:
+    """Lote colunar de leituras, de um ou mais sensores.
+
+    `values` tem formato (len(METRICS), n) em float64; a conversão para
+    float32 acontece apenas ao gravar nos buffers. `zone_ids` é opcional
+    por leitura (None quando o sensor não informou a zona).
+    """
+
+    def __init__(self, sensor_ids: np.ndarray, timestamps: np.ndarray, values: np.ndarray,
+                 zone_ids: Optional[np.ndarray] = None):
+        self.sensor_ids = sensor_ids
+        self.timestamps = timestamps
+        self.values = values
+        self.zone_ids = zone_ids if zone_ids is not None else np.full(len(timestamps), None, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[METRICS.index(name)]
+
+    @classmethod
+    def from_readings(cls, readings: Iterable) -> "ReadingBatch":
+        readings = list(readings)
+        return cls(
+            np.array([r.sensor_id for r in readings], dtype=object),
+            np.array([to_epoch_ms(r.timestamp) for r in readings], dtype=np.int64),
+            np.array([[getattr(r, name) for r in readings] for name in METRICS],
+                     dtype=np.float64).reshape(len(METRICS), len(readings)),
+            np.array([getattr(r, "zone_id", None) for r in readings], dtype=object),
+        )
+
+    def select(self, idx: np.ndarray) -> "ReadingBatch":
+        return ReadingBatch(self.sensor_ids[idx], self.timestamps[idx], self.values[:, idx], self.zone_ids[idx])
+
+    def with_farm(self, farm_id: str) -> "ReadingBatch":
+        """Mesmo lote com sensor_id e zone_id no escopo da fazenda."""
+        if farm_id == DEFAULT_FARM:
+            return self
+        prefix = farm_id + FARM_SEPARATOR
+        return ReadingBatch(
+            np.array([prefix + s for s in self.sensor_ids.tolist()], dtype=object),
+            self.timestamps,
+            self.values,
+            np.array([prefix + z if z else None for z in self.zone_ids.tolist()], dtype=object),
+        )
+
+    @classmethod
+    def concat(cls, batches: List["ReadingBatch"]) -> "ReadingBatch":
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            np.concatenate([b.sensor_ids for b in batches]),
+            np.concatenate([b.timestamps for b in batches]),
+            np.concatenate([b.values for b in batches], axis=1),
+            np.concatenate([b.zone_ids for b in batches]),
+        )
+
+    def groups(self):
+        """Itera (sensor_id, índices) preservando a ordem de chegada por sensor."""
+        return group_indices(self.sensor_ids)
+
+
+class SensorRingBuffer:
+    """Buffer circular de capacidade fixa com as leituras de um sensor."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((len(METRICS), capacity), dtype=np.float32)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def extend(self, ts_ms: np.ndarray, values: np.ndarray):
+        """Acrescenta `n` leituras (`values` com formato (len(METRICS), n))."""
+        n = len(ts_ms)
+        if n == 0:
+            return
+        if n > self.capacity:
+            ts_ms = ts_ms[-self.capacity:]
+            values = values[:, -self.capacity:]
+            n = self.capacity
+        positions = (self.start + self.size + np.arange(n)) % self.capacity
+        self.timestamps[positions] = ts_ms
+        self.values[:, positions] = values
+        overflow = max(0, self.size + n - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.size = min(self.capacity, self.size + n)
+
+    def expire(self, cutoff_ms: int) -> int:
+        """Descarta do início do buffer as leituras anteriores a `cutoff_ms`."""
+        removed = 0
+        while self.size and self.timestamps[self.start] < cutoff_ms:
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+            removed += 1
+        return removed
+
+    def ordered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Retorna (timestamps, values) na ordem de chegada."""
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.timestamps[self.start:end], self.values[:, self.start:end]
+        wrap = end - self.capacity
+        return (
+            np.concatenate((self.timestamps[self.start:], self.timestamps[:wrap])),
+            np.concatenate((self.values[:, self.start:], self.values[:, :wrap]), axis=1),
+        )
+
+
+class SharedBudget:
+    """Orçamento de bytes comum a vários `SensorStore` (ex.: shards de fazendas).
+
+    Um armazenamento só descarta os próprios sensores quando o total passou
+    do limite e ele ocupa mais que a parte justa (limite / armazenamentos com
+    dados): uma fazenda grande não expulsa os sensores das pequenas.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stores: List["SensorStore"] = []
+
+    def must_evict(self, store: "SensorStore", extra: int) -> bool:
+        stores = list(self.stores)
+        if sum(s.nbytes for s in stores) + extra <= self.max_bytes:
+            return False
+        users = sum(1 for s in stores if s.nbytes) or 1
+        return store.nbytes + extra > self.max_bytes / users
+
+
+class SensorStore:
+    """Conjunto de buffers circulares indexados por `sensor_id`."""
+
+    def __init__(self, capacity_per_sensor: int = 4096, retention_seconds: float = 86400,
+                 max_bytes: int = 256 * 1024 * 1024, budget: Optional[SharedBudget] = None):
+        self.capacity_per_sensor = capacity_per_sensor
+        self.retention_ms = int(retention_seconds * 1000)
+        self.max_bytes = max_bytes
+        self.budget = budget
+        if budget is not None:
+            budget.stores.append(self)
+        self._buffers: "OrderedDict[str, SensorRingBuffer]" = OrderedDict()
+        self._rows = 0
+        self.evicted_sensors = 0
+        # Chamado com o sensor_id de cada sensor expulso, para descartar o que depende dele
+        self.on_evict: Optional[Callable[[str], None]] = None
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._buffers
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffers) * self.capacity_per_sensor * ROW_BYTES
+
+    def sensor_ids(self) -> List[str]:
+        return list(self._buffers)
+
+    def _cutoff_ms(self) -> int:
+        return to_epoch_ms(datetime.now()) - self.retention_ms
+
+    def _must_evict(self) -> bool:
+        extra = self.capacity_per_sensor * ROW_BYTES
+        if self.budget is not None:
+            return self.budget.must_evict(self, extra)
+        return self.nbytes + extra > self.max_bytes
+
+    def _buffer_for(self, sensor_id: str) -> SensorRingBuffer:
+        buffer = self._buffers.get(sensor_id)
+        if buffer is not None:
+            self._buffers.move_to_end(sensor_id)
+            return buffer
+        # Libera os sensores menos recentes até caber um novo buffer
+        while self._buffers and self._must_evict():
+            evicted_id, evicted = self._buffers.popitem(last=False)
+            self._rows -= len(evicted)
+            self.evicted_sensors += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_id)
+        buffer = SensorRingBuffer(self.capacity_per_sensor)
+        self._buffers[sensor_id] = buffer
+        return buffer
+
+    def _extend(self, sensor_id: str, ts_ms: np.ndarray, values: np.ndarray, cutoff_ms: int):
+        buffer = self._buffer_for(sensor_id)
+        before = len(buffer)
+        buffer.extend(ts_ms, values)
+        buffer.expire(cutoff_ms)
+        self._rows += len(buffer) - before
+
+    def append_batch(self, batch: ReadingBatch) -> None:
+        cutoff_ms = self._cutoff_ms()
+        for sensor_id, idx in batch.groups():
+            self._extend(sensor_id, batch.timestamps[idx], batch.values[:, idx], cutoff_ms)
+
+    def slice(self, sensor_id: str, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Retorna as colunas (timestamps, values) do sensor no intervalo dado."""
+        buffer = self._buffers.get(sensor_id)
+        if buffer is None:
+            return np.empty(0, dtype=np.int64), np.empty((len(METRICS), 0), dtype=np.float32)
+        ts_ms, values = buffer.ordered()
+        start_ms = max(self._cutoff_ms(), to_epoch_ms(start)) if start else self._cutoff_ms()
+        mask = ts_ms >= start_ms
+        if end is not None:
+            mask &= ts_ms <= to_epoch_ms(end)
+        return ts_ms[mask], values[:, mask]
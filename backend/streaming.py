@@ -0,0 +1,53 @@
+"""Ingestão de leituras em NDJSON sobre um único request HTTP."""
+from typing import AsyncIterator, Optional
+
+from starlette.responses import StreamingResponse
+
+
+class IngestStreamResponse(StreamingResponse):
+    """StreamingResponse que não disputa o canal `receive` com o corpo do request.
+
+    A implementação padrão escuta `http.disconnect` em paralelo à resposta,
+    o que consumiria mensagens do corpo que o gerador ainda está lendo.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Optional[bytes]]:
+    """Divide o corpo em linhas guardando no máximo `max_line_bytes` em memória.
+
+    Linhas maiores que o limite são descartadas e sinalizadas com None.
+    """
+    buffer = bytearray()
+    overflow = False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline < 0:
+                break
+            piece = chunk[start:newline]
+            if overflow or len(buffer) + len(piece) > max_line_bytes:
+                yield None
+            else:
+                buffer += piece
+                yield bytes(buffer)
+            buffer.clear()
+            overflow = False
+            start = newline + 1
+        rest = chunk[start:]
+        if overflow:
+            continue
+        if len(buffer) + len(rest) > max_line_bytes:
+            overflow = True
+            buffer.clear()
+        else:
+            buffer += rest
+    if overflow:
+        yield None
+    elif buffer.strip():
+        yield bytes(buffer)
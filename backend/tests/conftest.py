@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+# Configuração lida na importação de `main`: só memória, processo único e sem o
+# controle automático disparando irrigações no meio dos testes
+os.environ["IRRIGATION_CONTROLLER_INTERVAL"] = "3600"
+for name in ("AGROSMART_DB_PATH", "SHARED_STATE_DIR", "OPENWEATHER_API_KEY", "ALERT_RULES_PATH"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def client():
+    """API em processo, com as tarefas de fundo rodando durante toda a sessão.
+
+    O estado é compartilhado entre os testes: cada teste usa o próprio farm_id.
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
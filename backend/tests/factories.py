@@ -0,0 +1,28 @@
+"""Construção de lotes de leituras para os testes."""
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from storage import METRICS, ReadingBatch
+
+
+def make_batch(sensor_ids: Sequence[str], values: Optional[Sequence[Sequence[float]]] = None,
+               ts_ms: Optional[Sequence[int]] = None, zones: Optional[Sequence[Optional[str]]] = None,
+               temperature: float = 25.0, humidity: float = 60.0, soil_moisture: float = 50.0,
+               ph_level: float = 6.5) -> ReadingBatch:
+    """Lote com uma leitura por `sensor_id`; sem `values`, todas com as mesmas medições.
+
+    `values` vem por leitura: [(temperature, humidity, soil_moisture, ph_level), ...].
+    """
+    n = len(sensor_ids)
+    if values is None:
+        values = [(temperature, humidity, soil_moisture, ph_level)] * n
+    if ts_ms is None:
+        ts_ms = [int(time.time() * 1000)] * n
+    return ReadingBatch(
+        np.array(list(sensor_ids), dtype=object),
+        np.array(ts_ms, dtype=np.int64),
+        np.array(values, dtype=np.float64).reshape(n, len(METRICS)).T.copy(),
+        np.array(list(zones), dtype=object) if zones is not None else None,
+    )
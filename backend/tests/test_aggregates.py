@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from aggregates import SoilAggregates
+from alerts import RuleEngine
+from shards import FarmShard
+from storage import ROW_BYTES, SensorStore
+from tests.factories import make_batch
+
+
+def batch(sensor_ids, zones, ph=6.0, moisture=40.0, ts_ms=None):
+    return make_batch(sensor_ids, zones=zones, ph_level=ph, soil_moisture=moisture, ts_ms=ts_ms)
+
+
+def test_latest_reading_replaces_the_previous_one_in_the_sums():
+    aggregates = SoilAggregates()
+    aggregates.add_batch(batch(["S1", "S2"], ["Z1", "Z1"], moisture=40.0, ts_ms=[1000, 1000]))
+    aggregates.add_batch(batch(["S1"], ["Z1"], moisture=60.0, ts_ms=[2000]))
+    zone = aggregates.zone("Z1")
+    assert zone["sensors"] == 2
+    assert zone["readings"] == 3
+    assert zone["average_moisture"] == pytest.approx(50.0)
+    # Leitura atrasada não substitui a mais recente
+    aggregates.add_batch(batch(["S1"], ["Z1"], moisture=0.0, ts_ms=[1500]))
+    assert aggregates.zone("Z1")["average_moisture"] == pytest.approx(50.0)
+
+
+def test_sensor_moving_between_zones():
+    aggregates = SoilAggregates()
+    aggregates.add_batch(batch(["S1"], ["Z1"], ts_ms=[1000]))
+    aggregates.add_batch(batch(["S1"], ["Z2"], ts_ms=[2000]))
+    assert aggregates.zone("Z1") is None
+    assert aggregates.zone("Z2")["sensors"] == 1
+    assert aggregates.totals()["sensors"] == 1
+
+
+def test_farm_totals_match_the_fleet_and_skip_the_default_zone():
+    aggregates = SoilAggregates()
+    aggregates.add_batch(batch(["norte/S1", "norte/S2", "sul/S1"], ["norte/Z1", None, "sul/Z1"], ph=6.0))
+    aggregates.add_batch(batch(["norte/S3"], ["norte/Z2"], ph=7.0))
+    norte = aggregates.totals("norte")
+    assert norte["sensors"] == 3
+    assert norte["zones"] == 2  # Z1 e Z2; "sem_zona" não conta
+    assert norte["ph_sum"] == pytest.approx(19.0)
+    assert aggregates.totals("sul")["sensors"] == 1
+    fleet = aggregates.totals()
+    assert fleet["sensors"] == 4 and fleet["zones"] == 3
+    assert aggregates.totals("oeste") == {"sensors": 0, "zones": 0, "ph_sum": 0.0, "moisture_sum": 0.0}
+
+
+def test_forget_removes_the_sensor_from_sums_and_indexes():
+    aggregates = SoilAggregates()
+    aggregates.add_batch(batch(["S1", "S2"], ["Z1", "Z1"], moisture=40.0))
+    aggregates.forget("S1")
+    assert "S1" not in aggregates.latest and "S1" not in aggregates.sensor_zone
+    assert aggregates.zone("Z1")["sensors"] == 1
+    assert aggregates.totals()["sensors"] == 1
+    aggregates.forget("S9")  # desconhecido: nada a fazer
+
+
+def test_evicted_sensor_is_pruned_but_keeps_its_registered_zone():
+    store = SensorStore(capacity_per_sensor=4, max_bytes=4 * ROW_BYTES)
+    shard = FarmShard(0, store, RuleEngine())
+    shard.register({"farm_id": "norte", "sensor_id": "S1", "zone_id": "Z1"})
+    shard.process(make_batch(["norte/S1"], soil_moisture=10.0))
+    assert "norte/S1" in shard.rule_engine.active["low_soil_moisture"]
+    shard.process(make_batch(["norte/S2"]))
+    assert "norte/S1" not in shard.aggregates.latest
+    assert "norte/S1" not in shard.anomaly_detector.slots
+    assert "norte/S1" not in shard.rule_engine.active["low_soil_moisture"]
+    assert shard.aggregates.sensor_zone["norte/S1"] == "norte/Z1"
+    assert "norte/S2" in shard.aggregates.latest
+    assert shard.aggregates.totals("norte")["sensors"] == 1
+
+
+def test_non_finite_readings_are_rejected_on_every_ingest_route(client):
+    reading = {"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 40, "ph_level": 6.5,
+               "timestamp": "2026-01-01T10:00:00", "zone_id": "Z1"}
+    params = {"farm_id": "t-finite"}
+    assert client.post("/sensors/data", params=params, json=reading).status_code == 200
+    for value in ("nan", "inf", "-Infinity"):
+        bad = {**reading, "soil_moisture": value}
+        assert client.post("/sensors/data", params=params, json=bad).status_code == 422
+        assert client.post("/sensors/data/batch", params=params, json=[bad]).status_code == 422
+        response = client.post("/sensors/data/stream", params=params, content=json.dumps(bad) + "\n",
+                               headers={"Content-Type": "application/x-ndjson"})
+        summary = json.loads(response.text.splitlines()[-1])
+        assert (summary["committed"], summary["rejected"]) == (0, 1)
+    columns = {"sensor_id": ["S1"], "temperature": [25.0], "humidity": [60.0], "soil_moisture": ["nan"],
+               "ph_level": [6.5]}
+    assert client.post("/sensors/data/batch", params=params, json=columns).status_code == 422
+
+    # As somas por zona continuam finitas
+    assert client.post("/sensors/data", params=params, json=reading).status_code == 200
+    zone = client.get("/analysis/soil-health/Z1", params=params)
+    assert zone.status_code == 200
+    assert client.get("/analysis/soil-health", params=params).json()["sensors"] == 1
+    assert client.get("/analysis/soil-health").status_code == 200
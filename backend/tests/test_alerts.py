@@ -0,0 +1,143 @@
+import json
+
+import numpy as np
+import pytest
+
+from alerts import RuleEngine
+from tests.factories import make_batch
+
+CONFIG = {
+    "rules": [
+        {"id": "dry", "metric": "soil_moisture", "below": 30, "hysteresis": 2, "message": "Solo seco"},
+        {"id": "ph", "metric": "ph_level", "below": 6.0, "above": 7.0, "message": "pH fora da faixa"},
+    ],
+}
+
+
+def moisture_batch(sensor_ids, moisture):
+    return make_batch(sensor_ids, values=[(25, 60, m, 6.5) for m in moisture])
+
+
+def evaluate(engine, batch):
+    # Na API as zonas chegam resolvidas (sensor sem zona -> "sem_zona")
+    zones = np.array([zone or "sem_zona" for zone in batch.zone_ids.tolist()], dtype=object)
+    return engine.evaluate(batch, zones)
+
+
+def test_alert_raised_once_and_cleared_after_hysteresis():
+    engine = RuleEngine(CONFIG)
+    result = evaluate(engine, moisture_batch(["S1"] * 5, [35, 25, 20, 31, 33]))
+    assert result["raised"]["dry"].tolist() == [False, True, False, False, False]
+    # 31 fica dentro da histerese (30 + 2): o alerta só normaliza em 33
+    assert result["firing"]["dry"].tolist() == [False, True, True, True, False]
+    assert result["cleared"]["dry"].tolist() == [False, False, False, False, True]
+    assert engine.active["dry"] == set()
+
+
+def test_state_is_tracked_per_sensor_across_batches():
+    engine = RuleEngine(CONFIG)
+    evaluate(engine, moisture_batch(["S1", "S2"], [20, 40]))
+    assert engine.active["dry"] == {"S1"}
+    # Dentro da histerese: S1 continua disparado, sem nova transição
+    result = evaluate(engine, moisture_batch(["S2", "S1"], [25, 31]))
+    assert result["raised"]["dry"].tolist() == [True, False]
+    assert result["firing"]["dry"].tolist() == [True, True]
+    assert engine.active["dry"] == {"S1", "S2"}
+
+
+def test_interleaved_sensors_in_one_batch():
+    engine = RuleEngine(CONFIG)
+    result = evaluate(engine, moisture_batch(["A", "B", "A", "B"], [20, 50, 40, 10]))
+    assert result["raised"]["dry"].tolist() == [True, False, False, True]
+    assert result["cleared"]["dry"].tolist() == [False, False, True, False]
+    assert engine.active["dry"] == {"B"}
+
+
+def test_range_rule_fires_on_both_sides():
+    engine = RuleEngine(CONFIG)
+    batch = make_batch(["S1", "S2", "S3"], values=[(25, 60, 50, 5.5), (25, 60, 50, 6.5), (25, 60, 50, 7.5)])
+    assert evaluate(engine, batch)["raised"]["ph"].tolist() == [True, False, True]
+
+
+def test_summarize_lists_only_changed_readings():
+    engine = RuleEngine(CONFIG)
+    batch = moisture_batch(["S1", "S2", "S3"], [20, 50, 25])
+    summary = engine.summarize(batch, evaluate(engine, batch))
+    assert summary["received"] == 3
+    assert summary["alert_counts"] == {"dry": 2, "ph": 0}
+    assert [a["sensor_id"] for a in summary["alerts"]] == ["S1", "S3"]
+
+
+def test_empty_batch():
+    engine = RuleEngine(CONFIG)
+    result = evaluate(engine, moisture_batch([], []))
+    assert result["raised"]["dry"].dtype == np.bool_ and len(result["raised"]["dry"]) == 0
+
+
+def test_crop_and_zone_overrides():
+    config = {
+        **CONFIG,
+        "overrides": {"crops": {"arroz": {"dry": {"below": 60}}}, "zones": {"Z2": {"dry": {"below": 10}}}},
+        "zone_crops": {"Z1": "arroz", "Z2": "arroz"},
+    }
+    engine = RuleEngine(config)
+    batch = make_batch(["S1", "S2", "S3"], values=[(25, 60, 50, 6.5)] * 3, zones=["Z1", "Z2", None])
+    # Zona > cultura > padrão
+    assert evaluate(engine, batch)["raised"]["dry"].tolist() == [True, False, False]
+
+
+def test_set_zone_crop_invalidates_cached_limits():
+    engine = RuleEngine({**CONFIG, "overrides": {"crops": {"arroz": {"dry": {"below": 60}}}}})
+    batch = make_batch(["S1"], values=[(25, 60, 50, 6.5)], zones=["Z1"])
+    assert not evaluate(engine, batch)["raised"]["dry"][0]
+    engine.set_zone_crop("Z1", "arroz")
+    assert evaluate(engine, make_batch(["S2"], values=[(25, 60, 50, 6.5)], zones=["Z1"]))["raised"]["dry"][0]
+
+
+
+
+def test_rules_from_file(tmp_path):
+    path = tmp_path / "regras.json"
+    path.write_text(json.dumps(CONFIG), encoding="utf-8")
+    assert RuleEngine.from_file(str(path)).rule_ids == ["dry", "ph"]
+    assert "low_soil_moisture" in RuleEngine.from_file(None).rule_ids
+
+
+def test_unknown_metric_is_rejected():
+    with pytest.raises(ValueError):
+        RuleEngine({"rules": [{"id": "x", "metric": "vento", "above": 1, "message": "?"}]})
+
+
+def test_batch_route_accepts_objects_and_columns(client):
+    rows = [
+        {"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 20, "ph_level": 6.5,
+         "timestamp": "2026-01-01T10:00:00"},
+        {"sensor_id": "S2", "temperature": 25, "humidity": 60, "soil_moisture": 50, "ph_level": 6.5,
+         "timestamp": "2026-01-01T10:00:00"},
+    ]
+    response = client.post("/sensors/data/batch", params={"farm_id": "t-batch"}, json=rows)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["received"] == 2
+    assert body["alert_counts"]["low_soil_moisture"] == 1
+
+    columns = {"sensor_id": ["S3"], "temperature": [25.0], "humidity": [60.0], "soil_moisture": [20.0],
+               "ph_level": [6.5]}
+    response = client.post("/sensors/data/batch", params={"farm_id": "t-batch"}, json=columns)
+    assert response.json()["alerts"][0]["sensor_id"] == "S3"
+
+
+def test_batch_route_rejects_mismatched_columns(client):
+    columns = {"sensor_id": ["S1", "S2"], "temperature": [25.0], "humidity": [60.0], "soil_moisture": [20.0],
+               "ph_level": [6.5]}
+    response = client.post("/sensors/data/batch", params={"farm_id": "t-batch"}, json=columns)
+    assert response.status_code == 422
+
+
+def test_batch_route_rejects_ids_over_the_ring_limit(client):
+    row = {"sensor_id": "S" * 65, "temperature": 25, "humidity": 60, "soil_moisture": 20, "ph_level": 6.5,
+           "timestamp": "2026-01-01T10:00:00"}
+    assert client.post("/sensors/data/batch", params={"farm_id": "t-batch"}, json=[row]).status_code == 422
+    row["sensor_id"] = "S" * 64
+    assert client.post("/sensors/data/batch", params={"farm_id": "t-batch"}, json=[row]).status_code == 200
+    assert client.post("/sensors/data/batch", params={"farm_id": "f" * 33}, json=[row]).status_code == 422
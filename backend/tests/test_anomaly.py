@@ -0,0 +1,74 @@
+import numpy as np
+
+from anomaly import AnomalyDetector, describe_flags
+from tests.factories import make_batch
+
+MINUTE = 60_000
+
+
+def steady(sensor_id: str, n: int, start_ms: int = 0, moisture: float = 50.0):
+    return make_batch([sensor_id] * n, ts_ms=[start_ms + i * MINUTE for i in range(n)], soil_moisture=moisture)
+
+
+def test_no_flags_during_warmup_or_steady_readings():
+    detector = AnomalyDetector(warmup=5)
+    result = detector.observe(steady("S1", 20))
+    assert not result["flags"].any()
+    assert detector.flagged == {}
+
+
+def test_spike_is_flagged_and_described():
+    detector = AnomalyDetector(warmup=5)
+    detector.observe(steady("S1", 20))
+    result = detector.observe(make_batch(["S1"], ts_ms=[20 * MINUTE], soil_moisture=90.0))
+    flags = int(result["flags"][0])
+    assert flags and result["score"][0] > detector.z_threshold
+    reasons = describe_flags(flags)
+    assert "soil_moisture: desvio da média móvel" in reasons
+    assert "soil_moisture: variação rápida" in reasons
+    assert detector.flagged["S1"]["reasons"] == reasons
+    # Volta ao normal: deixa de estar sinalizado
+    detector.observe(make_batch(["S1"], ts_ms=[60 * MINUTE], soil_moisture=50.0))
+    assert "S1" not in detector.flagged
+
+
+def test_batch_matches_sequential_observation():
+    rng = np.random.default_rng(1)
+    ids = rng.choice(["A", "B", "C"], 60).tolist()
+    values = [(25, 60, m, 6.5) for m in rng.normal(50, 3, 60)]
+    batch = make_batch(ids, values=values, ts_ms=[i * MINUTE for i in range(60)])
+    whole = AnomalyDetector(warmup=3).observe(batch)
+    one_by_one = AnomalyDetector(warmup=3)
+    scores = [one_by_one.observe(batch.select(np.array([i])))["score"][0] for i in range(60)]
+    assert np.allclose(whole["score"], scores)
+
+
+def test_slots_grow_past_initial_capacity():
+    detector = AnomalyDetector(initial_sensors=2)
+    detector.observe(make_batch([f"S{i}" for i in range(5)]))
+    assert detector.capacity >= 5 and len(detector.slots) == 5
+
+
+def test_forgotten_sensor_frees_its_slot_for_the_next_one():
+    detector = AnomalyDetector(warmup=5, initial_sensors=2)
+    detector.observe(steady("S1", 20))
+    detector.observe(make_batch(["S1"], ts_ms=[20 * MINUTE], soil_moisture=90.0))
+    slot = detector.slots["S1"]
+    detector.forget("S1")
+    assert "S1" not in detector.slots and "S1" not in detector.flagged
+    # S2 reaproveita o slot com o estado zerado: sem histórico, não há anomalia
+    result = detector.observe(make_batch(["S2"], ts_ms=[30 * MINUTE], soil_moisture=10.0))
+    assert detector.slots["S2"] == slot and not result["flags"].any()
+    detector.observe(make_batch(["S3", "S4"]))
+    assert sorted(detector.slots.values()) == [0, 1, 2] and detector.capacity == 4
+    detector.forget("S9")  # desconhecido: nada a fazer
+
+
+def test_anomalies_route_lists_flagged_sensors(client):
+    rows = [{"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 50, "ph_level": 6.5,
+             "timestamp": 1_700_000_000 + i * 60} for i in range(20)]
+    rows.append({**rows[-1], "soil_moisture": 95, "timestamp": 1_700_000_000 + 20 * 60})
+    assert client.post("/sensors/data/batch", params={"farm_id": "t-anomaly"}, json=rows).status_code == 200
+    body = client.get("/analysis/anomalies", params={"farm_id": "t-anomaly"}).json()
+    assert body["sensors_tracked"] == 1
+    assert [a["sensor_id"] for a in body["anomalies"]] == ["S1"]
@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+
+from benchmarks.routes import BACKEND_DIR, build_routes, compare
+from simulator import FleetSimulator
+
+
+def run_routes(*args: str) -> subprocess.CompletedProcess:
+    # Processo próprio: a suíte importa `main` com o ambiente do benchmark
+    return subprocess.run(
+        [sys.executable, "-m", "benchmarks.routes", "--transport", "asgi", "--sensors", "20", "--steps", "2",
+         "--concurrency", "2", "--requests", "4", "--warmup", "1", *args],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_routes_suite_records_every_route_without_errors(tmp_path):
+    path = tmp_path / "atual.json"
+    result = run_routes("--json", str(path))
+    assert result.returncode == 0, result.stderr
+    saved = json.loads(path.read_text())
+    routes = set(build_routes(FleetSimulator(1)))
+    assert {r["route"] for r in saved["results"]} == routes
+    assert all(r["errors"] == 0 and r["p50_ms"] <= r["p99_ms"] for r in saved["results"])
+
+    result = run_routes("--routes", "/dashboard/summary", "--baseline", str(path))
+    assert result.returncode == 0, result.stderr
+    assert "comparado com" in result.stdout
+
+
+def test_unknown_route_is_rejected():
+    result = run_routes("--routes", "/nao-existe")
+    assert result.returncode == 2
+    assert "rotas desconhecidas" in result.stderr
+
+
+def test_compare_reports_relative_change(tmp_path, capsys):
+    row = {"transport": "asgi", "route": "/x", "concurrency": 1}
+    path = tmp_path / "base.json"
+    path.write_text(json.dumps({"commit": "abc", "results": [{**row, "p95_ms": 10.0, "rps": 100.0}]}))
+    compare([{**row, "p95_ms": 5.0, "rps": 150.0}], str(path))
+    assert "-50.0%" in capsys.readouterr().out
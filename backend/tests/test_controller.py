@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from alerts import RuleEngine
+from controller import IrrigationController
+from irrigation import IrrigationScheduler
+from shards import FarmShard, ShardedStore
+from storage import SensorStore
+from tests.factories import make_batch
+
+pytestmark = pytest.mark.anyio
+
+
+def setup(rain=None, **options):
+    shard = FarmShard(0, SensorStore(), RuleEngine())
+    scheduler = IrrigationScheduler()
+    controller = IrrigationController(ShardedStore(1, lambda i: shard), scheduler, precipitation=lambda: rain,
+                                      manage_all=True, **options)
+    return shard, scheduler, controller
+
+
+def moisture(shard, values):
+    zones = [zone for zone, _ in values]
+    shard.process(make_batch([f"S-{zone}" for zone in zones], zones=zones,
+                             values=[(25, 60, m, 6.5) for _, m in values]))
+
+
+async def test_starts_dry_zones_and_stops_wet_auto_runs():
+    shard, scheduler, controller = setup()
+    moisture(shard, [("Z1", 20), ("Z2", 40)])
+    tick = await controller.tick()
+    assert tick["start"] == ["Z1"] and tick["zones"] == 2
+    assert scheduler.active["Z1"]["auto_mode"]
+    moisture(shard, [("Z1", 50)])
+    assert (await controller.tick())["stop"] == ["Z1"]
+    assert scheduler.active == {}
+
+
+async def test_forecast_rain_credit_and_manual_runs():
+    shard, scheduler, controller = setup(rain=15.0)
+    moisture(shard, [("Z1", 20), ("Z2", 50)])
+    assert (await controller.tick())["start"] == []
+    scheduler.start_run("Z2", 10)  # manual: nunca é interrompida
+    assert (await controller.tick())["stop"] == []
+
+
+async def test_dry_run_only_for_one_tick():
+    shard, scheduler, controller = setup()
+    moisture(shard, [("Z1", 20)])
+    tick = await controller.tick(dry_run=True)
+    assert tick["dry_run"] and tick["start"] == ["Z1"]
+    assert scheduler.active == {} and not controller.dry_run
+
+
+async def test_stale_readings_are_ignored():
+    shard, scheduler, controller = setup(max_reading_age=60)
+    moisture(shard, [("Z1", 20)])
+    assert (await controller.tick(now=time.time() + 120))["start"] == []
+
+
+async def test_tick_waits_for_a_busy_shard_without_blocking_the_loop():
+    shard, scheduler, controller = setup()
+    moisture(shard, [("Z1", 20)])
+    shard.lock.acquire()
+    tick = asyncio.create_task(controller.tick())
+    await asyncio.sleep(0.05)
+    assert not tick.done()  # o loop segue rodando enquanto o shard está ocupado
+    shard.lock.release()
+    assert (await tick)["start"] == ["Z1"]
+
+
+async def test_failing_tick_is_logged_and_the_loop_continues(caplog):
+    calls = []
+
+    def precipitation():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("previsão indisponível")
+        return 0.0
+
+    shard = FarmShard(0, SensorStore(), RuleEngine())
+    controller = IrrigationController(ShardedStore(1, lambda i: shard), IrrigationScheduler(),
+                                      precipitation=precipitation, interval=0.01)
+    controller.start()
+    await asyncio.sleep(0.1)
+    await controller.stop()
+    assert controller.errors == 1
+    assert controller.ticks >= 1
+    assert "Falha no ciclo" in caplog.text
+
+
+def test_controller_tick_route(client):
+    response = client.post("/irrigation/controller/tick", params={"dry_run": True})
+    assert response.status_code == 200
+    assert response.json()["dry_run"] is True
+    assert client.get("/irrigation/controller").json()["dry_run"] is False
@@ -0,0 +1,35 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_snapshot_has_every_section(client):
+    response = client.get("/dashboard/snapshot", params={"city": "Campinas", "farm_id": "t-dash"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["errors"] == {}
+    for section in ("sensors", "weather", "forecast", "irrigation", "summary", "soil_health"):
+        assert body[section] is not None, section
+    # As leituras simuladas da primeira etapa já entram nas seções agregadas
+    assert body["summary"]["active_sensors"] == len(body["sensors"])
+    assert body["soil_health"]["sensors"] == len(body["sensors"])
+
+
+def test_snapshot_is_cached_within_the_ttl(client):
+    params = {"city": "Santos", "farm_id": "t-dash-cache"}
+    first = client.get("/dashboard/snapshot", params=params).content
+    assert client.get("/dashboard/snapshot", params=params).content == first
+    # Cidade com outra grafia cai na mesma entrada
+    assert client.get("/dashboard/snapshot", params={**params, "city": " santos"}).content == first
+
+
+def test_concurrent_requests_share_one_build(client):
+    params = {"city": "Sorocaba", "farm_id": "t-dash-flight"}
+    with ThreadPoolExecutor(4) as pool:
+        bodies = list(pool.map(lambda _: client.get("/dashboard/snapshot", params=params).content, range(4)))
+    assert len({json.loads(body)["generated_at"] for body in bodies}) == 1
+
+
+def test_summary_for_a_farm(client):
+    body = client.get("/dashboard/summary", params={"farm_id": "t-dash-empty"}).json()
+    assert body["total_sensors"] == 0
+    assert body["alerts"][0]["type"] == "info"
@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+
+from downsampling import lttb
+
+
+def test_short_series_is_returned_whole():
+    x = np.arange(5)
+    assert lttb(x, x * 2.0, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x * 2.0, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_keeps_endpoints_and_returns_sorted_indices():
+    x = np.arange(1000)
+    y = np.sin(x / 20.0)
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+
+
+def test_preserves_a_spike():
+    x = np.arange(200)
+    y = np.zeros(200)
+    y[137] = 10.0
+    assert 137 in lttb(x, y, 10).tolist()
+
+
+def test_history_flags_downsampling_only_when_lttb_ran(client):
+    now_ms = int(time.time() * 1000)
+    rows = [{"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 40 + i % 7, "ph_level": 6.5,
+             "timestamp": (now_ms - (10 - i) * 1000) / 1000}
+            for i in range(10)]
+    assert client.post("/sensors/data/batch", params={"farm_id": "t-lttb"}, json=rows).status_code == 200
+    params = {"farm_id": "t-lttb", "resolution": "raw"}
+
+    body = client.get("/sensors/S1/history", params={**params, "max_points": 10}).json()
+    assert len(body["timestamps"]) == 10
+    assert body["downsampled"] is False
+
+    body = client.get("/sensors/S1/history", params={**params, "max_points": 4}).json()
+    assert len(body["timestamps"]) == 4
+    assert body["downsampled"] is True
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+from events import EventBroker
+from tests.factories import make_batch
+
+pytestmark = pytest.mark.anyio
+
+
+def parse(message: str):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines() if not line.startswith(":"))
+    return fields.get("id"), fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+async def take(stream, n):
+    return [await stream.__anext__() for _ in range(n)]
+
+
+async def test_subscriber_receives_published_events():
+    broker = EventBroker()
+    stream = broker.stream()
+    assert await stream.__anext__() == "retry: 3000\n\n"
+    broker.publish("irrigation", {"zone_id": "Z1", "status": "active"})
+    assert parse(await stream.__anext__()) == ("1", "irrigation", {"zone_id": "Z1", "status": "active"})
+    await stream.aclose()
+    assert broker.subscribers == 0
+
+
+async def test_replay_from_last_event_id_has_no_duplicates():
+    broker = EventBroker()
+    for i in range(3):
+        broker.publish("irrigation", {"n": i})
+    stream = broker.stream(last_event_id=1)
+    await stream.__anext__()  # retry; a fila já está registrada
+    broker.publish("irrigation", {"n": 3})  # vai para a fila e para o histórico
+    messages = await take(stream, 3)
+    assert [parse(m)[0] for m in messages] == ["2", "3", "4"]
+    broker.publish("irrigation", {"n": 4})
+    assert parse(await stream.__anext__())[0] == "5"
+    await stream.aclose()
+
+
+async def test_resync_when_history_no_longer_covers_the_gap():
+    broker = EventBroker(history=2)
+    for i in range(5):
+        broker.publish("irrigation", {"n": i})
+    stream = broker.stream(last_event_id=1)
+    await stream.__anext__()
+    assert parse(await stream.__anext__())[1] == "resync"
+    assert [parse(m)[0] for m in await take(stream, 2)] == ["4", "5"]
+    await stream.aclose()
+
+
+async def test_id_from_before_a_restart_asks_for_resync_and_keeps_streaming():
+    broker = EventBroker()
+    stream = broker.stream(last_event_id=500)
+    await stream.__anext__()
+    assert parse(await stream.__anext__())[1] == "resync"
+    broker.publish("irrigation", {"n": 0})
+    assert parse(await stream.__anext__())[0] == "1"
+    await stream.aclose()
+
+
+async def test_slow_subscriber_gets_resync_after_overflow():
+    broker = EventBroker(queue_size=2)
+    stream = broker.stream()
+    await stream.__anext__()
+    for i in range(5):
+        broker.publish("irrigation", {"n": i})
+    assert broker.dropped == 3
+    assert parse(await stream.__anext__())[1] == "resync"
+    broker.publish("irrigation", {"n": 5})
+    assert parse(await stream.__anext__())[0] == "6"
+    await stream.aclose()
+
+
+async def test_readings_are_coalesced_per_sensor_until_flush():
+    broker = EventBroker()
+    stream = broker.stream()
+    await stream.__anext__()
+    broker.stage_readings(make_batch(["S1", "S2", "S1"], ts_ms=[1000, 1000, 2000], soil_moisture=40))
+    broker.flush()
+    _, event, data = parse(await stream.__anext__())
+    assert event == "sensors"
+    assert sorted(r["sensor_id"] for r in data) == ["S1", "S2"]
+    assert next(r for r in data if r["sensor_id"] == "S1")["timestamp"].endswith(":02")
+    await stream.aclose()
+
+
+async def test_heartbeat_when_idle():
+    broker = EventBroker(heartbeat=0.01)
+    stream = broker.stream()
+    await stream.__anext__()
+    assert await asyncio.wait_for(stream.__anext__(), 1) == ": ping\n\n"
+    await stream.aclose()
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from forecast import ForecastService, SimulatedForecastProvider, build_snapshot, etag_matches
+
+
+def test_snapshot_body_and_etag_are_stable():
+    forecast = [{"date": "2026-01-01", "precipitation": 1.5}]
+    first, second = build_snapshot("Campinas", forecast), build_snapshot("Campinas", forecast)
+    assert first.etag == second.etag and first.etag.startswith('"')
+    assert json.loads(first.body) == {"city": "Campinas", "forecast": forecast}
+
+
+def test_etag_matching():
+    etag = '"abc"'
+    assert etag_matches(etag, '"abc"')
+    assert etag_matches(etag, '"x", "abc"')
+    assert etag_matches(etag, 'W/"abc"')
+    assert etag_matches(etag, "*")
+    assert not etag_matches(etag, '"ab"')
+    assert not etag_matches(etag, '"xabcx"')
+    assert not etag_matches(etag, None)
+
+
+@pytest.mark.anyio
+async def test_service_caches_and_evicts_cities():
+    service = ForecastService(SimulatedForecastProvider(), max_cities=1)
+    first = await service.get("Campinas")
+    assert await service.get(" campinas") is first
+    assert service.precipitation("Campinas", days=5) == pytest.approx(sum(d["precipitation"] for d in first.forecast))
+    await service.get("Santos")
+    assert service.precipitation("Campinas") is None
+    assert list(service.names) == ["santos"]
+
+
+def test_forecast_route_honours_if_none_match(client):
+    response = client.get("/weather/forecast/Campinas")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get("/weather/forecast/Campinas", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/weather/forecast/Campinas", headers={"If-None-Match": f'"x", {etag}'}).status_code == 304
+    assert client.get("/weather/forecast/Campinas", headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get("/weather/forecast/Campinas", headers={"If-None-Match": etag[1:5]}).status_code == 200
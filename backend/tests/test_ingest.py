@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from ingest import IngestQueue, QueueFullError
+from tests.factories import make_batch
+
+pytestmark = pytest.mark.anyio
+
+
+class Recorder:
+    """Commit que registra o tamanho de cada gravação e devolve um resultado por leitura."""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sizes = []
+
+    async def __call__(self, batch):
+        self.sizes.append(len(batch))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {"sensor_ids": batch.sensor_ids.tolist(), "alerts": {"dry": [sid.endswith("!") for sid in batch.sensor_ids]}}
+
+
+async def test_commits_directly_when_not_running():
+    commit = Recorder()
+    queue = IngestQueue(commit)
+    result = await queue.submit(make_batch(["S1", "S2"]))
+    assert result["sensor_ids"] == ["S1", "S2"]
+    assert commit.sizes == [2]
+
+
+async def test_sync_commit_is_accepted():
+    queue = IngestQueue(lambda batch: {"n": [len(batch)] * len(batch)})
+    assert await queue.submit(make_batch(["S1"])) == {"n": [1]}
+
+
+async def test_concurrent_batches_are_coalesced_and_results_split():
+    commit = Recorder()
+    queue = IngestQueue(commit)
+    queue.start()
+    results = await asyncio.gather(
+        queue.submit(make_batch(["A1", "A2!"])),
+        queue.submit(make_batch(["B1!"])),
+        queue.submit(make_batch(["C1", "C2", "C3"])),
+    )
+    await queue.stop()
+    assert commit.sizes == [6]
+    assert results[0] == {"sensor_ids": ["A1", "A2!"], "alerts": {"dry": [False, True]}}
+    assert results[1] == {"sensor_ids": ["B1!"], "alerts": {"dry": [True]}}
+    assert results[2]["sensor_ids"] == ["C1", "C2", "C3"]
+    assert queue.readings_committed == 6 and queue.batches_committed == 1
+
+
+async def test_batch_size_limits_each_drain():
+    commit = Recorder()
+    queue = IngestQueue(commit, batch_size=2)
+    queue.start()
+    await asyncio.gather(*(queue.submit(make_batch([f"S{i}"])) for i in range(5)))
+    await queue.stop()
+    assert commit.sizes == [2, 2, 1]
+
+
+async def test_rejects_above_high_watermark_but_blocking_submit_waits():
+    commit = Recorder(delay=0.05)
+    queue = IngestQueue(commit, maxsize=4, batch_size=1, high_watermark=0.5)
+    queue.start()
+    # A primeira sai da fila para o commit; as duas seguintes enchem até a marca
+    pending = [asyncio.create_task(queue.submit(make_batch([f"S{i}"]), block=True)) for i in range(3)]
+    await asyncio.sleep(0.01)
+    with pytest.raises(QueueFullError) as exc:
+        await queue.submit(make_batch(["X"]))
+    assert exc.value.retry_after >= 1
+    assert queue.rejected == 1
+    assert (await queue.submit(make_batch(["Y"]), block=True))["sensor_ids"] == ["Y"]
+    await asyncio.gather(*pending)
+    await queue.stop()
+    assert sum(commit.sizes) == 4
+
+
+async def test_commit_error_reaches_every_waiting_submit():
+    async def failing(batch):
+        raise RuntimeError("disco cheio")
+
+    queue = IngestQueue(failing)
+    queue.start()
+    results = await asyncio.gather(queue.submit(make_batch(["S1"])), queue.submit(make_batch(["S2"])),
+                                   return_exceptions=True)
+    await queue.stop()
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_stop_drains_pending_batches():
+    commit = Recorder(delay=0.01)
+    queue = IngestQueue(commit, batch_size=1)
+    queue.start()
+    pending = [asyncio.create_task(queue.submit(make_batch([f"S{i}"]))) for i in range(3)]
+    await asyncio.sleep(0)
+    await queue.stop()
+    assert not queue.running
+    assert sum(commit.sizes) == 3
+    assert all(task.done() for task in pending)
@@ -0,0 +1,66 @@
+from irrigation import IrrigationScheduler
+
+NOW = 1_700_000_000.0
+
+
+def test_run_completes_at_its_deadline():
+    changes = []
+    scheduler = IrrigationScheduler(on_change=lambda log: changes.append((log["zone_id"], log["status"])))
+    log = scheduler.start_run("Z1", 10, now=NOW)
+    assert scheduler.active == {"Z1": log}
+    assert scheduler.next_deadline() == NOW + 600
+    assert scheduler.tick(NOW + 599) == []
+    assert scheduler.tick(NOW + 600) == [log]
+    assert scheduler.active == {}
+    assert changes == [("Z1", "active"), ("Z1", "completed")]
+
+
+def test_new_run_supersedes_the_active_one():
+    scheduler = IrrigationScheduler()
+    first = scheduler.start_run("Z1", 10, now=NOW)
+    second = scheduler.start_run("Z1", 20, now=NOW + 60)
+    assert first["status"] == "superseded"
+    # O prazo antigo sai do heap sem efeito
+    assert scheduler.tick(NOW + 600) == []
+    assert scheduler.active["Z1"] is second
+    assert scheduler.stopped_runs == 1 and scheduler.completed_runs == 0
+
+
+def test_stop_and_restore():
+    scheduler = IrrigationScheduler()
+    log = scheduler.start_run("Z1", 10, now=NOW)
+    assert scheduler.stop_run("Z1", now=NOW + 60)["status"] == "stopped"
+    assert scheduler.stop_run("Z1") is None
+
+    restored = IrrigationScheduler()
+    running = {**scheduler.start_run("Z2", 10, now=NOW), "status": "active"}
+    restored.restore([log, running], now=NOW + 60)
+    assert list(restored.active) == ["Z2"]
+    restored.restore([], now=NOW + 601)
+    assert restored.active == {}
+
+
+def test_apply_mirrors_the_coordinator():
+    coordinator, mirror = IrrigationScheduler(), IrrigationScheduler()
+    log = coordinator.start_run("Z1", 10, now=NOW)
+    mirror.apply(dict(log))
+    assert mirror.active["Z1"]["run_id"] == log["run_id"]
+    coordinator.tick(NOW + 600)
+    mirror.apply(dict(log))
+    assert mirror.active == {} and mirror.completed_runs == 1
+
+
+def test_irrigation_routes_validate_duration(client):
+    for minutes in (-5, 0, 10 ** 9):
+        response = client.post("/irrigation/activate", json={"zone_id": "Z1", "duration_minutes": minutes,
+                                                              "farm_id": "t-irrigation"})
+        assert response.status_code == 422
+    plan = {"zones": [{"zone_id": "Z1", "duration_minutes": 10, "start_offset_minutes": 10 ** 9}],
+            "farm_id": "t-irrigation"}
+    assert client.post("/irrigation/plans", json=plan).status_code == 422
+
+    response = client.post("/irrigation/activate", json={"zone_id": "Z1", "duration_minutes": 5,
+                                                          "farm_id": "t-irrigation"})
+    assert response.status_code == 200
+    assert response.json()["duration"] == 5
+
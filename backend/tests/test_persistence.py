@@ -0,0 +1,90 @@
+import queue
+import sqlite3
+import time
+
+import pytest
+
+from persistence import SQLitePersistence
+from tests.factories import make_batch
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"))
+    db.start()
+    yield db
+    db.close()
+
+
+def test_readings_round_trip(db):
+    ts = now_ms()
+    db.save_readings(make_batch(["S1", "S2"], ts_ms=[ts - 1000, ts], zones=["Z1", None], soil_moisture=42))
+    db.save_sensor({"sensor_id": "S1", "farm_id": "default", "zone": "Z1"})
+    db.close()
+    batch = db.load_readings(ts - 5000)
+    assert batch.sensor_ids.tolist() == ["S1", "S2"]
+    assert batch.zone_ids.tolist() == ["Z1", None]
+    assert batch.column("soil_moisture").tolist() == [42, 42]
+    assert db.load_sensors()[0]["sensor_id"] == "S1"
+    assert db.metrics()["pending_rows"] == 0
+
+
+def test_save_readings_without_space_raises_or_times_out(tmp_path):
+    # Sem a thread gravadora nada é consumido: o limite de pendentes vale na hora
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"), max_pending_rows=4)
+    db.save_readings(make_batch(["S1", "S2", "S3"]))
+    assert db.saturated()
+    with pytest.raises(queue.Full):
+        db.save_readings(make_batch(["S4", "S5"]), block=False)
+    with pytest.raises(queue.Full):
+        db.save_readings(make_batch(["S4", "S5"]), timeout=0.01)
+    assert db.pending_rows == 3
+    assert db.retry_after() >= 1
+
+
+def test_oversized_batch_is_accepted_when_nothing_is_pending(tmp_path):
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"), max_pending_rows=2)
+    db.save_readings(make_batch(["S1", "S2", "S3"]), block=False)
+    assert db.pending_rows == 3
+
+
+def test_write_failures_are_retried_then_logged(tmp_path, caplog):
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"), write_retries=1)
+    db.start()
+    # Tabela removida por fora: a transação falha em todas as tentativas
+    with sqlite3.connect(db.path) as conn:
+        conn.execute("DROP TABLE sensor_readings")
+    db.save_readings(make_batch(["S1", "S2"]))
+    db.close()
+    assert db.write_errors == 2
+    assert db.rows_failed == 2
+    assert db.pending_rows == 0
+    assert "Falha ao gravar 2 linhas" in caplog.text
+
+
+def test_old_readings_are_pruned_by_the_writer(tmp_path):
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"), retention_days=1)
+    db.start()
+    ts = now_ms()
+    # A limpeza roda na thread gravadora logo depois da primeira transação
+    db.save_readings(make_batch(["S1", "S2"], ts_ms=[ts - 3 * 86400 * 1000, ts]))
+    db.close()
+    assert db.load_readings(0).sensor_ids.tolist() == ["S2"]
+    assert db.rows_pruned == 1
+
+
+def test_ingest_answers_503_while_the_database_is_saturated(client, monkeypatch, tmp_path):
+    import main
+
+    db = SQLitePersistence(str(tmp_path / "agrosmart.db"), max_pending_rows=1)
+    db.save_readings(make_batch(["S1"]))
+    monkeypatch.setattr(main, "db", db)
+    reading = {"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 50, "ph_level": 6.5,
+               "timestamp": "2026-01-01T10:00:00"}
+    response = client.post("/sensors/data", params={"farm_id": "t-db-full"}, json=reading)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
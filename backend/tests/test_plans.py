@@ -0,0 +1,79 @@
+from irrigation import IrrigationScheduler
+
+NOW = 1_700_000_000.0
+
+
+def steps(*specs):
+    return [{"zone_id": zone, "duration_minutes": minutes, "start_offset_minutes": offset}
+            for zone, minutes, offset in specs]
+
+
+def test_plan_respects_concurrency_limit():
+    scheduler = IrrigationScheduler()
+    plan = scheduler.add_plan(steps(("Z1", 10, 0), ("Z2", 5, 0), ("Z3", 10, 0)), max_concurrent_zones=2, now=NOW)
+    plan_id = plan["plan_id"]
+    assert sorted(scheduler.active) == ["Z1", "Z2"]
+    assert scheduler.plan_status(plan_id)["status"] == "running"
+    # Z2 termina e libera a vaga para Z3
+    scheduler.tick(NOW + 300)
+    assert sorted(scheduler.active) == ["Z1", "Z3"]
+    scheduler.tick(NOW + 900)
+    status = scheduler.plan_status(plan_id)
+    assert status["status"] == "completed" and status["progress"] == 100.0
+    assert [step["status"] for step in status["steps"]] == ["completed"] * 3
+
+
+def test_delayed_steps_wait_for_their_start():
+    scheduler = IrrigationScheduler()
+    plan = scheduler.add_plan(steps(("Z1", 10, 30)), max_concurrent_zones=1, now=NOW)
+    assert scheduler.plan_status(plan["plan_id"])["status"] == "scheduled"
+    assert scheduler.next_deadline() == NOW + 1800
+    scheduler.tick(NOW + 1800)
+    assert list(scheduler.active) == ["Z1"]
+
+
+def test_stopped_step_counts_and_frees_capacity():
+    scheduler = IrrigationScheduler()
+    plan = scheduler.add_plan(steps(("Z1", 10, 0), ("Z2", 10, 0)), max_concurrent_zones=1, now=NOW)
+    scheduler.stop_run("Z1", now=NOW + 60)
+    status = scheduler.plan_status(plan["plan_id"])
+    assert status["stopped"] == 1 and status["active"] == 1
+    assert list(scheduler.active) == ["Z2"]
+
+
+def test_repeated_zone_supersedes_its_own_step_without_exceeding_the_limit():
+    scheduler = IrrigationScheduler()
+    plan = scheduler.add_plan(steps(("Z1", 10, 0), ("Z1", 10, 0), ("Z2", 10, 0), ("Z3", 10, 0), ("Z4", 10, 0)),
+                              max_concurrent_zones=2, now=NOW)
+    assert sorted(scheduler.active) == ["Z1", "Z2"]
+    status = scheduler.plan_status(plan["plan_id"])
+    assert (status["active"], status["stopped"], status["pending"]) == (2, 1, 2)
+
+    plan = scheduler.add_plan(steps(*[(zone, 10, 0) for zone in "AAABCD"]), max_concurrent_zones=3, now=NOW)
+    running = {log["run_id"] for log in scheduler.active.values() if log.get("plan_id") == plan["plan_id"]}
+    assert plan["running"] == running and len(running) == 3
+    assert scheduler.plan_status(plan["plan_id"])["active"] == 3
+    # Cada etapa que termina libera uma vaga e o plano chega ao fim
+    scheduler.tick(NOW + 600)
+    scheduler.tick(NOW + 1200)
+    status = scheduler.plan_status(plan["plan_id"])
+    assert status["status"] == "completed"
+    assert (status["completed"], status["stopped"]) == (4, 2)
+
+
+def test_oldest_plans_are_dropped():
+    scheduler = IrrigationScheduler(max_plans=2)
+    ids = [scheduler.add_plan(steps((f"Z{i}", 1, 0)), 1, now=NOW)["plan_id"] for i in range(3)]
+    assert scheduler.plan_status(ids[0]) is None
+    assert scheduler.plan_status(ids[2]) is not None
+
+
+def test_plan_routes(client):
+    plan = {"zones": [{"zone_id": "Z1", "duration_minutes": 10}, {"zone_id": "Z2", "duration_minutes": 10}],
+            "max_concurrent_zones": 1, "farm_id": "t-plans"}
+    created = client.post("/irrigation/plans", json=plan)
+    assert created.status_code == 200
+    status = client.get(f"/irrigation/plans/{created.json()['plan_id']}").json()
+    assert status["active"] == 1 and status["pending"] == 1
+    assert [step["zone_id"] for step in status["steps"]] == ["Z1", "Z2"]
+    assert client.get("/irrigation/plans/nao-existe").status_code == 404
@@ -0,0 +1,59 @@
+from registry import SensorRegistry
+
+
+def test_sensor_moves_from_pending_to_active_to_silent():
+    registry = SensorRegistry(silent_after=60)
+    registry.register("S1", zone_id="Z1")
+    assert registry.counts(now=1000) == {"total": 1, "active": 0, "silent": 0, "never_seen": 1}
+    registry.touch("S1", 1000)
+    assert registry.counts(now=1030) == {"total": 1, "active": 1, "silent": 0, "never_seen": 0}
+    assert registry.counts(now=1061) == {"total": 1, "active": 0, "silent": 1, "never_seen": 0}
+    registry.touch("S1", 1070)
+    assert registry.describe("S1", now=1080)["status"] == "active"
+
+
+def test_silent_for_is_ordered_by_last_contact_and_limited():
+    registry = SensorRegistry(silent_after=60)
+    for sensor_id, seen in (("A", 100), ("B", 200), ("C", 300), ("D", 990)):
+        registry.touch(sensor_id, seen)
+    assert registry.silent_for(600, limit=10, now=1000) == [("A", 100), ("B", 200), ("C", 300)]
+    assert registry.silent_for(600, limit=2, now=1000) == [("A", 100), ("B", 200)]
+    # Janela menor que silent_after: inclui sensores ainda ativos
+    assert registry.silent_for(5, limit=10, now=1000)[-1] == ("D", 990)
+
+
+def test_clock_going_back_keeps_the_contact_order():
+    registry = SensorRegistry(silent_after=60)
+    registry.touch("A", 500)
+    registry.touch("B", 400)  # relógio recuou: conta como o contato mais recente
+    assert list(registry.active) == ["A", "B"]
+    assert registry.last_seen("B") == 500
+
+
+def test_describe_merges_metadata_and_status():
+    registry = SensorRegistry(silent_after=60)
+    assert registry.describe("S1") is None
+    registry.register("S1", zone_id="Z1", crop="milho", registered_at=1000.0)
+    info = registry.describe("S1", now=1000)
+    assert info["status"] == "never_seen" and info["last_seen"] is None
+    assert (info["zone_id"], info["crop"]) == ("Z1", "milho")
+    registry.touch("S2", 1000)
+    assert registry.describe("S2", now=1000)["last_seen"] is not None
+
+
+def test_register_and_silent_routes(client):
+    response = client.post("/sensors/register",
+                           json={"sensor_id": "R1", "farm_id": "t-registry", "zone_id": "Z1", "crop": "soja"})
+    assert response.status_code == 200
+    assert response.json()["sensor"]["status"] == "never_seen"
+
+    reading = {"sensor_id": "R1", "temperature": 25, "humidity": 60, "soil_moisture": 50, "ph_level": 6.5,
+               "timestamp": "2026-01-01T10:00:00"}
+    client.post("/sensors/data/batch", params={"farm_id": "t-registry"}, json=[reading])
+    sensor = client.get("/sensors/R1", params={"farm_id": "t-registry"}).json()
+    assert (sensor["status"], sensor["zone_id"], sensor["crop"]) == ("active", "Z1", "soja")
+    assert sensor["latest_reading"]["sensor_id"] == "R1"
+
+    assert client.get("/sensors/R2", params={"farm_id": "t-registry"}).status_code == 404
+    silent = client.get("/sensors/silent", params={"farm_id": "t-registry", "minutes": 60}).json()
+    assert silent["count"] == 0
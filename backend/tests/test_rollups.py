@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from alerts import RuleEngine
+from rollups import RollupSeries, RollupStore, aggregate
+from shards import FarmShard
+from storage import ROW_BYTES, SensorStore
+from tests.factories import make_batch
+
+MINUTE = 60_000
+
+
+def minute_batch(sensor_id: str, minutes, moisture=50.0):
+    base = int(time.time() * 1000) // MINUTE * MINUTE - 60 * MINUTE
+    return make_batch([sensor_id] * len(minutes), ts_ms=[base + m * MINUTE for m in minutes], soil_moisture=moisture)
+
+
+def test_aggregate_groups_unsorted_buckets():
+    buckets, count, sums, mins, maxs = aggregate(np.array([2, 1, 2]),
+                                                 np.array([[1.0, 5.0, 3.0]] * 4, dtype=np.float32))
+    assert buckets.tolist() == [1, 2]
+    assert count.tolist() == [1, 2]
+    assert sums[0].tolist() == [5.0, 4.0]
+    assert mins[0].tolist() == [5.0, 1.0] and maxs[0].tolist() == [5.0, 3.0]
+
+
+def test_series_appends_merges_and_trims():
+    series = RollupSeries(max_buckets=3, capacity=2)
+    ones = np.ones((4, 1))
+
+    def add(bucket, value=1.0):
+        v = ones * value
+        series.merge(np.array([bucket]), np.array([1]), v, v.astype(np.float32), v.astype(np.float32))
+
+    for bucket in (10, 11, 12, 13):
+        add(bucket)
+    assert series.buckets.tolist() == [11, 12, 13]
+    add(12, 5.0)  # bucket existente: combina
+    assert series.count.tolist() == [1, 2, 1]
+    assert series.max[0].tolist() == [1.0, 5.0, 1.0]
+    add(11)
+    add(9)  # atrasado, antes da janela: entra e sai no corte
+    assert series.buckets.tolist() == [11, 12, 13]
+    assert series.count.tolist() == [2, 2, 1]
+
+
+def test_series_inserts_late_bucket_in_the_middle():
+    series = RollupSeries(max_buckets=10)
+    b, c, s, lo, hi = aggregate(np.array([1, 3]), np.ones((4, 2), dtype=np.float32))
+    series.merge(b, c, s, lo, hi)
+    b, c, s, lo, hi = aggregate(np.array([2]), np.ones((4, 1), dtype=np.float32))
+    series.merge(b, c, s, lo, hi)
+    assert series.buckets.tolist() == [1, 2, 3]
+    window = series.range(2, 3)
+    assert series.buckets[window].tolist() == [2, 3]
+
+
+def test_series_append_reuses_the_arrays():
+    series = RollupSeries(max_buckets=100, capacity=64)
+    ones = np.ones((4, 1))
+    series.merge(np.array([0]), np.array([1]), ones, ones.astype(np.float32), ones.astype(np.float32))
+    base = series._buckets
+    for bucket in range(1, 50):
+        series.merge(np.array([bucket]), np.array([1]), ones, ones.astype(np.float32), ones.astype(np.float32))
+    assert series._buckets is base
+    assert len(series) == 50
+
+
+def test_store_query_per_resolution():
+    store = RollupStore()
+    batch = minute_batch("S1", [0, 0, 1, 2], moisture=40.0)
+    store.add_batch(batch)
+    start, end = int(batch.timestamps.min()), int(batch.timestamps.max())
+    ts, count, sums, mins, maxs = store.query("S1", "1m", start, end)
+    assert count.tolist() == [2, 1, 1]
+    assert ts.tolist() == [start, start + MINUTE, start + 2 * MINUTE]
+    assert store.query("S1", "1d", start, end)[1].sum() == 4
+    assert store.query("S2", "1m", start, end) is None
+
+
+def test_rollups_are_dropped_with_the_evicted_sensor():
+    store = SensorStore(capacity_per_sensor=4, max_bytes=4 * ROW_BYTES)
+    shard = FarmShard(0, store, RuleEngine())
+    shard.process(make_batch(["S1"]))
+    shard.process(make_batch(["S2"]))
+    assert store.sensor_ids() == ["S2"]
+    assert "S1" not in shard.rollups and "S2" in shard.rollups
+
+
+def test_history_route_accepts_timezone_aware_bounds(client):
+    reading = {"sensor_id": "S1", "temperature": 25, "humidity": 60, "soil_moisture": 50, "ph_level": 6.5,
+               "timestamp": datetime.now().isoformat()}
+    client.post("/sensors/data", params={"farm_id": "t-history"}, json=reading)
+    start = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    response = client.get("/sensors/S1/history", params={"farm_id": "t-history", "start": start})
+    assert response.status_code == 200
+    response = client.get("/sensors/S1/history", params={"farm_id": "t-history", "start": "2026-01-01T00:00:00Z",
+                                                         "end": "2026-01-02T00:00:00+03:00"})
+    assert response.status_code == 200
+    assert response.json()["count"] == []
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import numpy as np
+import orjson
+import pytest
+from pydantic import BaseModel
+
+from serialization import FastJSONResponse, dumps
+
+
+class Zone(BaseModel):
+    zone_id: str
+    sensors: int
+
+
+def test_dumps_handles_numpy_datetime_models_and_sets():
+    content = {
+        "timestamp": datetime(2026, 1, 1, 10, 30),
+        "values": np.array([1.5, 2.5], dtype=np.float32),
+        "count": np.int64(3),
+        "zone": Zone(zone_id="Z1", sensors=2),
+        "tags": {"seco"},
+        1: "chave numérica",
+    }
+    assert orjson.loads(dumps(content)) == {
+        "timestamp": "2026-01-01T10:30:00",
+        "values": [1.5, 2.5],
+        "count": 3,
+        "zone": {"zone_id": "Z1", "sensors": 2},
+        "tags": ["seco"],
+        "1": "chave numérica",
+    }
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        dumps({"valor": object()})
+
+
+def test_response_renders_with_json_media_type():
+    response = FastJSONResponse({"n": np.float64(0.5)})
+    assert response.body == b'{"n":0.5}'
+    assert response.media_type == "application/json"
+
+
+def test_hot_routes_keep_the_documented_shape(client):
+    current = client.get("/sensors/current", params={"farm_id": "t-json"})
+    assert current.headers["content-type"] == "application/json"
+    for reading in current.json():
+        assert set(reading) >= {"sensor_id", "temperature", "humidity", "soil_moisture", "ph_level", "timestamp"}
+        datetime.fromisoformat(reading["timestamp"])
+
+    reading = {"sensor_id": "J1", "temperature": 25, "humidity": 60, "soil_moisture": 45, "ph_level": 6.5,
+               "timestamp": datetime.now().isoformat()}
+    assert client.post("/sensors/data/batch", params={"farm_id": "t-json"}, json=[reading]).status_code == 200
+    history = client.get("/sensors/J1/history", params={"farm_id": "t-json", "resolution": "raw"}).json()
+    assert history["sensor_id"] == "J1"
+    assert history["count"] == [1]
+    assert history["metrics"]["soil_moisture"]["mean"] == [45]
+    datetime.fromisoformat(history["timestamps"][0])
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from alerts import RuleEngine
+from shards import FarmShard, ShardedStore
+from storage import SensorStore, scoped_key
+from tests.factories import make_batch
+
+pytestmark = pytest.mark.anyio
+
+
+def make_store(count: int = 4) -> ShardedStore:
+    return ShardedStore(count, lambda i: FarmShard(i, SensorStore(capacity_per_sensor=64), RuleEngine(),
+                                                   silent_after=60))
+
+
+def farms_on_distinct_shards(store: ShardedStore, count: int):
+    farms = {}
+    for i in range(200):
+        farms.setdefault(store._index(f"f{i}"), f"f{i}")
+    return [farms[index] for index in sorted(farms)][:count]
+
+
+def ingest(store: ShardedStore, farm_id: str, sensors, **values):
+    ids = [scoped_key(farm_id, sensor_id) for sensor_id in sensors]
+    for shard, batch in store.split(make_batch(ids, zones=[scoped_key(farm_id, "Z1")] * len(ids), **values)):
+        shard.process(batch)
+
+
+def test_farm_always_maps_to_the_same_shard():
+    store = make_store()
+    shard = store.shard_for("norte")
+    assert store.shard_for("norte") is shard
+    assert shard.index == make_store().shard_for("norte").index  # crc32, estável entre processos
+    assert shard.registries == {}  # calcular o shard não cria estado da fazenda
+
+
+def test_split_sends_each_farm_to_its_shard():
+    store = make_store()
+    a, b = farms_on_distinct_shards(store, 2)
+    batch = make_batch([scoped_key(a, "S1"), scoped_key(b, "S1"), scoped_key(a, "S2")])
+    parts = {shard.index: part.sensor_ids.tolist() for shard, part in store.split(batch)}
+    assert parts == {store.shard_for(a).index: [f"{a}/S1", f"{a}/S2"], store.shard_for(b).index: [f"{b}/S1"]}
+
+
+async def test_fleet_totals_and_alerts_merge_the_shards():
+    store = make_store()
+    a, b = farms_on_distinct_shards(store, 2)
+    ingest(store, a, ["S1", "S2"], soil_moisture=20, ph_level=6.0)
+    ingest(store, b, ["S1"], soil_moisture=50, ph_level=7.0)
+
+    fleet = await store.totals()
+    assert (fleet["sensors"], fleet["zones"], fleet["ph_sum"]) == (3, 2, 19.0)
+    farm = await store.totals(a)
+    assert (farm["sensors"], farm["moisture_sum"]) == (2, 40.0)
+
+    template = RuleEngine()
+    [dry] = [alert for alert in await store.active_alerts(template) if alert["rule_id"] == "low_soil_moisture"]
+    assert dry["sensors"] == 2
+    [dry] = [alert for alert in await store.active_alerts(template, a) if alert["rule_id"] == "low_soil_moisture"]
+    assert "S1, S2" in dry["message"]
+    assert await store.active_alerts(template, b) == []
+
+
+async def test_silent_sensors_are_merged_oldest_first():
+    store = make_store()
+    farms = farms_on_distinct_shards(store, 3)
+    now = time.time()
+    for age, farm_id in zip((300, 100, 200), farms):
+        ids = [scoped_key(farm_id, "S1")]
+        for shard, batch in store.split(make_batch(ids)):
+            shard.touch(batch, now - age)
+    silent = await store.silent_sensors(None, 60, 2)
+    assert [farm_id for _, farm_id, _ in silent] == [farms[0], farms[2]]
+    assert await store.sensor_counts() == {"total": 3, "active": 0, "silent": 3, "never_seen": 0}
+
+
+async def test_gather_asks_each_other_worker_once_for_its_shards():
+    store = make_store()
+    store.assign(0, 2)
+    calls = []
+
+    async def remote(slot, name, farm_id, args):
+        calls.append((slot, name, farm_id, args))
+        return [{"sensors": 5, "zones": 1, "ph_sum": 30.0, "moisture_sum": 250.0}] * 2
+
+    store.remote = remote
+    a = next(farm for farm in farms_on_distinct_shards(store, 4) if store.owner(farm) == 0)
+    ingest(store, a, ["S1"])
+    assert [shard.index for shard in store.local_shards()] == [0, 2]
+    assert (await store.totals())["sensors"] == 11
+    assert calls == [(1, "totals", None, [])]
+
+    # Fazenda deste worker: nenhum pedido remoto
+    assert (await store.totals(a))["sensors"] == 1
+    assert len(calls) == 1
+
+
+async def test_read_waits_for_a_writer_without_blocking_the_loop():
+    store = make_store(1)
+    shard = store.shards[0]
+    shard.lock.acquire()
+    threading.Timer(0.05, shard.lock.release).start()
+    assert await shard.read(lambda: "ok") == "ok"
+    assert shard.contended == 1
+
+
+def test_farms_are_isolated_in_the_api(client):
+    reading = {"temperature": 25, "humidity": 60, "soil_moisture": 40, "ph_level": 6.5,
+               "timestamp": "2026-01-01T10:00:00"}
+    client.post("/sensors/data/batch", params={"farm_id": "t-shard-a"},
+                json=[{**reading, "sensor_id": "S1"}, {**reading, "sensor_id": "S2"}])
+    client.post("/sensors/data/batch", params={"farm_id": "t-shard-b"}, json=[{**reading, "sensor_id": "S1"}])
+    assert client.get("/analysis/soil-health", params={"farm_id": "t-shard-a"}).json()["sensors"] == 2
+    assert client.get("/analysis/soil-health", params={"farm_id": "t-shard-b"}).json()["sensors"] == 1
+    assert client.get("/analysis/soil-health", params={"farm_id": "bad/farm"}).status_code == 422
+
+
+def test_reads_of_unknown_farms_leave_no_state(client):
+    import main
+
+    before = (len(main.water_ledgers), len(main.irrigation_runs),
+              sum(len(shard.registries) for shard in main.farm_shards))
+    for i in range(20):
+        params = {"farm_id": f"t-junk{i}"}
+        assert client.get("/irrigation/status", params=params).json()["water_usage_today"] == 0
+        assert client.get("/irrigation/water-usage", params=params).status_code == 200
+        assert client.get("/sensors/S1", params=params).status_code == 404
+        assert client.get("/analysis/soil-health/Z1", params=params).status_code == 404
+    after = (len(main.water_ledgers), len(main.irrigation_runs),
+             sum(len(shard.registries) for shard in main.farm_shards))
+    assert after == before
+
+
+def test_simulated_farms_are_bounded(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "SIMULATED_FARMS", 3)
+    for i in range(5):
+        assert client.get("/sensors/current", params={"farm_id": f"t-sim-lru{i}"}).status_code == 200
+    assert list(main.simulators) == [f"t-sim-lru{i}" for i in range(2, 5)]
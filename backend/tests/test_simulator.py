@@ -0,0 +1,69 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from simulator import FleetSimulator, Pacer, columnar_body, ndjson_body
+
+START = 1767258000.0  # 2026-01-01 09:00 UTC
+
+
+def test_same_seed_gives_the_same_readings():
+    a = FleetSimulator(50, seed=7).generate(5, start=START)
+    b = FleetSimulator(50, seed=7).generate(5, start=START)
+    assert np.array_equal(a.values, b.values)
+    assert not np.array_equal(a.values, FleetSimulator(50, seed=8).generate(5, start=START).values)
+
+
+def test_generate_is_one_reading_per_sensor_per_step():
+    simulator = FleetSimulator(40, zones=4, seed=1)
+    batch = simulator.generate(3, step_seconds=60, start=START)
+    assert len(batch) == 120
+    assert np.unique(batch.timestamps).tolist() == [int(START * 1000) + k * 60000 for k in range(3)]
+    assert batch.sensor_ids[:40].tolist() == simulator.sensor_ids.tolist()
+    assert sorted(set(batch.zone_ids.tolist())) == ["Zona 1", "Zona 2", "Zona 3", "Zona 4"]
+
+
+def test_soil_dries_and_dry_zones_are_irrigated():
+    simulator = FleetSimulator(20, zones=2, seed=3, irrigate_below=0)
+    first = simulator.step(START).column("soil_moisture").mean()
+    later = simulator.step(START + 24 * 3600).column("soil_moisture").mean()
+    assert later < first
+    assert simulator.irrigations == 0
+
+    simulator.irrigate_below = 100  # toda zona está abaixo: as duas são irrigadas
+    moisture = simulator.step(START + 25 * 3600).column("soil_moisture")
+    assert simulator.irrigations == 2
+    assert moisture.mean() > 60
+
+
+def test_readings_stay_in_physical_ranges():
+    batch = FleetSimulator(500, seed=5).generate(48, step_seconds=1800, start=START)
+    assert 0 <= batch.column("soil_moisture").min() and batch.column("soil_moisture").max() <= 100
+    assert 15 <= batch.column("humidity").min() and batch.column("humidity").max() <= 100
+    assert 3.5 <= batch.column("ph_level").min() and batch.column("ph_level").max() <= 9.5
+
+
+@pytest.mark.anyio
+async def test_pacer_spreads_sends_at_the_target_rate():
+    pacer = Pacer(1000)
+    started = time.monotonic()
+    for _ in range(3):
+        await pacer.wait(50)
+    assert time.monotonic() - started >= 0.09
+    unpaced = Pacer(None)
+    await unpaced.wait(10 ** 9)
+    assert unpaced.scheduled == 0
+
+
+def test_load_bodies_are_accepted_by_the_api(client):
+    batch = FleetSimulator(10, seed=2, prefix="T").generate(2)
+    response = client.post("/sensors/data/batch", params={"farm_id": "t-sim"}, content=columnar_body(batch, 0, 10),
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 200 and response.json()["received"] == 10
+
+    response = client.post("/sensors/data/stream", params={"farm_id": "t-sim"}, content=ndjson_body(batch, 10, 20),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert json.loads(response.text.splitlines()[-1])["committed"] == 10
+    assert client.get("/analysis/soil-health", params={"farm_id": "t-sim"}).json()["sensors"] == 10
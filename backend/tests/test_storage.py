@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+from storage import (DEFAULT_FARM, ROW_BYTES, ReadingBatch, SensorRingBuffer, SensorStore, SharedBudget,
+                     group_indices, scoped_key, split_key)
+from tests.factories import make_batch
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def test_scoped_key_round_trip():
+    assert scoped_key(DEFAULT_FARM, "S1") == "S1"
+    assert scoped_key("norte", "S1") == "norte/S1"
+    assert split_key("norte/S1") == ("norte", "S1")
+    assert split_key("S1") == (DEFAULT_FARM, "S1")
+
+
+def test_group_indices_keeps_arrival_order():
+    keys = np.array(["b", "a", "b", "a", "b"], dtype=object)
+    groups = {key: idx.tolist() for key, idx in group_indices(keys)}
+    assert groups == {"a": [1, 3], "b": [0, 2, 4]}
+
+
+def test_batch_with_farm_scopes_sensors_and_zones():
+    batch = make_batch(["S1", "S2"], zones=["Z1", None]).with_farm("norte")
+    assert batch.sensor_ids.tolist() == ["norte/S1", "norte/S2"]
+    assert batch.zone_ids.tolist() == ["norte/Z1", None]
+    assert make_batch(["S1"]).with_farm(DEFAULT_FARM).sensor_ids.tolist() == ["S1"]
+
+
+def test_batch_select_and_concat():
+    first = make_batch(["S1", "S2"], values=[(20, 50, 40, 6.0), (21, 51, 41, 6.1)])
+    second = make_batch(["S3"], values=[(22, 52, 42, 6.2)])
+    merged = ReadingBatch.concat([first, second])
+    assert merged.sensor_ids.tolist() == ["S1", "S2", "S3"]
+    assert merged.column("soil_moisture").tolist() == [40, 41, 42]
+    assert merged.select(np.array([2, 0])).column("temperature").tolist() == [22, 20]
+
+
+def test_ring_buffer_wraps_and_keeps_order():
+    buffer = SensorRingBuffer(3)
+    for ts in range(5):
+        buffer.extend(np.array([ts]), np.full((4, 1), ts, dtype=np.float32))
+    ts_ms, values = buffer.ordered()
+    assert ts_ms.tolist() == [2, 3, 4]
+    assert values[0].tolist() == [2, 3, 4]
+
+
+def test_ring_buffer_expire_drops_old_readings():
+    buffer = SensorRingBuffer(8)
+    buffer.extend(np.arange(5), np.zeros((4, 5), dtype=np.float32))
+    assert buffer.expire(3) == 3
+    assert buffer.ordered()[0].tolist() == [3, 4]
+
+
+def test_store_slice_respects_retention_and_bounds():
+    store = SensorStore(capacity_per_sensor=16, retention_seconds=3600)
+    now = now_ms()
+    old = now - 2 * 3600 * 1000
+    store.append_batch(make_batch(["S1"] * 3, ts_ms=[old, now - 60_000, now]))
+    ts_ms, _ = store.slice("S1")
+    assert ts_ms.tolist() == [now - 60_000, now]
+    ts_ms, _ = store.slice("S1", end=datetime.fromtimestamp((now - 1000) / 1000))
+    assert ts_ms.tolist() == [now - 60_000]
+
+
+def test_store_evicts_least_recently_written_sensor():
+    store = SensorStore(capacity_per_sensor=4, max_bytes=2 * 4 * ROW_BYTES)
+    store.append_batch(make_batch(["S1", "S2"]))
+    store.append_batch(make_batch(["S1"]))  # S2 passa a ser o menos recente
+    store.append_batch(make_batch(["S3"]))
+    assert sorted(store.sensor_ids()) == ["S1", "S3"]
+    assert store.evicted_sensors == 1
+    assert len(store) == 3
+
+
+def test_shared_budget_evicts_only_from_the_store_above_its_fair_share():
+    per_sensor = 4 * ROW_BYTES
+    budget = SharedBudget(4 * per_sensor)
+    big = SensorStore(capacity_per_sensor=4, budget=budget)
+    small = SensorStore(capacity_per_sensor=4, budget=budget)
+    small.append_batch(make_batch(["P1"]))
+    big.append_batch(make_batch([f"G{i}" for i in range(6)]))
+    assert small.sensor_ids() == ["P1"]
+    assert big.nbytes + small.nbytes <= budget.max_bytes
+    assert big.sensor_ids() == ["G3", "G4", "G5"]
+
+
+def test_store_drops_sensor_from_history_after_retention():
+    store = SensorStore(capacity_per_sensor=4, retention_seconds=60)
+    store.append_batch(make_batch(["S1"], ts_ms=[now_ms() - 120_000]))
+    assert store.slice("S1")[0].size == 0
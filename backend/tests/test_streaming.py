@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from streaming import iter_lines
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def collect(*parts: bytes, max_line_bytes: int = 16):
+    return [line async for line in iter_lines(chunks(*parts), max_line_bytes)]
+
+
+async def test_lines_split_across_chunks():
+    assert await collect(b'{"a"', b': 1}\n{"b": 2', b"}\n") == [b'{"a": 1}', b'{"b": 2}']
+
+
+async def test_last_line_without_newline():
+    assert await collect(b"um\ndois") == [b"um", b"dois"]
+
+
+async def test_oversized_line_is_flagged_and_the_stream_continues():
+    long_line = b"x" * 40
+    assert await collect(b"ok\n", long_line[:20], long_line[20:] + b"\nfim\n") == [b"ok", None, b"fim"]
+    assert await collect(b"ok\n" + long_line) == [b"ok", None]
+
+
+def ndjson(rows) -> bytes:
+    return b"".join(json.dumps(row).encode() + b"\n" for row in rows)
+
+
+def reading(sensor_id: str, moisture: float = 50) -> dict:
+    return {"sensor_id": sensor_id, "temperature": 25, "humidity": 60, "soil_moisture": moisture,
+            "ph_level": 6.5, "timestamp": "2026-01-01T10:00:00"}
+
+
+def test_stream_route_acknowledges_and_reports_bad_lines(client):
+    body = ndjson([reading("S1", 20), reading("S2")]) + b"nao-e-json\n" + ndjson([reading("S3")])
+    response = client.post("/sensors/data/stream", params={"farm_id": "t-stream"}, content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines[-1]
+    assert summary["status"] == "completed"
+    assert summary["lines"] == 4
+    assert summary["committed"] == 3
+    assert summary["rejected"] == 1
+    assert summary["alert_counts"]["low_soil_moisture"] == 1
+    assert lines[0]["errors"][0]["line"] == 3
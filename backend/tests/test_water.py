@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import pytest
+
+from water import WaterLedger
+
+
+def run(zone_id, start, end, status="completed"):
+    return {"zone_id": zone_id, "start_time": start, "end_time": end, "status": status}
+
+
+def test_usage_per_day_and_zone():
+    ledger = WaterLedger(default_flow_lpm=10, flow_rates={"Z2": 20})
+    ledger.record(run("Z1", datetime(2026, 3, 1, 8), datetime(2026, 3, 1, 8, 30)))
+    ledger.record(run("Z2", datetime(2026, 3, 3, 8), datetime(2026, 3, 3, 8, 10)))
+    march_1, march_3 = date(2026, 3, 1), date(2026, 3, 3)
+    assert ledger.usage(march_1, march_1)["liters"] == pytest.approx(300)
+    assert ledger.usage(march_1, march_3)["zones"] == {"Z1": pytest.approx(300), "Z2": pytest.approx(200)}
+    assert ledger.usage(date(2026, 3, 2), date(2026, 3, 2))["liters"] == 0
+    assert ledger.usage(march_1, march_3, zone_id="Z2")["liters"] == pytest.approx(200)
+    assert ledger.usage(date(2026, 2, 1), date(2026, 2, 28))["liters"] == 0
+
+
+def test_run_across_midnight_is_split_between_days():
+    ledger = WaterLedger(default_flow_lpm=1)
+    ledger.record(run("Z1", datetime(2026, 3, 1, 23, 30), datetime(2026, 3, 2, 0, 45)))
+    assert ledger.usage(date(2026, 3, 1), date(2026, 3, 1))["liters"] == pytest.approx(30)
+    assert ledger.usage(date(2026, 3, 2), date(2026, 3, 2))["liters"] == pytest.approx(45)
+
+
+def test_earlier_day_and_many_zones_grow_the_matrix():
+    ledger = WaterLedger(default_flow_lpm=1, initial_zones=2, initial_days=2)
+    for i in range(5):
+        ledger.record(run(f"Z{i}", datetime(2026, 3, 10, 8), datetime(2026, 3, 10, 9)))
+    ledger.record(run("Z0", datetime(2026, 1, 1, 8), datetime(2026, 1, 1, 9)))
+    assert ledger.usage(date(2026, 1, 1), date(2026, 3, 10))["liters"] == pytest.approx(360)
+    assert ledger.usage(date(2026, 3, 10), date(2026, 3, 10))["liters"] == pytest.approx(300)
+
+
+def test_summary_counts_running_irrigation_and_efficiency():
+    ledger = WaterLedger(default_flow_lpm=1)
+    now = datetime(2026, 3, 1, 12)
+    ledger.record(run("Z1", datetime(2026, 3, 1, 8), datetime(2026, 3, 1, 9)))
+    ledger.record(run("Z2", datetime(2026, 3, 1, 9), datetime(2026, 3, 1, 10), status="superseded"))
+    active = [run("Z3", datetime(2026, 3, 1, 11, 30), datetime(2026, 3, 1, 13), status="active")]
+    summary = ledger.summary(active, now=now)
+    assert summary["water_usage_today"] == pytest.approx(150)
+    assert summary["efficiency_score"] == pytest.approx(50)
+
+
+def test_water_usage_route(client):
+    response = client.get("/irrigation/water-usage", params={"farm_id": "t-water"})
+    assert response.status_code == 200
+    assert response.json()["liters"] == 0
+    params = {"farm_id": "t-water", "start": "2026-03-02", "end": "2026-03-01"}
+    assert client.get("/irrigation/water-usage", params=params).status_code == 400
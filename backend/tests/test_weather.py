@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from weather import SimulatedProvider, WeatherCache, WeatherProviderError
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def current(self, city: str) -> dict:
+        self.calls += 1
+        raise WeatherProviderError("fora do ar")
+
+
+async def test_concurrent_misses_share_one_upstream_call():
+    provider = SimulatedProvider(delay=0.02)
+    cache = WeatherCache(provider)
+    results = await asyncio.gather(*(cache.get("Campinas") for _ in range(10)))
+    assert provider.calls == 1
+    assert all(r is results[0] for r in results)
+    # Chave sem diferença de caixa/espaços
+    assert await cache.get(" campinas ") is results[0]
+    assert cache.metrics()["hits"] == 1
+
+
+async def test_stale_value_is_served_while_revalidating():
+    provider = SimulatedProvider()
+    updates = []
+    cache = WeatherCache(provider, ttl=0, stale_ttl=60, on_update=lambda city, payload: updates.append(city))
+    first = await cache.get("Campinas")
+    assert await cache.get("Campinas") is first
+    await asyncio.sleep(0)  # deixa a revalidação rodar
+    assert provider.calls == 2
+    assert cache.stale_hits == 1
+    assert updates == ["Campinas", "Campinas"]
+
+
+async def test_seeded_value_covers_provider_failures():
+    provider = FailingProvider()
+    cache = WeatherCache(provider, ttl=1, stale_ttl=1)
+    with pytest.raises(WeatherProviderError):
+        await cache.get("Campinas")
+    cache.seed("Campinas", {"location": "Campinas"})
+    assert (await cache.get("Campinas"))["location"] == "Campinas"
+    assert cache.upstream_errors == 2
+
+
+async def test_timeout_without_cached_value():
+    cache = WeatherCache(SimulatedProvider(delay=1), timeout=0.01)
+    with pytest.raises(WeatherProviderError):
+        await cache.get("Campinas")
+
+
+async def test_lru_eviction():
+    cache = WeatherCache(SimulatedProvider(), max_entries=2)
+    for city in ("A", "B", "C"):
+        await cache.get(city)
+    assert cache.metrics()["cities"] == 2
+    assert "a" not in cache._entries
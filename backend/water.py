@@ -0,0 +1,163 @@
+"""Contabilidade de consumo de água da irrigação com somas prefixadas.
+
+O consumo de cada execução é vazão da zona x duração real, dividido entre
+os dias que a execução atravessa. Para cada zona guarda-se o acumulado
+dia a dia (soma prefixada) numa matriz zonas x dias, além do acumulado da
+fazenda inteira; o total de qualquer intervalo de datas é a diferença de
+duas colunas, sem percorrer o histórico de execuções. Execuções em
+andamento entram no total pela parcela já decorrida.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Execuções que cumpriram o tempo previsto ou pararam pelo controle automático
+EFFECTIVE_STATUSES = ("completed", "stopped")
+
+
+def _day(ts: datetime) -> int:
+    return ts.date().toordinal()
+
+
+class WaterLedger:
+    def __init__(self, default_flow_lpm: float = 20.0, flow_rates: Optional[Dict[str, float]] = None,
+                 initial_zones: int = 64, initial_days: int = 64):
+        self.default_flow_lpm = default_flow_lpm
+        self.flow_rates = dict(flow_rates or {})
+        self.zone_slots: Dict[str, int] = {}
+        self.zone_names = []
+        self.origin: Optional[int] = None  # ordinal do primeiro dia da matriz
+        self.days = 0
+        # Acumulados até o fim de cada dia (inclusive)
+        self.cumulative = np.zeros((initial_zones, initial_days))
+        self.farm = np.zeros(initial_days)
+        self.farm_effective = np.zeros(initial_days)
+        self.runs = 0
+
+    def flow(self, zone_id: str) -> float:
+        return self.flow_rates.get(zone_id, self.default_flow_lpm)
+
+    def _slot(self, zone_id: str) -> int:
+        slot = self.zone_slots.get(zone_id)
+        if slot is None:
+            slot = self.zone_slots[zone_id] = len(self.zone_names)
+            self.zone_names.append(zone_id)
+            if slot >= self.cumulative.shape[0]:
+                grown = np.zeros((self.cumulative.shape[0] * 2, self.cumulative.shape[1]))
+                grown[:slot] = self.cumulative
+                self.cumulative = grown
+        return slot
+
+    def _column(self, day: int) -> int:
+        """Índice da coluna do dia, estendendo a matriz (à direita ou à esquerda) se preciso."""
+        if self.origin is None:
+            self.origin = day
+        if day < self.origin:
+            shift = self.origin - day
+            self._resize(self.days + shift, shift)
+            self.origin = day
+            self.days += shift
+        col = day - self.origin
+        if col >= self.days:
+            if col >= self.cumulative.shape[1]:
+                self._resize(max(col + 1, self.cumulative.shape[1] * 2), 0)
+            # O acumulado continua igual nos dias sem consumo
+            last = self.days - 1
+            for array in (self.cumulative.T, self.farm, self.farm_effective):
+                array[self.days:col + 1] = array[last] if last >= 0 else 0
+            self.days = col + 1
+        return col
+
+    def _resize(self, days: int, shift: int):
+        capacity = max(days, self.cumulative.shape[1])
+        cumulative = np.zeros((self.cumulative.shape[0], capacity))
+        cumulative[:, shift:shift + self.days] = self.cumulative[:, :self.days]
+        self.cumulative = cumulative
+        for name in ("farm", "farm_effective"):
+            array = np.zeros(capacity)
+            array[shift:shift + self.days] = getattr(self, name)[:self.days]
+            setattr(self, name, array)
+
+    def _split_by_day(self, start: datetime, end: datetime):
+        """Minutos de [start, end) em cada dia."""
+        while start < end:
+            midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+            chunk_end = min(end, midnight)
+            yield _day(start), (chunk_end - start).total_seconds() / 60
+            start = chunk_end
+
+    def record(self, log: dict):
+        """Contabiliza uma execução encerrada (concluída, interrompida ou substituída)."""
+        zone_id = log["zone_id"]
+        slot = self._slot(zone_id)
+        rate = self.flow(zone_id)
+        effective = log["status"] in EFFECTIVE_STATUSES
+        for day, minutes in self._split_by_day(log["start_time"], log["end_time"]):
+            liters = rate * minutes
+            col = self._column(day)
+            self.cumulative[slot, col:self.days] += liters
+            self.farm[col:self.days] += liters
+            if effective:
+                self.farm_effective[col:self.days] += liters
+        self.runs += 1
+
+    def _prefix(self, array: np.ndarray, day: int):
+        """Acumulado até o fim de `day` (0 antes do primeiro dia)."""
+        if self.origin is None or day < self.origin:
+            return np.zeros(array.shape[:-1]) if array.ndim > 1 else 0.0
+        col = min(day - self.origin, self.days - 1)
+        return array[..., col]
+
+    def _range(self, array: np.ndarray, start: date, end: date):
+        first, last = start.toordinal(), end.toordinal()
+        return self._prefix(array, last) - self._prefix(array, first - 1)
+
+    def _accrued(self, active: Iterable[dict], start: date, end: date, now: datetime) -> Dict[str, float]:
+        """Parcela já decorrida das execuções em andamento dentro do intervalo."""
+        window_start = datetime.combine(start, datetime.min.time())
+        window_end = min(datetime.combine(end + timedelta(days=1), datetime.min.time()), now)
+        accrued = {}
+        for log in active:
+            begin = max(log["start_time"], window_start)
+            if begin < window_end:
+                minutes = (window_end - begin).total_seconds() / 60
+                accrued[log["zone_id"]] = accrued.get(log["zone_id"], 0.0) + self.flow(log["zone_id"]) * minutes
+        return accrued
+
+    def usage(self, start: date, end: date, zone_id: Optional[str] = None, active: Iterable[dict] = (),
+              now: Optional[datetime] = None) -> dict:
+        """Consumo (litros) entre `start` e `end`, inclusive, total e por zona."""
+        now = now or datetime.now()
+        accrued = self._accrued(active, start, end, now)
+        if zone_id is not None:
+            slot = self.zone_slots.get(zone_id)
+            liters = 0.0 if slot is None else float(self._range(self.cumulative[slot], start, end))
+            return {"zone_id": zone_id, "liters": liters + accrued.get(zone_id, 0.0)}
+
+        n = len(self.zone_names)
+        per_zone = np.asarray(self._range(self.cumulative[:n], start, end)).tolist() if n else []
+        zones = {name: liters for name, liters in zip(self.zone_names, per_zone) if liters}
+        for name, liters in accrued.items():
+            zones[name] = zones.get(name, 0.0) + liters
+        finished = float(self._range(self.farm, start, end))
+        return {
+            "liters": finished + sum(accrued.values()),
+            "finished_liters": finished,
+            "effective_liters": float(self._range(self.farm_effective, start, end)),
+            "zones": zones,
+        }
+
+    def summary(self, active: Iterable[dict] = (), now: Optional[datetime] = None) -> dict:
+        now = now or datetime.now()
+        active = list(active)
+        today = now.date()
+        day = self.usage(today, today, active=active, now=now)
+        week = self.usage(today - timedelta(days=6), today, active=active, now=now)
+        finished = day["finished_liters"]
+        return {
+            "water_usage_today": day["liters"],
+            "water_usage_week": week["liters"],
+            # Água de hoje aplicada em execuções que não foram substituídas no meio
+            "efficiency_score": day["effective_liters"] / finished * 100 if finished else 100.0,
+        }
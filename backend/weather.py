@@ -0,0 +1,174 @@
+"""Camada de provedores de clima com cache por cidade.
+
+O cache guarda a última resposta de cada cidade por `ttl` segundos, com
+despejo LRU acima de `max_entries`. Consultas simultâneas da mesma cidade
+compartilham uma única chamada ao provedor (single-flight). Depois do TTL
+o valor antigo continua sendo servido por até `stale_ttl` segundos
+enquanto uma atualização roda em segundo plano; se o provedor demorar
+mais que `timeout` e houver qualquer valor antigo, ele é devolvido.
+"""
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import httpx
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+
+class WeatherProviderError(Exception):
+    pass
+
+
+class OpenWeatherProvider:
+    """Provedor real: OpenWeather com um cliente HTTP assíncrono compartilhado (pool de conexões)."""
+
+    def __init__(self, api_key: str, client: httpx.AsyncClient, url: str = OPENWEATHER_URL):
+        self.api_key = api_key
+        self.client = client
+        self.url = url
+
+    async def current(self, city: str) -> dict:
+        params = {"q": city, "appid": self.api_key, "units": "metric"}
+        try:
+            response = await self.client.get(self.url, params=params)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise WeatherProviderError(f"OpenWeather indisponível: {e}") from e
+        data = response.json()
+        return {
+            "location": city,
+            "temperature": data["main"]["temp"],
+            "humidity": data["main"]["humidity"],
+            "pressure": data["main"]["pressure"],
+            "wind_speed": data["wind"]["speed"],
+            "description": data["weather"][0]["description"],
+            "timestamp": datetime.fromtimestamp(data["dt"]),
+        }
+
+
+class SimulatedProvider:
+    """Provedor local sem rede (demonstração e testes), com latência opcional."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def current(self, city: str) -> dict:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {
+            "location": city,
+            "temperature": round(random.uniform(20, 30), 1),
+            "humidity": round(random.uniform(50, 80), 1),
+            "pressure": round(random.uniform(1010, 1025), 1),
+            "wind_speed": round(random.uniform(0, 15), 1),
+            "description": random.choice(["Clear sky", "Few clouds", "Scattered clouds", "Light rain"]),
+            "timestamp": datetime.now(),
+        }
+
+
+class WeatherCache:
+    def __init__(self, provider, ttl: float = 600, stale_ttl: float = 3600, max_entries: int = 1024,
+                 timeout: float = 5.0, on_update: Optional[Callable[[str, dict], None]] = None):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.on_update = on_update
+        # chave -> (payload, instante da busca em time.monotonic())
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    @staticmethod
+    def key(city: str) -> str:
+        return city.strip().casefold()
+
+    def seed(self, city: str, payload: dict, age: float = float("inf")):
+        """Carrega um valor conhecido (ex.: restaurado do banco), já vencido por padrão."""
+        self._store(self.key(city), payload, time.monotonic() - min(age, self.stale_ttl * 2))
+
+    def _store(self, key: str, payload: dict, fetched_at: float):
+        self._entries[key] = (payload, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _refresh(self, city: str) -> asyncio.Task:
+        key = self.key(city)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key, city))
+            task.add_done_callback(_consume_exception)
+        return task
+
+    async def _fetch(self, key: str, city: str) -> dict:
+        self.upstream_calls += 1
+        try:
+            payload = await self.provider.current(city)
+        except Exception:
+            self.upstream_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._store(key, payload, time.monotonic())
+        if self.on_update is not None:
+            self.on_update(city, payload)
+        return payload
+
+    async def get(self, city: str) -> dict:
+        key = self.key(city)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            payload, fetched_at = entry
+            age = now - fetched_at
+            self._entries.move_to_end(key)
+            if age < self.ttl:
+                self.hits += 1
+                return payload
+            if age < self.ttl + self.stale_ttl:
+                # Serve o valor antigo e revalida em segundo plano
+                self.stale_hits += 1
+                self._refresh(city)
+                return payload
+
+        self.misses += 1
+        task = self._refresh(city)
+        try:
+            # shield: o timeout de um chamador não cancela a busca compartilhada
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except (asyncio.TimeoutError, WeatherProviderError) as e:
+            if entry is not None:
+                self.stale_hits += 1
+                return entry[0]
+            if isinstance(e, asyncio.TimeoutError):
+                raise WeatherProviderError(f"Sem resposta do provedor em {self.timeout}s") from e
+            raise
+
+    def metrics(self) -> dict:
+        return {
+            "cities": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "inflight": len(self._inflight),
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    # Falhas de buscas sem ninguém aguardando (revalidação, timeout) ficam só nas métricas
+    if not task.cancelled():
+        task.exception()
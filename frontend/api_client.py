@@ -0,0 +1,223 @@
+"""Cliente HTTP do dashboard.
+
+Uma única `requests.Session` por processo (conexões keep-alive em pool),
+timeout por endpoint e cache com TTL próprio de cada endpoint (LRU com
+no máximo `CACHE_MAX_ENTRIES` respostas; as vencidas saem a cada nova
+inserção). Várias
+consultas podem ser feitas em paralelo por um pool de threads, de modo
+que um endpoint lento não atrasa os demais além do seu próprio timeout.
+
+`live_feed()` mantém, por processo, uma conexão ao feed de eventos da API
+(`/events/stream`) numa thread; os fragmentos do dashboard redesenham a
+partir desse estado local, sem novas requisições.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+
+class Endpoint(NamedTuple):
+    path: str
+    ttl: float  # segundos em cache (0 = sem cache)
+    timeout: float  # segundos de leitura
+
+
+ENDPOINTS = {
+    "snapshot": Endpoint("/dashboard/snapshot", ttl=30, timeout=10),
+    "summary": Endpoint("/dashboard/summary", ttl=30, timeout=5),
+    # Redesenho dos fragmentos ao vivo: cache curto, só para dividir a consulta entre sessões
+    "live_summary": Endpoint("/dashboard/summary", ttl=2, timeout=5),
+    "sensors": Endpoint("/sensors/current", ttl=30, timeout=5),
+    "weather": Endpoint("/weather/{city}", ttl=300, timeout=5),
+    "forecast": Endpoint("/weather/forecast/{city}", ttl=300, timeout=5),
+    "irrigation": Endpoint("/irrigation/status", ttl=15, timeout=5),
+    "soil_health": Endpoint("/analysis/soil-health", ttl=60, timeout=5),
+    "history": Endpoint("/sensors/{sensor_id}/history", ttl=60, timeout=10),
+}
+CONNECT_TIMEOUT = 3.05
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "256"))
+
+# Seções do dashboard buscadas individualmente quando /dashboard/snapshot não responde
+DASHBOARD_SECTIONS = ("summary", "sensors", "weather", "forecast", "irrigation", "soil_health")
+
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-client")
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # (endpoint, path, params) -> (expira em, resposta)
+_lock = threading.Lock()
+
+
+def get(name: str, params: Optional[dict] = None, **path_args):
+    """GET em um endpoint conhecido; devolve o JSON ou None em caso de erro."""
+    endpoint = ENDPOINTS[name]
+    path = endpoint.path.format(**path_args)
+    key = (name, path, tuple(sorted((params or {}).items())))
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > now:
+            _cache.move_to_end(key)
+            return cached[1]
+    try:
+        response = _session.get(f"{API_BASE_URL}{path}", params=params,
+                                timeout=(CONNECT_TIMEOUT, endpoint.timeout))
+        if response.status_code != 200:
+            return None
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    if endpoint.ttl:
+        _store(key, now + endpoint.ttl, data)
+    return data
+
+
+def _store(key: tuple, expires_at: float, data):
+    with _lock:
+        now = time.monotonic()
+        for stale in [k for k, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[stale]
+        _cache[key] = (expires_at, data)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def get_many(calls: Dict[str, tuple]) -> dict:
+    """Executa vários GETs em paralelo: {chave: (endpoint, params, path_args)} -> {chave: JSON ou None}."""
+    futures = {key: _executor.submit(get, name, params, **path_args)
+               for key, (name, params, path_args) in calls.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def dashboard(city: str) -> dict:
+    """Todas as seções do dashboard; cai para consultas paralelas se o snapshot falhar."""
+    snapshot = get("snapshot", {"city": city})
+    if snapshot is not None:
+        return snapshot
+    path_args = {"city": city}
+    return get_many({name: (name, None, path_args) for name in DASHBOARD_SECTIONS})
+
+
+def post(path: str, **kwargs):
+    """POST sem cache; invalida o cache, pois o estado da API mudou."""
+    response = _session.post(f"{API_BASE_URL}{path}", timeout=(CONNECT_TIMEOUT, 30), **kwargs)
+    clear()
+    return response
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+class LiveFeed:
+    """Estado ao vivo alimentado pelos eventos SSE da API."""
+
+    def __init__(self, max_events: int = 50, max_sensors: int = 5000):
+        self.max_sensors = max_sensors
+        self.sensors: "OrderedDict[str, dict]" = OrderedDict()  # sensor_id -> última leitura (LRU)
+        self.irrigation: Dict[str, dict] = {}  # zone_id -> última mudança de estado
+        self.events = deque(maxlen=max_events)  # alertas e irrigação, mais recentes primeiro
+        self.version = 0
+        self.connected = False
+        self.last_event_id: Optional[str] = None
+        self.malformed = 0  # eventos ignorados por JSON ou formato inválido
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = 1
+        while True:
+            headers = {"Accept": "text/event-stream"}
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            try:
+                # Timeout de leitura acima do intervalo de heartbeat da API
+                with _session.get(f"{API_BASE_URL}/events/stream", headers=headers, stream=True,
+                                  timeout=(CONNECT_TIMEOUT, 60)) as response:
+                    response.raise_for_status()
+                    self.connected = True
+                    backoff = 1
+                    self._consume(response.iter_lines(decode_unicode=True))
+            except requests.RequestException:
+                pass
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _consume(self, lines):
+        event, data = "message", []
+        for line in lines:
+            if line == "":
+                if data:
+                    try:
+                        self._dispatch(event, json.loads("\n".join(data)))
+                    except (ValueError, KeyError, TypeError):
+                        # Um evento inválido não pode derrubar a thread do feed
+                        self.malformed += 1
+                event, data = "message", []
+            elif line.startswith(":"):
+                continue  # heartbeat
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+                elif field == "id":
+                    self.last_event_id = value
+
+    def _dispatch(self, event: str, data):
+        with self._lock:
+            if event == "sensors":
+                for reading in data:
+                    self.sensors[reading["sensor_id"]] = reading
+                    self.sensors.move_to_end(reading["sensor_id"])
+                while len(self.sensors) > self.max_sensors:
+                    self.sensors.popitem(last=False)
+            elif event == "alerts":
+                for change in data:
+                    self.events.appendleft({"type": "alert", **change})
+            elif event == "irrigation":
+                self.irrigation[data["zone_id"]] = data
+                self.events.appendleft({"type": "irrigation", **data})
+            elif event == "resync":
+                # Eventos perdidos: a próxima renderização completa busca o estado na API
+                clear()
+            self.version += 1
+
+    def sensor_readings(self, sensor_ids) -> Dict[str, dict]:
+        with self._lock:
+            return {sensor_id: self.sensors[sensor_id] for sensor_id in sensor_ids if sensor_id in self.sensors}
+
+    def recent_events(self, limit: int = 10) -> list:
+        with self._lock:
+            return list(self.events)[:limit]
+
+    def irrigation_states(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self.irrigation)
+
+
+_live_feed: Optional[LiveFeed] = None
+
+
+def live_feed() -> LiveFeed:
+    """Feed ao vivo do processo, iniciado na primeira chamada."""
+    global _live_feed
+    with _lock:
+        if _live_feed is None:
+            _live_feed = LiveFeed()
+        return _live_feed
@@ -1,12 +1,12 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
-import time
 import json
 
+import api_client
+
 # Configuração da página
 st.set_page_config(
     page_title="AgroSmart Dashboard",
@@ -15,8 +15,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# URL da API (ajuste conforme necessário)
-API_BASE_URL = "http://localhost:8000"
+# Pontos por série enviados aos gráficos (redução LTTB feita pela API)
+MAX_CHART_POINTS = 500
+
+# Intervalo de redesenho dos fragmentos ao vivo (os dados chegam pelo feed de eventos)
+LIVE_REFRESH_SECONDS = 5
 
 # CSS customizado
 st.markdown("""
@@ -50,63 +53,19 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Funções auxiliares para chamadas à API
-@st.cache_data(ttl=30)
-def get_sensors_data():
-    try:
-        response = requests.get(f"{API_BASE_URL}/sensors/current")
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
-
-@st.cache_data(ttl=300)
-def get_weather_data(city="São Paulo"):
-    try:
-        response = requests.get(f"{API_BASE_URL}/weather/{city}")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
-        return None
-
-@st.cache_data(ttl=300)
-def get_weather_forecast(city="São Paulo"):
-    try:
-        response = requests.get(f"{API_BASE_URL}/weather/forecast/{city}")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
-        return None
-
-def get_irrigation_status():
-    try:
-        response = requests.get(f"{API_BASE_URL}/irrigation/status")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
-        return None
-
-def get_soil_health():
-    try:
-        response = requests.get(f"{API_BASE_URL}/analysis/soil-health")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
-        return None
-
-def get_dashboard_summary():
-    try:
-        response = requests.get(f"{API_BASE_URL}/dashboard/summary")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except:
-        return None
+# Funções auxiliares para chamadas à API (sessão, timeouts e cache por endpoint em api_client)
+def get_dashboard_snapshot(city="São Paulo"):
+    """Resumo, sensores, clima, previsão, irrigação e solo numa única requisição"""
+    return api_client.dashboard(city)
+
+def get_sensor_history(sensor_id, metric, hours):
+    # Início arredondado ao minuto para reaproveitar o cache entre atualizações
+    start = (datetime.now() - timedelta(hours=hours)).replace(second=0, microsecond=0)
+    return api_client.get("history", {
+        "start": start.isoformat(),
+        "max_points": MAX_CHART_POINTS,
+        "downsample_metric": metric
+    }, sensor_id=sensor_id)
 
 # Header principal
 st.markdown('<h1 class="main-header">🌱 AgroSmart Dashboard</h1>', unsafe_allow_html=True)
@@ -114,37 +73,126 @@ st.markdown("---")
 
 # Sidebar
 st.sidebar.header("⚙️ Configurações")
-auto_refresh = st.sidebar.checkbox("Auto-refresh (30s)", value=False)
+live_updates = st.sidebar.checkbox("Atualização ao vivo", value=False)
 selected_city = st.sidebar.selectbox("Localização", ["São Paulo", "Campinas", "Ribeirão Preto", "Piracicaba"])
 
-if auto_refresh:
-    time.sleep(30)
-    st.rerun()
+# Com atualização ao vivo, apenas os fragmentos abaixo são redesenhados, a partir do feed de eventos
+live_interval = LIVE_REFRESH_SECONDS if live_updates else None
+if live_updates:
+    feed = api_client.live_feed()
+    st.sidebar.caption("🟢 Conectado ao feed de eventos" if feed.connected else "🟠 Conectando ao feed de eventos...")
+
+# Dados do dashboard (uma requisição por atualização)
+snapshot = get_dashboard_snapshot(selected_city)
+
+def live_sensors(sensors_data):
+    """Leituras do snapshot atualizadas com as recebidas pelo feed ao vivo"""
+    if not live_updates:
+        return sensors_data
+    updates = api_client.live_feed().sensor_readings([s['sensor_id'] for s in sensors_data])
+    return [{**s, **updates.get(s['sensor_id'], {})} for s in sensors_data]
 
 # Resumo geral
-summary = get_dashboard_summary()
-if summary:
-    col1, col2, col3, col4 = st.columns(4)
+@st.fragment(run_every=live_interval)
+def render_summary(summary):
+    if live_updates:
+        # O fragmento redesenha sozinho: busca o resumo atual em vez do capturado na primeira renderização
+        summary = api_client.get("live_summary") or summary
+    if summary:
+        col1, col2, col3, col4 = st.columns(4)
     
+        with col1:
+            st.metric("Sensores Ativos", f"{summary['active_sensors']}/{summary['total_sensors']}")
+        with col2:
+            st.metric("Zonas de Irrigação", summary['irrigation_zones'])
+        with col3:
+            st.metric("Irrigações Ativas", summary['active_irrigations'])
+        with col4:
+            st.metric("Status Geral", "✅ Online")
+
+    # Alertas
+    if summary and summary.get('alerts'):
+        st.subheader("🚨 Alertas do Sistema")
+        for alert in summary['alerts']:
+            if alert['type'] == 'warning':
+                st.markdown(f'<div class="alert-warning">⚠️ {alert["message"]}</div>', unsafe_allow_html=True)
+            else:
+                st.markdown(f'<div class="alert-info">ℹ️ {alert["message"]}</div>', unsafe_allow_html=True)
+
+    # Eventos recebidos pelo feed ao vivo
+    if live_updates:
+        events = api_client.live_feed().recent_events()
+        if events:
+            st.caption("Eventos recentes")
+            for event in events:
+                if event['type'] == 'alert':
+                    state = "disparou" if event['state'] == 'raised' else "normalizou"
+                    st.markdown(f"- `{event['sensor_id']}`: {event['rule_id']} {state}")
+                else:
+                    st.markdown(f"- Irrigação {event['zone_id']}: {event['status']}")
+
+render_summary(snapshot.get('summary'))
+
+st.markdown("---")
+
+@st.fragment(run_every=live_interval)
+def render_sensor_readings(sensors_data):
+    sensors_data = live_sensors(sensors_data)
+    df_sensors = pd.DataFrame(sensors_data)
+    
+    # Métricas principais
+    col1, col2, col3, col4 = st.columns(4)
+
+    avg_temp = sum(s['temperature'] for s in sensors_data) / len(sensors_data)
+    avg_humidity = sum(s['humidity'] for s in sensors_data) / len(sensors_data)
+    avg_moisture = sum(s['soil_moisture'] for s in sensors_data) / len(sensors_data)
+    avg_ph = sum(s['ph_level'] for s in sensors_data) / len(sensors_data)
+
     with col1:
-        st.metric("Sensores Ativos", f"{summary['active_sensors']}/{summary['total_sensors']}")
+        st.metric("Temperatura Média", f"{avg_temp:.1f}°C")
     with col2:
-        st.metric("Zonas de Irrigação", summary['irrigation_zones'])
+        st.metric("Umidade do Ar", f"{avg_humidity:.1f}%")
     with col3:
-        st.metric("Irrigações Ativas", summary['active_irrigations'])
+        st.metric("Umidade do Solo", f"{avg_moisture:.1f}%")
     with col4:
-        st.metric("Status Geral", "✅ Online")
-
-# Alertas
-if summary and summary.get('alerts'):
-    st.subheader("🚨 Alertas do Sistema")
-    for alert in summary['alerts']:
-        if alert['type'] == 'warning':
-            st.markdown(f'<div class="alert-warning">⚠️ {alert["message"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="alert-info">ℹ️ {alert["message"]}</div>', unsafe_allow_html=True)
+        st.metric("pH Médio", f"{avg_ph:.1f}")
 
-st.markdown("---")
+    # Gráficos
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Gráfico de temperatura por sensor
+        fig_temp = px.bar(df_sensors, x='sensor_id', y='temperature', 
+                         title='Temperatura por Sensor',
+                         color='temperature',
+                         color_continuous_scale='RdYlBu_r')
+        fig_temp.update_layout(height=400)
+        st.plotly_chart(fig_temp, use_container_width=True)
+
+    with col2:
+        # Gráfico de umidade do solo
+        fig_moisture = px.bar(df_sensors, x='sensor_id', y='soil_moisture',
+                            title='Umidade do Solo por Sensor',
+                            color='soil_moisture',
+                            color_continuous_scale='Blues')
+        fig_moisture.update_layout(height=400)
+        st.plotly_chart(fig_moisture, use_container_width=True)
+
+    # Tabela detalhada
+    st.subheader("Dados Detalhados dos Sensores")
+    df_display = df_sensors[['sensor_id', 'temperature', 'humidity', 'soil_moisture', 'ph_level']]
+    st.dataframe(df_display, use_container_width=True)
+
+@st.fragment(run_every=live_interval)
+def render_irrigation_events():
+    """Mudanças de estado das irrigações recebidas pelo feed ao vivo"""
+    if not live_updates:
+        return
+    states = api_client.live_feed().irrigation_states()
+    if states:
+        st.caption("Irrigações (ao vivo)")
+        df_irrigation = pd.DataFrame(list(states.values()))
+        st.dataframe(df_irrigation[['zone_id', 'status', 'start_time', 'end_time']], use_container_width=True)
 
 # Layout em abas
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Monitoramento", "🌤️ Clima", "💧 Irrigação", "🌱 Análise", "🔮 Predição"])
@@ -152,52 +200,53 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Monitoramento", "🌤️ Clima", "
 with tab1:
     st.subheader("📊 Monitoramento de Sensores em Tempo Real")
     
-    sensors_data = get_sensors_data()
+    sensors_data = snapshot.get('sensors')
     
     if sensors_data:
-        # Métricas principais
-        col1, col2, col3, col4 = st.columns(4)
+        render_sensor_readings(sensors_data)
         
-        avg_temp = sum(s['temperature'] for s in sensors_data) / len(sensors_data)
-        avg_humidity = sum(s['humidity'] for s in sensors_data) / len(sensors_data)
-        avg_moisture = sum(s['soil_moisture'] for s in sensors_data) / len(sensors_data)
-        avg_ph = sum(s['ph_level'] for s in sensors_data) / len(sensors_data)
+        # Histórico por sensor
+        st.subheader("📈 Histórico do Sensor")
+        metric_labels = {
+            "soil_moisture": "Umidade do Solo",
+            "temperature": "Temperatura",
+            "humidity": "Umidade do Ar",
+            "ph_level": "pH"
+        }
+        period_labels = {6: "6 horas", 24: "24 horas", 168: "7 dias", 720: "30 dias", 2160: "90 dias"}
         
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Temperatura Média", f"{avg_temp:.1f}°C")
+            history_sensor = st.selectbox("Sensor", [s['sensor_id'] for s in sensors_data])
         with col2:
-            st.metric("Umidade do Ar", f"{avg_humidity:.1f}%")
+            history_metric = st.selectbox("Métrica", list(metric_labels), format_func=metric_labels.get)
         with col3:
-            st.metric("Umidade do Solo", f"{avg_moisture:.1f}%")
-        with col4:
-            st.metric("pH Médio", f"{avg_ph:.1f}")
+            history_hours = st.selectbox("Período", list(period_labels), index=1, format_func=period_labels.get)
         
-        # Gráficos
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Gráfico de temperatura por sensor
-            df_sensors = pd.DataFrame(sensors_data)
-            fig_temp = px.bar(df_sensors, x='sensor_id', y='temperature', 
-                             title='Temperatura por Sensor',
-                             color='temperature',
-                             color_continuous_scale='RdYlBu_r')
-            fig_temp.update_layout(height=400)
-            st.plotly_chart(fig_temp, use_container_width=True)
-        
-        with col2:
-            # Gráfico de umidade do solo
-            fig_moisture = px.bar(df_sensors, x='sensor_id', y='soil_moisture',
-                                title='Umidade do Solo por Sensor',
-                                color='soil_moisture',
-                                color_continuous_scale='Blues')
-            fig_moisture.update_layout(height=400)
-            st.plotly_chart(fig_moisture, use_container_width=True)
-        
-        # Tabela detalhada
-        st.subheader("Dados Detalhados dos Sensores")
-        df_display = df_sensors[['sensor_id', 'temperature', 'humidity', 'soil_moisture', 'ph_level']]
-        st.dataframe(df_display, use_container_width=True)
+        history = get_sensor_history(history_sensor, history_metric, history_hours)
+        if history and history['timestamps']:
+            series = history['metrics'][history_metric]
+            fig_history = go.Figure()
+            fig_history.add_trace(go.Scatter(
+                x=history['timestamps'], y=series['max'],
+                mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+            ))
+            fig_history.add_trace(go.Scatter(
+                x=history['timestamps'], y=series['min'],
+                mode='lines', line=dict(width=0), fill='tonexty',
+                fillcolor='rgba(46, 139, 87, 0.2)', name='Mín/Máx'
+            ))
+            fig_history.add_trace(go.Scatter(
+                x=history['timestamps'], y=series['mean'],
+                mode='lines', name='Média', line=dict(color='#2E8B57')
+            ))
+            fig_history.update_layout(
+                title=f"{metric_labels[history_metric]} - {history_sensor} (resolução {history['resolution']})",
+                height=400
+            )
+            st.plotly_chart(fig_history, use_container_width=True)
+        else:
+            st.info("Sem histórico para o período selecionado.")
         
     else:
         st.warning("Não foi possível carregar dados dos sensores. Verifique se a API está rodando.")
@@ -205,7 +254,7 @@ with tab1:
 with tab2:
     st.subheader("🌤️ Condições Meteorológicas")
     
-    weather_data = get_weather_data(selected_city)
+    weather_data = snapshot.get('weather')
     
     if weather_data:
         col1, col2, col3 = st.columns(3)
@@ -223,7 +272,7 @@ with tab2:
             st.metric("Local", weather_data['location'])
         
         # Previsão do tempo
-        forecast_data = get_weather_forecast(selected_city)
+        forecast_data = snapshot.get('forecast')
         
         if forecast_data:
             st.subheader("📅 Previsão para os Próximos 5 Dias")
@@ -258,7 +307,7 @@ with tab2:
 with tab3:
     st.subheader("💧 Sistema de Irrigação")
     
-    irrigation_status = get_irrigation_status()
+    irrigation_status = snapshot.get('irrigation')
     
     if irrigation_status:
         col1, col2, col3, col4 = st.columns(4)
@@ -272,6 +321,8 @@ with tab3:
         with col4:
             st.metric("Eficiência", f"{irrigation_status['efficiency_score']:.1f}%")
         
+        render_irrigation_events()
+        
         # Controles de irrigação
         st.subheader("🎮 Controles de Irrigação")
         
@@ -286,12 +337,12 @@ with tab3:
         
         if st.button("🚰 Ativar Irrigação"):
             try:
-                response = requests.post(f"{API_BASE_URL}/irrigation/activate", 
-                                       json={
-                                           "zone_id": zone_id,
-                                           "duration_minutes": duration,
-                                           "auto_mode": auto_mode
-                                       })
+                response = api_client.post("/irrigation/activate",
+                                          json={
+                                              "zone_id": zone_id,
+                                              "duration_minutes": duration,
+                                              "auto_mode": auto_mode
+                                          })
                 if response.status_code == 200:
                     result = response.json()
                     st.success(f"✅ {result['message']}")
@@ -307,7 +358,7 @@ with tab3:
 with tab4:
     st.subheader("🌱 Análise da Saúde do Solo")
     
-    soil_health = get_soil_health()
+    soil_health = snapshot.get('soil_health')
     
     if soil_health:
         col1, col2, col3 = st.columns(3)
@@ -377,8 +428,8 @@ with tab5:
     
     if st.button("📊 Gerar Predição"):
         try:
-            response = requests.post(f"{API_BASE_URL}/analysis/crop-prediction",
-                                   params={"crop_type": crop_type, "area_hectares": area})
+            response = api_client.post("/analysis/crop-prediction",
+                                      params={"crop_type": crop_type, "area_hectares": area})
             
             if response.status_code == 200:
                 prediction = response.json()
@@ -0,0 +1,93 @@
+import pytest
+
+import api_client
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, url):
+        self.url = url
+
+    def json(self):
+        return {"url": self.url}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def fake_get(url, params=None, timeout=None, **kwargs):
+        calls.append((url, params))
+        return FakeResponse(url)
+
+    monkeypatch.setattr(api_client._session, "get", fake_get)
+    api_client.clear()
+    yield calls
+    api_client.clear()
+
+
+def test_responses_are_cached_per_path_and_params(calls):
+    assert api_client.get("weather", city="Campinas")["url"].endswith("/weather/Campinas")
+    api_client.get("weather", city="Campinas")
+    api_client.get("weather", city="Santos")
+    api_client.get("summary", {"farm_id": "a"})
+    api_client.get("summary", {"farm_id": "a"})
+    assert len(calls) == 3
+
+
+def test_expired_entries_are_dropped_on_insert(calls, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(api_client.time, "monotonic", lambda: clock[0])
+    api_client.get("irrigation")  # ttl 15 s
+    clock[0] += 20
+    api_client.get("weather", city="Campinas")
+    assert [key[0] for key in api_client._cache] == ["weather"]
+    api_client.get("irrigation")
+    assert len(calls) == 3
+
+
+def test_cache_is_bounded_lru(calls, monkeypatch):
+    monkeypatch.setattr(api_client, "CACHE_MAX_ENTRIES", 2)
+    api_client.get("weather", city="A")
+    api_client.get("weather", city="B")
+    api_client.get("weather", city="A")  # A passa a ser o mais recente
+    api_client.get("weather", city="C")
+    assert [key[1] for key in api_client._cache] == ["/weather/A", "/weather/C"]
+
+
+def test_errors_are_not_cached(monkeypatch):
+    class Failing(FakeResponse):
+        status_code = 503
+
+    monkeypatch.setattr(api_client._session, "get", lambda url, **kwargs: Failing(url))
+    api_client.clear()
+    assert api_client.get("summary") is None
+    assert not api_client._cache
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    # Sem a thread de conexão: os eventos entram direto por `_consume`
+    monkeypatch.setattr(api_client.threading.Thread, "start", lambda self: None)
+    return api_client.LiveFeed(max_sensors=2)
+
+
+def sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    return lines + [f"event: {event}", f"data: {data}", ""]
+
+
+def test_malformed_event_is_skipped_and_the_feed_continues(feed):
+    lines = sse("sensors", "{nao-e-json", 1) + sse("irrigation", '{"sem_zona": 1}', 2)
+    lines += sse("irrigation", '{"zone_id": "Z1", "status": "active"}', 3)
+    feed._consume(iter(lines))
+    assert feed.malformed == 2
+    assert feed.irrigation["Z1"]["status"] == "active"
+    assert feed.last_event_id == "3"
+
+
+def test_live_sensors_are_capped_by_recent_use(feed):
+    for sensor_id in ("S1", "S2", "S1", "S3"):
+        feed._consume(iter(sse("sensors", f'[{{"sensor_id": "{sensor_id}"}}]')))
+    assert list(feed.sensors) == ["S1", "S3"]